@@ -0,0 +1,167 @@
+"""
+
+RTCP receiver report 기반 RTSP 적응형 비트레이트 컨트롤러
+
+- 수신자(클라이언트)가 보내는 RTCP RR/SR 의 report block 에서 손실률(fraction lost)과 jitter 를 읽음
+- 수신자별 최근 값을 보관하고, 공유 인코더이므로 가장 나쁜 수신자 기준으로 판단
+    손실률 > loss_high 또는 jitter > jitter_high_ms : 비트레이트를 decrease_factor 배로 감소 (최소 min_kbps)
+    손실률 < loss_low 이고 jitter 정상이 increase_interval_sec 유지 : increase_kbps 만큼 증가 (최대 max_kbps)
+- adapt_fps 사용 시 최소 비트레이트에서도 손실이 계속되면 fps 를 절반씩 낮추고, 회복 시 fps 부터 되돌림
+- GStreamer 의존성 없는 순수 로직 (적용은 rtsp_server 의 factory 가 x264enc/capsfilter 속성 변경으로 수행)
+
+"""
+
+# app/bitrate_controller.py
+import struct
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+RTCP_SR = 200
+RTCP_RR = 201
+RTP_VIDEO_CLOCK_RATE = 90000 # H.264/JPEG RTP 타임스탬프 단위, jitter 를 ms 로 변환할 때 사용
+
+
+def parse_receiver_reports(data):
+    """
+    compound RTCP 패킷에서 report block 목록 추출
+    [(reporter_ssrc, source_ssrc, fraction_lost(0~1), cumulative_lost, jitter(RTP 타임스탬프 단위)), ...]
+    """
+    reports = []
+    offset = 0
+    length = len(data)
+    while offset + 8 <= length:
+        first, packet_type, words = struct.unpack_from('!BBH', data, offset)
+        packet_end = offset + (words + 1) * 4
+        if first >> 6 != 2 or packet_end > length: # 버전 2 가 아니거나 잘린 패킷
+            break
+        report_count = first & 0x1F
+        if packet_type in (RTCP_SR, RTCP_RR):
+            reporter_ssrc = struct.unpack_from('!I', data, offset + 4)[0]
+            block_offset = offset + (28 if packet_type == RTCP_SR else 8) # SR 은 sender info 20 바이트 추가
+            for _ in range(report_count):
+                if block_offset + 24 > packet_end:
+                    break
+                source_ssrc, lost_word, _, jitter = struct.unpack_from('!IIII', data, block_offset)
+                fraction_lost = (lost_word >> 24) / 256.0
+                cumulative_lost = lost_word & 0xFFFFFF
+                if cumulative_lost & 0x800000: # 24 비트 부호 있는 값
+                    cumulative_lost -= 0x1000000
+                reports.append((reporter_ssrc, source_ssrc, fraction_lost, cumulative_lost, jitter))
+                block_offset += 24
+        offset = packet_end
+    return reports
+
+
+class BitrateController:
+    def __init__(self, initial_kbps=500, min_kbps=200, max_kbps=4000, max_fps=None, min_fps=5, adapt_fps=False,
+                 loss_high=0.05, loss_low=0.01, jitter_high_ms=40.0, decrease_factor=0.7, increase_kbps=100,
+                 increase_interval_sec=2.0, decrease_hold_sec=1.0, receiver_timeout_sec=10.0):
+        self.min_kbps = int(min_kbps)
+        self.max_kbps = max(int(max_kbps), self.min_kbps)
+        self.initial_kbps = min(max(int(initial_kbps), self.min_kbps), self.max_kbps)
+        self.adapt_fps = bool(adapt_fps and max_fps)
+        self.max_fps = int(max_fps) if max_fps else None
+        self.min_fps = min(int(min_fps), self.max_fps) if self.max_fps else int(min_fps)
+        self.loss_high = float(loss_high)
+        self.loss_low = float(loss_low)
+        self.jitter_high_ms = float(jitter_high_ms)
+        self.decrease_factor = float(decrease_factor)
+        self.increase_kbps = int(increase_kbps)
+        self.increase_interval_sec = float(increase_interval_sec)
+        self.decrease_hold_sec = float(decrease_hold_sec) # 같은 혼잡에 대한 RR 여러 개로 연속 감소하지 않도록
+        self.receiver_timeout_sec = float(receiver_timeout_sec)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.bitrate_kbps = self.initial_kbps
+            self.fps = self.max_fps
+            self._receivers = {} # reporter_ssrc -> {'fraction_lost', 'jitter_ms', 'updated'}
+            self._last_change = 0.0
+            self._good_since = None
+            self.decreases = 0
+            self.increases = 0
+            self.reports = 0
+
+    def on_receiver_report(self, reporter_ssrc, fraction_lost, jitter, now=None):
+        """
+        report block 하나 반영 후 (bitrate_kbps, fps) 변경이 필요하면 반환, 아니면 None
+        jitter 는 RTP 타임스탬프 단위 (90kHz)
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.reports += 1
+            self._receivers[reporter_ssrc] = {
+                'fraction_lost': fraction_lost,
+                'jitter_ms': jitter * 1000.0 / RTP_VIDEO_CLOCK_RATE,
+                'updated': now,
+            }
+            for ssrc in [s for s, r in self._receivers.items() if now - r['updated'] > self.receiver_timeout_sec]:
+                del self._receivers[ssrc] # 접속이 끝난 수신자
+            worst_loss = max(r['fraction_lost'] for r in self._receivers.values())
+            worst_jitter = max(r['jitter_ms'] for r in self._receivers.values())
+
+            previous = (self.bitrate_kbps, self.fps)
+            if worst_loss > self.loss_high or worst_jitter > self.jitter_high_ms:
+                self._good_since = None
+                if now - self._last_change >= self.decrease_hold_sec:
+                    self._decrease_locked()
+            elif worst_loss < self.loss_low:
+                if self._good_since is None:
+                    self._good_since = now
+                if (now - self._good_since >= self.increase_interval_sec
+                        and now - self._last_change >= self.increase_interval_sec):
+                    self._increase_locked()
+            else:
+                self._good_since = None # 손실이 경계 구간이면 유지
+
+            current = (self.bitrate_kbps, self.fps)
+            if current == previous:
+                return None
+            self._last_change = now
+            logger.info(f"RTSP ABR: loss={worst_loss:.3f} jitter={worst_jitter:.1f}ms -> "
+                        f"bitrate {previous[0]} -> {current[0]} kbps, fps {previous[1]} -> {current[1]}")
+            return current
+
+    def _decrease_locked(self):
+        if self.bitrate_kbps > self.min_kbps:
+            self.bitrate_kbps = max(int(self.bitrate_kbps * self.decrease_factor), self.min_kbps)
+            self.decreases += 1
+        elif self.adapt_fps and self.fps > self.min_fps:
+            # 최소 비트레이트에서도 손실이 계속되면 프레임 수를 줄여 프레임당 비트 확보
+            self.fps = max(self.fps // 2, self.min_fps)
+            self.decreases += 1
+
+    def _increase_locked(self):
+        if self.adapt_fps and self.fps < self.max_fps:
+            self.fps = min(self.fps * 2, self.max_fps) # 회복 시 fps 부터 되돌림
+            self.increases += 1
+        elif self.bitrate_kbps < self.max_kbps:
+            self.bitrate_kbps = min(self.bitrate_kbps + self.increase_kbps, self.max_kbps)
+            self.increases += 1
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {
+                'bitrate_kbps': self.bitrate_kbps,
+                'fps': self.fps,
+                'min_kbps': self.min_kbps,
+                'max_kbps': self.max_kbps,
+                'adapt_fps': self.adapt_fps,
+                'receivers': {
+                    str(ssrc): {
+                        'fraction_lost': round(r['fraction_lost'], 3),
+                        'jitter_ms': round(r['jitter_ms'], 1),
+                        'seconds_since_report': round(now - r['updated'], 1),
+                    }
+                    for ssrc, r in self._receivers.items()
+                },
+                'reports': self.reports,
+                'decreases': self.decreases,
+                'increases': self.increases,
+            }
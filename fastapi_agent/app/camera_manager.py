@@ -8,10 +8,9 @@ gstreamer 로 현재 agent 가 동작하는 카메라 status 확인 및 관리
 
 # app/camera_manager.py
 
+import asyncio
 import threading
-import time
-import requests
-import glob
+import httpx
 import gi
 import logging
 import os
@@ -22,21 +21,43 @@ from datetime import datetime
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst , GObject
 from .kafka_streamer import KafkaStreamer
+from .capture_hub import CaptureHub, HUB_OUTPUTS, hub_source_str
+from .dvr_recorder import DVRRecorder
+from .snapshot_cache import SnapshotCache
+from .device_registry import DeviceRegistry
+from .status_delta import StatusDelta
 
 logger = logging.getLogger(__name__)
 
-class CameraManager(threading.Thread):
+STREAMING_METHODS = ('RTSP', 'KAFKA')
+
+
+def parse_streaming_methods(value):
+    """ STREAMING_METHOD 값(예: 'RTSP', 'KAFKA', 'RTSP,KAFKA', 'RTSP+KAFKA') -> 순서 유지한 방식 목록 """
+    methods = []
+    for method in (value or '').replace('+', ',').split(','):
+        method = method.strip().upper()
+        if method in STREAMING_METHODS and method not in methods:
+            methods.append(method)
+    return methods
+
+class CameraManager:
+    """
+    카메라 장치/스트림 관리와 서버 통신(제어 평면)
+    제어 평면은 FastAPI 이벤트 루프의 asyncio 태스크 (run), GStreamer 호출은 스레드 풀에서 실행
+    """
     def __init__(self, agent_id, server_url, streaming_method='RTSP', 
                  rtsp_server_instance=None, # RTSPServer 객체 주입
                  kafka_init_params=None,    # Kafka 초기화 파라미터 주입
                  camera_env_configs=None,   # 카메라 메타데이터 환경변수 값들 주입
                  update_interval=10):
-        super().__init__()
-        Gst.init(None) # 스레드별 Gst 초기화는 run 메서드 시작 시에도 고려 가능
+        Gst.init(None)
         
         self.agent_id = agent_id # Visibility 서버로부터 받은 최종 agent_id로 업데이트 필요
         self.server_url = server_url
-        self.streaming_method = streaming_method.upper()
+        # 여러 방식을 동시에 쓰는 경우 'RTSP+KAFKA' 형태로 정규화 (stream_protocol 로도 보고됨)
+        self.streaming_methods = parse_streaming_methods(streaming_method)
+        self.streaming_method = '+'.join(self.streaming_methods) if self.streaming_methods else streaming_method.upper()
         
         self.rtsp_server = rtsp_server_instance # 주입된 RTSPServer 인스턴스
         self.kafka_params = kafka_init_params if kafka_init_params else {} # Kafka 설정값
@@ -44,21 +65,62 @@ class CameraManager(threading.Thread):
 
         self.update_interval = update_interval
         self.running = True
+        self.registered = False # 서버 등록 전에는 장치 감시만 하고 서버 통신은 하지 않음
+        self.http = None # 제어 평면용 httpx.AsyncClient (keep-alive 연결 풀, main.py lifespan 에서 주입)
+        # 설정 watch: 서버의 /agent_watch_config long-poll 연결 하나로 설정 변경을 바로 받음
+        # 연결되어 있는 동안은 주기적 /agent_get_config 폴링 생략 (연결이 끊기면 폴링으로 복귀)
+        self.config_watch_enabled = os.getenv('CONFIG_WATCH_ENABLED', 'true').lower() == 'true'
+        self.config_watch_timeout_sec = float(os.getenv('CONFIG_WATCH_TIMEOUT_SEC', 25))
+        self.config_revision = None # 마지막으로 적용한 서버 config_revision
+        self._config_watch_connected = False
+        self._server_config = None # 마지막으로 받은 서버 설정 (watch 연결 중에는 요청 없이 이것으로 재적용)
+        # 스트림 시작/중지와 카메라 목록 변경을 직렬화 (장치 감시, heartbeat/폴링/watch 설정 적용, /start_stream, /stop_stream)
+        # 모두 스레드 풀에서 잡으며, apply_server_config 가 잡은 채로 start_stream/stop_stream 을 호출하므로 RLock
+        self._config_lock = threading.RLock()
+        # heartbeat: 상태 보고와 설정 동기화를 /agent_heartbeat 요청 하나로 (변경된 필드만 전송)
+        # 서버가 지원하지 않으면(404) 기존 /agent_update_status + /agent_get_config 사용
+        self.heartbeat_enabled = os.getenv('HEARTBEAT_ENABLED', 'true').lower() == 'true'
+        self._status_delta = StatusDelta() # 서버가 확인한 상태 기준과 변경분
         
         self.cameras = [] # 상세 카메라 정보를 담을 리스트 (단일 카메라 객체 포함)
-        self.current_device_path = None # 실제 사용될 카메라 장치 경로
+        self.current_device_path = None # 실제 사용될 카메라 장치 경로 (다중 카메라 모드에서는 첫 번째 장치)
+        self.device_paths = [] # 관리 중인 장치 목록 (단일 카메라 모드에서는 current_device_path 하나)
         self.camera_id = self.camera_configs.get('camera_id_override') or str(uuid.uuid4())
 
+        # 다중 카메라 모드: RTSPServer 하나가 모든 장치를 장치별 mount 로 제공 (RTSP 모드 전용)
+        self.multi_camera = bool(self.camera_configs.get('multi_camera')) and self.streaming_methods == ['RTSP']
+        if self.camera_configs.get('multi_camera') and not self.multi_camera:
+            logger.warning("RTSP_MULTI_CAMERA is only supported with STREAMING_METHOD=RTSP. Managing a single camera.")
+        # V4L2 장치 레지스트리: 장치/포맷을 한 번 조회해 보관하고 inotify 핫플러그 이벤트로만 갱신
+        self.device_registry = DeviceRegistry()
+        self.device_registry.start()
+        self._known_generation = None # 마지막 장치 탐색 시점의 레지스트리 generation (핫플러그 감지용)
+
+        # 캡처 허브: 장치를 한 번만 열어 RTSP/Kafka/로컬 소비자에 나눠줌 (여러 방식 동시 사용 시 자동 활성화)
+        self.use_capture_hub = len(self.streaming_methods) > 1 or bool(self.camera_configs.get('capture_hub'))
+        self.capture_hubs = {} # device_path -> CaptureHub
+
+        # DVR: 스트리밍 중인 장치의 최근 영상을 세그먼트 링으로 보관
+        # RTSP mount 의 H.264 warm 인코더 출력을 그대로 기록, warm 인코더가 없을 때만 허브의 dvr 출력을 인코딩
+        self.dvr_enabled = bool(self.camera_configs.get('dvr'))
+        if self.dvr_enabled:
+            self.use_capture_hub = True
+        self.dvr_recorders = {} # device_path -> DVRRecorder
+        # 스냅샷/썸네일: 실행 중인 파이프라인의 최신 프레임을 간격당 한 번만 JPEG 인코딩
+        self.snapshots = SnapshotCache(self._latest_frame_for)
+
         self.kafka_streamer = None
-        if self.streaming_method == 'KAFKA':
+        if 'KAFKA' in self.streaming_methods:
             # KafkaStreamer에 해상도/FPS 전달 (환경변수에서 파싱한 값)
             try:
-                self.kafka_streamer = KafkaStreamer()
+                source = hub_source_str(self._hub_channel_prefix(None), 'kafka') if self.use_capture_hub else None
+                self.kafka_streamer = KafkaStreamer(camera_id=self.camera_id, source=source)
                 
             except ValueError as e:
                 logger.error(f"Invalid resolution/FPS for Kafka: {res_str}, {fps_val}. Error: {e}")
                 # KafkaStreamer 초기화 실패 시 스트리밍 불가 처리 필요
-                self.streaming_method = 'NONE' # 또는 적절한 오류 상태
+                self.streaming_methods = [m for m in self.streaming_methods if m != 'KAFKA']
+                self.streaming_method = '+'.join(self.streaming_methods) or 'NONE' # 또는 적절한 오류 상태
 
         self._initialize_managed_camera() # 카메라 정보 객체 생성
 
@@ -73,7 +135,7 @@ class CameraManager(threading.Thread):
                 logger.warning(f"Configured camera device {configured_path} not available or not found.")
         
         logger.info("No valid CAMERA_DEVICE_PATH set or device not available, attempting auto-detection...")
-        video_devices = sorted(glob.glob('/dev/video*')) # 정렬하여 일관성 유지
+        video_devices = self.device_registry.capture_devices() # 캡처 장치만 (메타데이터 노드 제외), 정렬됨
         for device in video_devices:
             if self.is_camera_available(device):
                 logger.info(f"Auto-detected and using camera device: {device}")
@@ -82,11 +144,143 @@ class CameraManager(threading.Thread):
         logger.error("No available camera device found.")
         return None
 
-    def _build_camera_object(self):
-        """ self.current_device_path를 기반으로 단일 카메라 정보 객체를 생성/업데이트합니다. """
-        if not self.current_device_path:
-            self.cameras = []
+    def _determine_device_paths(self):
+        """ 다중 카메라 모드: CAMERA_DEVICE_PATH(콤마 구분) 또는 모든 /dev/video* 중 사용 가능한 장치 목록 """
+        self._known_generation = self.device_registry.generation
+        configured = self.camera_configs.get('camera_device_path_override')
+        if configured:
+            candidates = [path.strip() for path in configured.split(',') if path.strip()]
+        else:
+            candidates = self.device_registry.capture_devices()
+
+        available = []
+        for device in candidates:
+            if not os.path.exists(device):
+                continue
+            # 스트리밍 중인 장치는 이미 열려 있어 probe 가 실패하므로 그대로 유지
+            if self.check_status(device) or self.is_camera_available(device):
+                available.append(device)
+        if available:
+            logger.info(f"Managing {len(available)} camera device(s): {available}")
+        else:
+            logger.error("No available camera device found.")
+        return available
+
+    def _camera_id_for(self, device_path):
+        """ 다중 카메라 모드에서는 장치 이름을 붙여 카메라마다 고유한 ID 사용 (예: <camera_id>-video0) """
+        if not self.multi_camera:
+            return self.camera_id
+        return f"{self.camera_id}-{os.path.basename(device_path)}"
+
+    def _hub_channel_prefix(self, device_path):
+        """ intervideo 채널 이름, 출력 파이프라인이 장치 탐색 전에 만들어질 수 있으므로 카메라 ID 기준 """
+        camera_id = self._camera_id_for(device_path) if device_path else self.camera_id
+        return f"camera-hub-{camera_id}"
+
+    def _acquire_hub(self, device_path, output):
+        """ 캡처 허브 사용 시 output 이 사용할 소스 문자열 반환, 허브 미사용 시 None (출력이 장치를 직접 엶) """
+        if not self.use_capture_hub or not device_path:
+            return None
+        hub = self.capture_hubs.get(device_path)
+        if hub is None:
+            width, height = self._configured_resolution()
+            outputs = HUB_OUTPUTS + ('dvr',) if self.dvr_enabled else HUB_OUTPUTS
+            hub = CaptureHub(device_path, width, height, self._configured_fps(), outputs=outputs,
+                             channel_prefix=self._hub_channel_prefix(device_path))
+            self.capture_hubs[device_path] = hub
+        hub.acquire(output)
+        return hub.source_str(output)
+
+    def _release_hub(self, device_path, output):
+        hub = self.capture_hubs.get(device_path)
+        if hub is not None:
+            hub.release(output)
+
+    def _release_stale_hubs(self):
+        """ 더 이상 관리하지 않는 장치의 허브 정리 (장치 제거/변경 시) """
+        for device_path in list(self.dvr_recorders):
+            if device_path not in self.device_paths:
+                self._stop_dvr(device_path)
+        for device_path in list(self.capture_hubs):
+            if device_path not in self.device_paths:
+                self.capture_hubs.pop(device_path).stop()
+
+    def _start_dvr(self, device_path):
+        if not self.dvr_enabled or not device_path:
             return
+        recorder = self.dvr_recorders.get(device_path)
+        if recorder is None:
+            warm = None
+            if 'RTSP' in self.streaming_methods and self.rtsp_server:
+                warm = self.rtsp_server.get_warm_encoder(self._mount_for(device_path))
+            if warm is not None:
+                recorder = DVRRecorder(os.path.basename(device_path), fps=self._configured_fps(), warm=warm)
+            else:
+                source = self._acquire_hub(device_path, 'dvr')
+                recorder = DVRRecorder(os.path.basename(device_path), source, fps=self._configured_fps())
+            self.dvr_recorders[device_path] = recorder
+        recorder.start()
+
+    def _stop_dvr(self, device_path):
+        recorder = self.dvr_recorders.pop(device_path, None)
+        if recorder is not None:
+            recorder.stop()
+            if recorder.warm is None:
+                self._release_hub(device_path, 'dvr')
+
+    def get_dvr_recorder(self, device_path=None):
+        """ 장치의 DVR 녹화기, DVR 미사용 또는 스트리밍 중이 아니면 None """
+        return self.dvr_recorders.get(device_path or self.current_device_path)
+
+    def _latest_frame_for(self, device_path):
+        """ 스냅샷용 최신 프레임 (Gst.Sample, 출처), 실행 중인 파이프라인이 없으면 None (짧은 캡처로 대체) """
+        hub = self.capture_hubs.get(device_path)
+        if hub is not None:
+            sample = hub.get_latest_sample()
+            if sample is not None:
+                return sample, 'hub'
+        if self.kafka_streamer and device_path == self.current_device_path:
+            sample = self.kafka_streamer.get_latest_sample()
+            if sample is not None:
+                return sample, 'kafka'
+        return None
+
+    def get_snapshot(self, device_path=None, width=None):
+        """ 장치의 최신 프레임 JPEG (Snapshot), width 를 주면 비율을 유지한 썸네일 """
+        device_path = device_path or self.current_device_path
+        if device_path not in self.device_paths:
+            return None
+        return self.snapshots.get(device_path, width)
+
+    def get_capture_hub(self, device_path=None):
+        """ 로컬 소비자(스냅샷 등)용 허브, 허브 미사용 또는 아직 시작 전이면 None """
+        return self.capture_hubs.get(device_path or self.current_device_path)
+
+    def _configured_resolution(self):
+        try:
+            width, height = map(int, self.camera_configs.get('camera_resolution', '640x480').split('x'))
+            return width, height
+        except ValueError:
+            return None, None
+
+    def _configured_fps(self):
+        try:
+            return int(self.camera_configs.get('camera_fps', '15'))
+        except ValueError:
+            return None
+
+    def _mount_for(self, device_path):
+        """ 다중 카메라 모드의 장치별 RTSP mount, 단일 카메라 모드에서는 None (RTSP_MOUNT_POINT 사용) """
+        if self.multi_camera and self.rtsp_server and device_path:
+            return self.rtsp_server.mount_for_device(device_path)
+        return None
+
+    def _build_camera_object(self):
+        """ 관리 중인 장치 목록을 기반으로 카메라 정보 객체 리스트를 생성/업데이트합니다. """
+        self.cameras = [self._camera_object_for(device_path) for device_path in self.device_paths if device_path]
+
+    def _camera_object_for(self, device_path):
+        """ 장치 하나의 카메라 정보 객체 """
 
         # 해상도 및 FPS 파싱 (환경변수 우선)
         resolution_str = self.camera_configs.get('camera_resolution', '640x480')
@@ -98,47 +292,127 @@ class CameraManager(threading.Thread):
 
         # stream_details 구성
         stream_details_obj = {}
-        if self.streaming_method == 'RTSP' and self.rtsp_server:
-            stream_details_obj['rtsp_uri'] = self.rtsp_server.get_full_stream_uri()
-        elif self.streaming_method == 'KAFKA':
+        if 'RTSP' in self.streaming_methods and self.rtsp_server:
+            stream_details_obj['rtsp_uri'] = self.rtsp_server.get_full_stream_uri(self._mount_for(device_path))
+            stream_details_obj.update(self.rtsp_server.get_mount_details(self._mount_for(device_path)))
+        if 'KAFKA' in self.streaming_methods:
             stream_details_obj['kafka_topic'] = self.kafka_params.get('topic', 'N/A')
             stream_details_obj['kafka_bootstrap_servers'] = self.kafka_params.get('bootstrap_servers', 'N/A')
+            if self.kafka_streamer:
+                # 소비자가 프레임 디코딩 방법을 알 수 있도록 코덱/포맷/해상도 공개
+                stream_details_obj.update(self.kafka_streamer.get_stream_details())
+                # rendition 별 토픽/해상도/fps/코덱 (KAFKA_RENDITIONS 미설정 시 main 하나)
+                stream_details_obj['renditions'] = self.kafka_streamer.get_renditions()
         
         current_time = datetime.utcnow().isoformat()
-        is_currently_streaming = self.check_status() # 실제 스트리밍 상태 확인
+        is_currently_streaming = self.check_status(device_path) # 실제 스트리밍 상태 확인
+
+        camera_name = self.camera_configs.get('camera_name') or f"Cam-{device_path.split('/')[-1]}"
+        if self.multi_camera and self.camera_configs.get('camera_name'):
+            camera_name = f"{camera_name} ({os.path.basename(device_path)})"
 
         camera_object = {
-            'camera_id': self.camera_id,
-            'camera_name': self.camera_configs.get('camera_name', f"Cam-{self.current_device_path.split('/')[-1]}"),
-            'status': 'streaming' if is_currently_streaming else ('active' if self.current_device_path else 'error'),
+            'camera_id': self._camera_id_for(device_path),
+            'camera_name': camera_name,
+            'status': 'streaming' if is_currently_streaming else ('active' if device_path else 'error'),
             'type': self.camera_configs.get('camera_type', 'rgb'),
             'environment': self.camera_configs.get('camera_environment', 'real'),
-            'stream_protocol': self.streaming_method if self.current_device_path else 'NONE',
-            'stream_details': stream_details_obj if self.current_device_path else {},
+            'stream_protocol': self.streaming_method if device_path else 'NONE',
+            'stream_details': stream_details_obj if device_path else {},
             'resolution': resolution_str,
             'fps': fps_val,
             'location': self.camera_configs.get('camera_location', 'N/A'),
             'host_pc_name': os.getenv('HOSTNAME', self.agent_id.split('-')[0]), # Agent ID에서 일부 사용 또는 HOSTNAME
             'frame_transmission_enabled': is_currently_streaming,
             'last_update': current_time,
-            '_device_path': self.current_device_path # 내부 관리용
+            '_device_path': device_path # 내부 관리용
         }
-        self.cameras = [camera_object]
+        if self.kafka_streamer and self.kafka_streamer.motion_gate is not None:
+            # 모션 게이트 상태 (motion/hold/static, 점수, 억제된 프레임 수)
+            camera_object['motion_gate'] = self.kafka_streamer.get_motion_gate_state()
+        if 'RTSP' in self.streaming_methods and self.rtsp_server and device_path:
+            # 이 카메라 mount 에 접속 중인 RTSP 클라이언트 수와 세션별 전송량/손실/jitter/RTT
+            mount_point = self._mount_for(device_path) or self.rtsp_server.mount_point
+            camera_object['rtsp_sessions'] = self.rtsp_server.get_session_stats(mount_point).get(
+                mount_point, {'count': 0, 'sessions': [], 'unattributed_receivers': []})
+        return camera_object
 
     def _initialize_managed_camera(self):
-        """ 단일 관리 카메라 정보를 설정하고 self.cameras 리스트를 업데이트합니다. """
-        self.current_device_path = self._determine_device_path()
+        """ 관리 카메라(단일 또는 다중) 정보를 설정하고 self.cameras 리스트를 업데이트합니다. """
+        if self.multi_camera:
+            self.device_paths = self._determine_device_paths()
+            self.current_device_path = self.device_paths[0] if self.device_paths else None
+        else:
+            self.current_device_path = self._determine_device_path()
+            self.device_paths = [self.current_device_path] if self.current_device_path else []
+        self._release_stale_hubs()
         self._build_camera_object() # self.cameras 업데이트
 
+    def _refresh_managed_cameras(self):
+        """ 다중 카메라 모드: 장치 추가/제거(핫플러그) 또는 사용 불가 장치가 있을 때만 재탐색 """
+        unavailable = [device for device in self.device_paths
+                       if not self.check_status(device) and not self.is_camera_available(device)]
+        if self.device_paths and not unavailable and self.device_registry.generation == self._known_generation:
+            return
+
+        previous_devices = list(self.device_paths)
+        self._initialize_managed_camera()
+        for device in previous_devices:
+            if device not in self.device_paths:
+                logger.warning(f"Camera device {device} removed or unavailable.")
+                if self.check_status(device):
+                    self.rtsp_server.stop_stream(self._mount_for(device))
+                    self._release_hub(device, 'rtsp')
+        for device in self.device_paths:
+            if device not in previous_devices:
+                logger.info(f"New camera device {device} initialized as {self._camera_id_for(device)}.")
+
     def get_initial_camera_data_for_registration(self):
         """ Agent 등록 시 사용할 초기 카메라 정보 리스트를 반환합니다. """
         # __init__에서 이미 _initialize_managed_camera()를 통해 self.cameras가 설정됨
         return self.cameras
 
-    def run(self):
-        # Gst.init(None) # 스레드 시작 시 Gst 초기화 (필요한 경우)
-        logger.info(f"CameraManager thread started for agent {self.agent_id}.")
+    async def run(self):
+        """ 제어 평면: 장치 감시 + 서버 보고/설정 동기화 루프와 설정 watch long-poll (취소하면 종료) """
+        logger.info(f"CameraManager control loop started for agent {self.agent_id}.")
+        tasks = [asyncio.create_task(self._control_loop())]
+        if self.config_watch_enabled and self.server_url:
+            tasks.append(asyncio.create_task(self._config_watch_loop()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"CameraManager control loop stopped for agent {self.agent_id}.")
+
+    async def _control_loop(self):
         while self.running:
+            try:
+                await asyncio.to_thread(self._monitor_devices)
+                if self.registered:
+                    await self._report_and_sync() # 서버로 현재 상태 보고 및 서버 설정과 동기화
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in CameraManager control loop for agent {self.agent_id}: {e}", exc_info=True)
+            await asyncio.sleep(self.update_interval)
+
+    def _monitor_devices(self):
+        """ 오류로 멈춘 파이프라인 재시작 및 장치 재탐색 (GStreamer 호출이 있으므로 스레드 풀에서 실행) """
+        with self._config_lock:
+            for hub in list(self.capture_hubs.values()):
+                hub.ensure_running() # 오류로 멈춘 허브 재시작 (출력 파이프라인은 intervideosrc 라 그대로 유지)
+            if self.rtsp_server:
+                self.rtsp_server.ensure_warm_encoders() # RTSP_WARM 모드의 인코더도 같은 방식으로 재시작
+                self.rtsp_server.ensure_hls_outputs()
+            for recorder in list(self.dvr_recorders.values()):
+                recorder.ensure_running()
+
+            if self.multi_camera:
+                self._refresh_managed_cameras()
+                return
+
             is_currently_streaming = self.check_status() # 실제 스트리밍 파이프라인 상태
 
             if not is_currently_streaming: # 스트리밍 중이 아닐 때만 장치 유효성 집중 검사
@@ -148,7 +422,7 @@ class CameraManager(threading.Thread):
                     self._initialize_managed_camera() # 장치 재탐색 및 카메라 정보 업데이트
                     if self.current_device_path != previous_device and self.current_device_path is not None:
                         logger.info(f"New camera device {self.current_device_path} initialized. Previous: {previous_device}")
-                        # 스트림이 비활성 상태였으므로, sync_config_from_server가 다음 주기에 스트림 시작 여부 결정
+                        # 스트림이 비활성 상태였으므로, 다음 설정 동기화에서 스트림 시작 여부 결정
                 else:
                     # 스트리밍 중은 아니지만, 장치는 사용 가능한 상태
                     logger.debug(f"Device {self.current_device_path} is available, but stream is not active. Waiting for server config.")
@@ -156,14 +430,21 @@ class CameraManager(threading.Thread):
                 # 스트리밍 중일 때는 장치가 사용 가능하다고 간주 (주기적인 심층 검사 생략)
                 logger.debug(f"Stream for {self.current_device_path} is active. Skipping deep availability check.")
 
-            self.update_server_status() # 서버로 현재 상태 보고
-            self.sync_config_from_server() # 서버 설정과 동기화
-            time.sleep(self.update_interval)
-        logger.info(f"CameraManager thread stopped for agent {self.agent_id}.")
-
-    def is_camera_available(self, device_path):
+    def is_camera_available(self, device_path, deep=False):
         if not device_path or not os.path.exists(device_path):
             return False
+        hub = self.capture_hubs.get(device_path)
+        if hub is not None and hub.running:
+            return True # 허브가 이미 캡처 중인 장치는 다시 열지 않음
+        if deep: # /health?deep=true : 레지스트리 캐시 대신 실제로 확인
+            # 스트리밍 중인 장치는 이미 열려 있어 probe 가 실패하므로 파이프라인 상태로 판단
+            return self.check_status(device_path) or self._probe_with_pipeline(device_path)
+        available = self.device_registry.is_available(device_path)
+        if available is not None:
+            return available # 메모리 조회 (파이프라인을 만들지 않으므로 스트리밍 중인 장치도 판단 가능)
+        return self._probe_with_pipeline(device_path) # 레지스트리가 조회하지 못한 장치 (권한 오류 등)
+
+    def _probe_with_pipeline(self, device_path):
         pipeline_str = f'v4l2src device={device_path} num-buffers=1 ! fakesink'
         try:
             pipeline = Gst.parse_launch(pipeline_str)
@@ -183,138 +464,315 @@ class CameraManager(threading.Thread):
             return False
 
 
-    def update_server_status(self):
+    async def update_server_status(self):
         if not self.cameras: # 관리할 카메라 정보가 없으면 업데이트 스킵
             logger.debug("No camera data to update to server.")
             return
 
         # 현재 카메라의 실제 상태를 반영하여 self.cameras[0] 업데이트
-        self._build_camera_object() # 상태, last_update 등을 최신으로 업데이트
+        await asyncio.to_thread(self._refresh_cameras) # 상태, last_update 등을 최신으로 업데이트
 
         payload = {
             'agent_id': self.agent_id,
-            'cameras': self.cameras # 상세 정보가 담긴 단일 카메라 객체 리스트
+            'cameras': self.cameras # 상세 정보가 담긴 카메라 객체 리스트 (다중 카메라 모드에서는 장치 수만큼)
         }
         logger.debug(f"Updating server status with payload: {payload}")
         try:
-            response = requests.post(
+            response = await self.http.post(
                 f'{self.server_url}/agent_update_status', # 수정된 엔드포인트
                 json=payload,
                 timeout=5
             )
             response.raise_for_status()
             logger.info(f"Camera status successfully updated to server for agent {self.agent_id}.")
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Failed to update camera status for agent {self.agent_id}: {e}")
 
-    def sync_config_from_server(self):
-        if not self.cameras or not self.current_device_path: # 관리 카메라가 없으면 동기화 스킵
+    async def _report_and_sync(self):
+        if not (self.heartbeat_enabled and await self.send_heartbeat()):
+            await self.update_server_status()
+            await self._reconcile_config()
+
+    async def send_heartbeat(self):
+        """
+        상태 변경분 보고와 설정 변경 수신을 요청 하나로 처리, 서버가 heartbeat 를 지원하지 않으면 False
+        서버는 변경이 없으면 204, 아직 적용하지 않은 설정(config_revision)이 있으면 원하는 상태를 200 으로 응답
+        """
+        if not self.cameras: # 관리할 카메라 정보가 없으면 보고 스킵
+            return True
+        await asyncio.to_thread(self._refresh_cameras)
+        sent, deltas, full, revision = self._status_delta.prepare(self.cameras)
+        payload = {
+            'agent_id': self.agent_id,
+            'base_revision': self._status_delta.revision, # 이 변경분의 기준 (서버와 다르면 409 -> 전체 재전송)
+            'status_revision': revision,
+            'config_revision': self.config_revision,
+            'cameras': deltas,
+        }
+        if full:
+            payload['full'] = True
+        logger.debug(f"Sending heartbeat with payload: {payload}")
+        try:
+            response = await self.http.post(f'{self.server_url}/agent_heartbeat', json=payload, timeout=5)
+            if response.status_code == 404: # 이전 버전 서버 (엔드포인트 없음) 또는 아직 등록되지 않은 agent_id
+                logger.debug(f"Heartbeat not available for agent {self.agent_id} (404). Using status update and config poll.")
+                return False
+            if response.status_code == 409 and not full:
+                logger.warning(f"Heartbeat revision mismatch for agent {self.agent_id}. Resending full status.")
+                self._status_delta.reset()
+                return await self.send_heartbeat()
+            response.raise_for_status()
+            self._status_delta.ack(sent, revision)
+            if response.status_code == 200:
+                await asyncio.to_thread(self.apply_server_config, response.json())
+            elif self._server_config is not None:
+                await asyncio.to_thread(self.apply_server_config, self._server_config) # 변경 없음, 오류로 멈춘 스트림만 재시작
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to send heartbeat for agent {self.agent_id}: {e}")
+        except Exception as e: # JSON 파싱 오류 등
+            logger.error(f"Error processing heartbeat response for agent {self.agent_id}: {e}", exc_info=True)
+        return True
+
+    async def sync_config_from_server(self):
+        if not self.cameras or not self.device_paths: # 관리 카메라가 없으면 동기화 스킵
             return
         
         logger.debug(f"Syncing config from server for agent {self.agent_id}...")
         try:
-            response = requests.get(
-                f'{self.server_url}/agent_get_config?agent_id={self.agent_id}',
+            response = await self.http.get(
+                f'{self.server_url}/agent_get_config',
+                params={'agent_id': self.agent_id},
                 timeout=5
             )
             response.raise_for_status()
-            server_config = response.json()
-            logger.debug(f"Received config from server: {server_config}")
+            await asyncio.to_thread(self.apply_server_config, response.json())
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to sync config from server for agent {self.agent_id}: {e}")
+        except Exception as e: # JSON 파싱 오류 등
+            logger.error(f"Error processing server config for agent {self.agent_id}: {e}", exc_info=True)
 
+    async def _reconcile_config(self):
+        """ watch 연결 중이면 마지막 서버 설정을 다시 적용 (오류로 멈춘 스트림 재시작), 아니면 서버에서 가져옴 """
+        if self._config_watch_connected and self._server_config is not None:
+            await asyncio.to_thread(self.apply_server_config, self._server_config)
+        else:
+            await self.sync_config_from_server()
+
+    async def _config_watch_loop(self):
+        """ /agent_watch_config long-poll 을 계속 유지하며 설정이 바뀌면 바로 적용 """
+        backoff = 1.0
+        try:
+            while self.running:
+                if not self.registered or not self.cameras or not self.device_paths:
+                    # 등록 전이거나 적용할 카메라가 없으면 받아도 revision 이 진행되지 않음
+                    self._config_watch_connected = False
+                    await asyncio.sleep(self.update_interval)
+                    continue
+                params = {'agent_id': self.agent_id, 'timeout': self.config_watch_timeout_sec}
+                if self.config_revision is not None:
+                    params['since'] = self.config_revision
+                try:
+                    response = await self.http.get(f'{self.server_url}/agent_watch_config', params=params,
+                                                   timeout=self.config_watch_timeout_sec + 10)
+                    if response.status_code == 404:
+                        # 이전 버전 서버 (엔드포인트 없음) 또는 아직 등록되지 않은 agent_id
+                        logger.warning(f"Config watch not available for agent {self.agent_id} (404). Falling back to polling.")
+                        self._config_watch_connected = False
+                        await asyncio.sleep(self.update_interval)
+                        continue
+                    response.raise_for_status()
+                    self._config_watch_connected = True
+                    backoff = 1.0
+                    if response.status_code == 204: # timeout 동안 변경 없음
+                        retry_after = response.headers.get('Retry-After')
+                        if retry_after is not None:
+                            # 서버의 대기 연결 수 제한, 그동안은 heartbeat/폴링으로 설정 동기화
+                            logger.warning(f"Config watch is full on server, retrying in {retry_after}s for agent {self.agent_id}.")
+                            self._config_watch_connected = False
+                            await asyncio.sleep(float(retry_after))
+                        continue
+                    server_config = response.json()
+                    logger.info(f"Config watch: received config revision {server_config.get('config_revision')} for agent {self.agent_id}.")
+                    await asyncio.to_thread(self.apply_server_config, server_config)
+                except httpx.HTTPError as e:
+                    logger.error(f"Config watch connection failed for agent {self.agent_id}: {e}")
+                    self._config_watch_connected = False
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.update_interval)
+                except Exception as e: # JSON 파싱 오류 등
+                    logger.error(f"Error processing watched config for agent {self.agent_id}: {e}", exc_info=True)
+                    self._config_watch_connected = False
+                    await asyncio.sleep(backoff)
+        finally:
+            self._config_watch_connected = False
+
+    def apply_server_config(self, server_config):
+        """ 서버 설정(에이전트 문서)의 카메라별 frame_transmission_enabled 를 로컬 스트림 상태에 반영 """
+        logger.debug(f"Received config from server: {server_config}")
+        with self._config_lock:
+            if not self.cameras or not self.device_paths: # 관리 카메라가 없으면 적용하지 않음 (revision 도 유지)
+                return
+            self._server_config = server_config
             server_cameras_info = server_config.get('cameras', [])
             if not server_cameras_info:
                 logger.warning("No camera configurations received from server.")
                 return
 
-            # 이 Agent가 관리하는 카메라(ID 기준)에 대한 설정을 찾음
-            my_cam_config_from_server = None
-            for cam_info in server_cameras_info:
-                if cam_info.get('camera_id') == self.camera_id:
-                    my_cam_config_from_server = cam_info
-                    break
-            
-            if my_cam_config_from_server:
+            # 이 Agent가 관리하는 카메라(ID 기준)별로 서버 설정을 찾아 적용
+            server_configs_by_id = {cam_info.get('camera_id'): cam_info for cam_info in server_cameras_info}
+            for camera in list(self.cameras):
+                camera_id = camera.get('camera_id')
+                device_path = camera.get('_device_path')
+                my_cam_config_from_server = server_configs_by_id.get(camera_id)
+                if not my_cam_config_from_server:
+                    logger.warning(f"Configuration for camera_id {camera_id} not found in server response.")
+                    continue
+
                 desired_fte = my_cam_config_from_server.get('frame_transmission_enabled', False)
-                current_fte = self.cameras[0].get('frame_transmission_enabled', False) # 로컬 상태
+                current_fte = camera.get('frame_transmission_enabled', False) # 로컬 상태
 
-                logger.debug(f"Camera {self.camera_id}: Server wants FTE={desired_fte}, current FTE={current_fte}")
+                logger.debug(f"Camera {camera_id}: Server wants FTE={desired_fte}, current FTE={current_fte}")
 
                 if desired_fte and not current_fte:
-                    logger.info(f"Server requests to START frame transmission for camera {self.camera_id}. Starting stream...")
-                    self.start_stream()
+                    logger.info(f"Server requests to START frame transmission for camera {camera_id}. Starting stream...")
+                    self.start_stream(device_path)
                 elif not desired_fte and current_fte:
-                    logger.info(f"Server requests to STOP frame transmission for camera {self.camera_id}. Stopping stream...")
-                    self.stop_stream()
+                    logger.info(f"Server requests to STOP frame transmission for camera {camera_id}. Stopping stream...")
+                    self.stop_stream(device_path)
                 # 상태가 이미 일치하면 아무것도 안 함
-            else:
-                logger.warning(f"Configuration for camera_id {self.camera_id} not found in server response.")
+            if 'config_revision' in server_config:
+                self.config_revision = server_config['config_revision']
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to sync config from server for agent {self.agent_id}: {e}")
-        except Exception as e: # JSON 파싱 오류 등
-            logger.error(f"Error processing server config for agent {self.agent_id}: {e}", exc_info=True)
 
+    def _refresh_cameras(self):
+        """ self.cameras 재구성 (설정 적용/장치 감시가 카메라 상태를 바꾸는 중에 목록을 교체하지 않도록 락 안에서) """
+        with self._config_lock:
+            self._build_camera_object()
 
     def get_camera_info(self):
-        """ Agent의 FastAPI 엔드포인트에서 사용될 카메라 정보 반환 """
+        """ Agent의 FastAPI 엔드포인트에서 사용될 카메라 정보 반환 (스레드 풀에서 호출) """
         # 현재 상태를 반영하기 위해 _build_camera_object() 호출
-        if self.current_device_path: # 장치가 있을 때만 업데이트 시도
-            self._build_camera_object()
-        return self.cameras
-
-    def start_stream(self): # device 인자 제거, self.current_device_path 사용
-        if not self.current_device_path:
-            logger.warning("No current device path set to start streaming.")
-            return False
-        
-        success = False
-        if self.streaming_method == 'RTSP' and self.rtsp_server:
-            logger.info(f"Attempting to start RTSP stream for device {self.current_device_path}...")
-            success = self.rtsp_server.start_stream(self.current_device_path)
-        elif self.streaming_method == 'KAFKA' and self.kafka_streamer:
-            logger.info(f"Attempting to start Kafka stream for device {self.current_device_path}...")
-            self.kafka_streamer.start_stream() # KafkaStreamer의 start_stream은 스레드 시작
-            success = True # KafkaStreamer는 스레드를 시작하므로 즉시 성공으로 간주 (실제 스트리밍은 스레드 내에서)
-        else:
+        with self._config_lock:
+            if self.device_paths: # 장치가 있을 때만 업데이트 시도
+                self._build_camera_object()
+            return self.cameras
+
+    def start_stream(self, device_path=None):
+        """ 단일 카메라 모드에서는 current_device_path, 다중 카메라 모드에서는 device_path (생략 시 모든 장치) 스트림 시작 """
+        with self._config_lock:
+            if not self.device_paths:
+                logger.warning("No current device path set to start streaming.")
+                return False
+            if self.multi_camera:
+                targets = [device_path] if device_path else list(self.device_paths)
+                results = [self._start_device_stream(device) for device in targets]
+                return all(results)
+            return self._start_device_stream(self.current_device_path)
+
+    def _start_device_stream(self, device_path):
+        if not any([self.rtsp_server and 'RTSP' in self.streaming_methods,
+                    self.kafka_streamer and 'KAFKA' in self.streaming_methods]):
             logger.warning(f"No valid streaming_method ({self.streaming_method}) or server/streamer instance to start stream.")
             return False
 
-        if success and self.cameras:
-            self.cameras[0]['status'] = 'streaming'
-            self.cameras[0]['frame_transmission_enabled'] = True
-            self.cameras[0]['last_update'] = datetime.utcnow().isoformat()
-            logger.info(f"Stream started for {self.current_device_path}. Updated local camera status.")
-        elif self.cameras: # 성공하지 못했으나 카메라 객체는 존재
-             self.cameras[0]['status'] = 'error' # 또는 'active' (시작 실패)
-             self.cameras[0]['frame_transmission_enabled'] = False
-             logger.warning(f"Failed to start stream for {self.current_device_path}.")
+        success = True
+        if 'RTSP' in self.streaming_methods and self.rtsp_server:
+            logger.info(f"Attempting to start RTSP stream for device {device_path}...")
+            source = self._acquire_hub(device_path, 'rtsp')
+            if not self.rtsp_server.start_stream(device_path, self._mount_for(device_path), source=source):
+                self._release_hub(device_path, 'rtsp')
+                success = False
+        if 'KAFKA' in self.streaming_methods and self.kafka_streamer:
+            logger.info(f"Attempting to start Kafka stream for device {device_path}...")
+            self._acquire_hub(device_path, 'kafka')
+            self.kafka_streamer.start_stream() # KafkaStreamer의 start_stream은 스레드 시작
+            # KafkaStreamer는 스레드를 시작하므로 즉시 성공으로 간주 (실제 스트리밍은 스레드 내에서)
+
+        if success:
+            self._start_dvr(device_path)
+            self._set_camera_state(device_path, 'streaming', True)
+            logger.info(f"Stream started for {device_path}. Updated local camera status.")
+        else: # 성공하지 못했으나 카메라 객체는 존재
+            self._set_camera_state(device_path, 'error', False, touch=False) # 또는 'active' (시작 실패)
+            logger.warning(f"Failed to start stream for {device_path}.")
         return success
 
-    def stop_stream(self): # device 인자 제거
-        logger.info(f"Attempting to stop stream (method: {self.streaming_method})...")
-        if self.streaming_method == 'RTSP' and self.rtsp_server:
-            self.rtsp_server.stop_stream()
-        elif self.streaming_method == 'KAFKA' and self.kafka_streamer:
-            self.kafka_streamer.stop_stream()
-        else:
-            logger.warning(f"No valid streaming_method ({self.streaming_method}) or server/streamer instance to stop stream.")
-            return
+    def stop_stream(self, device_path=None):
+        """ device_path 를 생략하면 관리 중인 모든 카메라의 스트림 중지 """
+        with self._config_lock:
+            logger.info(f"Attempting to stop stream (method: {self.streaming_method})...")
+            if not any([self.rtsp_server and 'RTSP' in self.streaming_methods,
+                        self.kafka_streamer and 'KAFKA' in self.streaming_methods]):
+                logger.warning(f"No valid streaming_method ({self.streaming_method}) or server/streamer instance to stop stream.")
+                return
 
-        if self.cameras: # 카메라 객체가 있다면 상태 업데이트
-            self.cameras[0]['status'] = 'active' # 스트림 중지 후 'active' 상태로 변경 (장치는 여전히 사용 가능 가정)
-            self.cameras[0]['frame_transmission_enabled'] = False
-            self.cameras[0]['last_update'] = datetime.utcnow().isoformat()
+            targets = [device_path] if device_path and self.multi_camera else list(self.device_paths)
+            for device in targets:
+                self._stop_dvr(device) # warm 인코더를 탭하므로 RTSP 보다 먼저 중지
+            if 'RTSP' in self.streaming_methods and self.rtsp_server:
+                self.rtsp_server.stop_stream(self._mount_for(device_path))
+                for device in targets:
+                    self._release_hub(device, 'rtsp')
+            if 'KAFKA' in self.streaming_methods and self.kafka_streamer:
+                self.kafka_streamer.stop_stream()
+                for device in targets:
+                    self._release_hub(device, 'kafka')
+
+            for device in targets:
+                # 스트림 중지 후 'active' 상태로 변경 (장치는 여전히 사용 가능 가정)
+                self._set_camera_state(device, 'active', False)
             logger.info("Stream stopped. Updated local camera status.")
 
-    def check_status(self):
+    def _set_camera_state(self, device_path, status, frame_transmission_enabled, touch=True):
+        for camera in self.cameras:
+            if camera.get('_device_path') == device_path:
+                camera['status'] = status
+                camera['frame_transmission_enabled'] = frame_transmission_enabled
+                if touch:
+                    camera['last_update'] = datetime.utcnow().isoformat()
+
+    def check_status(self, device_path=None):
         # 현재 스트리밍 파이프라인의 실제 동작 상태를 반환
-        if self.streaming_method == 'RTSP' and self.rtsp_server:
-            return self.rtsp_server.is_streaming
-        elif self.streaming_method == 'KAFKA' and self.kafka_streamer:
-            return self.kafka_streamer.is_alive() # KafkaStreamer의 running 플래그 제공하는 getter 사용
-        return False
-
-    def stop_manager_thread(self): # threading.Thread의 stop은 없으므로 이름 변경
-        logger.info(f"Stopping CameraManager thread for agent {self.agent_id}...")
+        # 다중 카메라 모드에서 device_path 를 주면 해당 장치의 mount 상태, 생략하면 하나라도 스트리밍 중인지
+        # 여러 방식을 동시에 쓰면 모든 출력이 동작 중일 때만 True (하나가 죽으면 서버 설정 동기화에서 다시 시작)
+        states = []
+        if 'RTSP' in self.streaming_methods and self.rtsp_server:
+            if self.multi_camera and device_path:
+                states.append(self.rtsp_server.is_mount_streaming(self._mount_for(device_path)))
+            else:
+                states.append(self.rtsp_server.is_streaming)
+        if 'KAFKA' in self.streaming_methods and self.kafka_streamer:
+            states.append(self.kafka_streamer.is_alive()) # KafkaStreamer의 running 플래그 제공하는 getter 사용
+        return bool(states) and all(states)
+
+    def get_stream_stats(self):
+        """ 현재 스트리밍 파이프라인의 런타임 통계 (Kafka 모드에서 프레임 전달 지연 등) """
+        stats = {}
+        if 'KAFKA' in self.streaming_methods and self.kafka_streamer:
+            stats = self.kafka_streamer.get_stats()
+        if 'RTSP' in self.streaming_methods and self.rtsp_server:
+            stats = dict(stats, rtsp_abr=self.rtsp_server.get_abr_state(), rtsp_warm=self.rtsp_server.get_warm_state(),
+                         hls=self.rtsp_server.get_hls_state())
+        if self.capture_hubs:
+            stats = dict(stats, capture_hubs={device: hub.snapshot() for device, hub in self.capture_hubs.items()})
+        stats = dict(stats, snapshots=self.snapshots.snapshot())
+        if self.dvr_recorders:
+            stats = dict(stats, dvr={device: recorder.snapshot(include_segments=False)
+                                     for device, recorder in self.dvr_recorders.items()})
+        return stats
+
+    def get_subscription_manager(self):
+        """ 프레임 샘플링 구독 관리자, Kafka 캡처 파이프라인이 있는 모드에서만 사용 가능 """
+        if 'KAFKA' in self.streaming_methods and self.kafka_streamer:
+            return self.kafka_streamer.subscriptions
+        return None
+
+    def shutdown(self):
+        """ 스트림/허브/레지스트리 정리 (제어 평면 태스크를 취소한 뒤 스레드 풀에서 호출) """
+        logger.info(f"Shutting down CameraManager for agent {self.agent_id}...")
         self.running = False
-        self.stop_stream() # 현재 진행 중인 스트림도 중지
\ No newline at end of file
+        with self._config_lock: # 취소된 태스크가 스레드 풀에 남긴 장치 감시/설정 적용이 끝날 때까지 대기
+            self.stop_stream() # 현재 진행 중인 스트림도 중지
+            for hub in list(self.capture_hubs.values()):
+                hub.stop()
+        self.device_registry.stop()
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+
+카메라 장치를 한 번만 열어 여러 출력(RTSP, Kafka, 로컬 스냅샷)에 원본 프레임을 나눠주는 캡처 허브
+
+v4l2src ! videorate ! caps ! videoconvert(I420) ! tee
+    t. ! queue leaky ! intervideosink channel=<허브 채널>-rtsp   -> RTSP factory 의 intervideosrc
+    t. ! queue leaky ! intervideosink channel=<허브 채널>-kafka  -> KafkaStreamer 의 intervideosrc
+    t. ! queue leaky ! appsink sink_local                         -> get_latest_frame() (스냅샷 등)
+- 장치 캡처와 색 변환은 허브에서 한 번만 수행, 출력 쪽 파이프라인은 intervideosrc 로 시작
+- I420 은 x264enc/jpegenc 가 그대로 받으므로 RTSP/jpeg 출력은 추가 변환이 없음 (raw BGR 출력만 변환 1회)
+- 출력이 acquire() 하면 시작, 마지막 출력이 release() 하면 장치를 닫음
+- 허브가 동작 중인 장치는 is_camera_available() 에서 다시 열지 않음
+
+"""
+
+# app/capture_hub.py
+import threading
+import logging
+import os
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst, GLib
+
+logger = logging.getLogger(__name__)
+
+HUB_OUTPUTS = ('rtsp', 'kafka')
+LOCAL_SINK_NAME = 'sink_local'
+
+
+def hub_channel(channel_prefix, output):
+    return f"{channel_prefix}-{output}"
+
+
+def hub_source_str(channel_prefix, output):
+    """ 출력 쪽 파이프라인의 소스 문자열 (v4l2src 대신 사용), 허브 생성 전에도 만들 수 있음 """
+    # 허브가 아직 프레임을 보내지 않는 동안에는 intervideosrc 가 검은 화면을 내보냄
+    return f"intervideosrc channel={hub_channel(channel_prefix, output)}"
+
+
+class CaptureHub:
+    def __init__(self, device, width=None, height=None, fps=None, raw_format='I420', outputs=HUB_OUTPUTS,
+                 channel_prefix=None):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.raw_format = raw_format
+        self.outputs = tuple(outputs)
+        self.channel_prefix = channel_prefix or f"camera-hub-{os.path.basename(device)}"
+        self.pipeline = None
+        self.running = False
+        self.loop = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._users = set() # 허브를 사용 중인 출력 이름 (rtsp/kafka/local ...)
+        self._local_sink = None
+        self._last_sample = None
+        self.restarts = 0
+
+    def channel_for(self, output):
+        return hub_channel(self.channel_prefix, output)
+
+    def source_str(self, output):
+        if output not in self.outputs:
+            raise ValueError(f"Unknown capture hub output '{output}'. Available: {self.outputs}")
+        return hub_source_str(self.channel_prefix, output)
+
+    def _build_pipeline_str(self):
+        caps = ['video/x-raw']
+        if self.width and self.height:
+            caps.append(f"width={self.width},height={self.height}")
+        if self.fps:
+            caps.append(f"framerate={int(self.fps)}/1")
+        branches = [
+            f"t. ! queue max-size-buffers=2 leaky=downstream ! intervideosink channel={self.channel_for(output)} sync=false"
+            for output in self.outputs
+        ]
+        branches.append(
+            f"t. ! queue max-size-buffers=1 leaky=downstream ! "
+            f"appsink name={LOCAL_SINK_NAME} emit-signals=false max-buffers=1 drop=true sync=false"
+        )
+        branches_str = "\n".join(branches)
+        return f"""
+            v4l2src device={self.device} !
+            videorate ! {','.join(caps)} !
+            videoconvert ! video/x-raw,format={self.raw_format} !
+            tee name=t
+            {branches_str}
+        """
+
+    def acquire(self, user):
+        """ 출력 하나가 허브 사용 시작, 첫 사용자면 캡처 파이프라인 시작 """
+        with self._lock:
+            self._users.add(user)
+            if self._thread is None or not self._thread.is_alive():
+                self._start_locked()
+        return True
+
+    def release(self, user):
+        """ 출력 하나가 사용 종료, 마지막 사용자면 장치를 닫음 """
+        with self._lock:
+            self._users.discard(user)
+            if self._users:
+                return
+        self.stop()
+
+    def _start_locked(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name=f"capture-hub-{os.path.basename(self.device)}", daemon=True)
+        self._thread.start()
+        logger.info(f"CaptureHub started for device {self.device} (outputs: {self.outputs})")
+
+    def _run_loop(self):
+        Gst.init(None)
+        # KafkaStreamer 와 같이 스레드 전용 컨텍스트 사용 (RTSP 서버의 기본 루프와 분리)
+        context = GLib.MainContext.new()
+        context.push_thread_default()
+        self.loop = GLib.MainLoop.new(context, False)
+        try:
+            pipeline_str = self._build_pipeline_str()
+            logger.info(f"CaptureHub pipeline: {pipeline_str}")
+            try:
+                self.pipeline = Gst.parse_launch(pipeline_str)
+            except Exception as e:
+                logger.error(f"Failed to create CaptureHub pipeline for {self.device}: {e}")
+                return
+            self._local_sink = self.pipeline.get_by_name(LOCAL_SINK_NAME)
+            bus = self.pipeline.get_bus()
+            bus.add_signal_watch()
+            bus.connect("message", self.on_message)
+
+            self.pipeline.set_state(Gst.State.PLAYING)
+            state = self.pipeline.get_state(timeout=5 * Gst.SECOND)[1]
+            if state != Gst.State.PLAYING:
+                logger.error(f"Failed to set CaptureHub pipeline to PLAYING for {self.device}. Current state: {state}")
+                return
+            self.running = True
+            if not self._stop_event.is_set(): # 루프 생성 전에 stop() 된 경우
+                self.loop.run()
+        except Exception as e:
+            logger.error(f"Error running CaptureHub loop for {self.device}: {e}")
+        finally:
+            self.running = False
+            if self.pipeline:
+                self.pipeline.set_state(Gst.State.NULL)
+                self.pipeline.get_bus().remove_signal_watch()
+            self.pipeline = None
+            self._local_sink = None
+            self._last_sample = None
+            context.pop_thread_default()
+            self.loop = None
+            logger.info(f"CaptureHub loop for {self.device} finished.")
+
+    def on_message(self, bus, message):
+        t = message.type
+        if t == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            logger.error(f"CaptureHub GStreamer Error for {self.device}: {err}, Debug: {debug}")
+            self._quit_loop()
+        elif t == Gst.MessageType.EOS:
+            logger.info(f"CaptureHub End-Of-Stream for {self.device}.")
+            self._quit_loop()
+        elif t == Gst.MessageType.WARNING:
+            err, debug = message.parse_warning()
+            logger.warning(f"CaptureHub GStreamer Warning for {self.device}: {err}, Debug: {debug}")
+        return True
+
+    def _quit_loop(self, *args):
+        if self.loop and self.loop.is_running():
+            self.loop.quit()
+        return GLib.SOURCE_REMOVE
+
+    def ensure_running(self):
+        """ 사용자가 남아 있는데 파이프라인이 오류로 끝났으면 다시 시작 (CameraManager 주기 확인용) """
+        with self._lock:
+            if self._users and (self._thread is None or not self._thread.is_alive()):
+                self.restarts += 1
+                logger.warning(f"CaptureHub for {self.device} is down with active outputs {sorted(self._users)}. Restarting.")
+                self._start_locked()
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            self._stop_event.set()
+        loop = self.loop
+        if loop is not None:
+            source = GLib.Idle()
+            source.set_callback(self._quit_loop)
+            source.attach(loop.get_context())
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=5.0)
+            if thread.is_alive():
+                logger.warning(f"CaptureHub thread for {self.device} did not join in time.")
+        logger.info(f"CaptureHub stopped for device {self.device}.")
+
+    def is_alive(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def get_latest_sample(self):
+        """
+        로컬 소비자(스냅샷 등)용 최신 Gst.Sample (복사 없음)
+        appsink 는 최신 한 장만 보관하므로 새 프레임이 없으면 마지막으로 받은 프레임을 반환
+        """
+        sink = self._local_sink
+        if sink is None or not self.running:
+            return None
+        sample = sink.try_pull_sample(0)
+        if sample is not None:
+            self._last_sample = sample
+        return self._last_sample
+
+    def get_latest_frame(self):
+        """ 최신 프레임 (bytes, width, height, format, pts) """
+        sample = self.get_latest_sample()
+        if sample is None:
+            return None
+        buf = sample.get_buffer()
+        structure = sample.get_caps().get_structure(0)
+        success, map_info = buf.map(Gst.MapFlags.READ)
+        if not success:
+            return None
+        try:
+            data = bytes(map_info.data)
+        finally:
+            buf.unmap(map_info)
+        return (data, structure.get_value('width'), structure.get_value('height'),
+                structure.get_value('format'), buf.pts)
+
+    def snapshot(self):
+        with self._lock:
+            users = sorted(self._users)
+        return {
+            'device': self.device,
+            'running': self.running,
+            'users': users,
+            'outputs': list(self.outputs),
+            'raw_format': self.raw_format,
+            'restarts': self.restarts,
+        }
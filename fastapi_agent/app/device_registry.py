@@ -0,0 +1,297 @@
+"""
+
+V4L2 장치 레지스트리: /dev/video* 를 V4L2 ioctl 로 한 번 조회해 메모리에 보관하고 핫플러그 시에만 갱신
+
+- VIDIOC_QUERYCAP 으로 캡처 장치인지 확인 (UVC 카메라의 메타데이터 노드 등은 제외)
+- VIDIOC_ENUM_FMT / ENUM_FRAMESIZES / ENUM_FRAMEINTERVALS 로 포맷, 해상도, fps 목록 수집
+- /dev 를 inotify 로 감시해 videoN 노드 생성/삭제/권한 변경 시 해당 노드만 다시 조회
+  inotify 를 쓸 수 없으면 DEVICE_REGISTRY_RESCAN_SEC 주기 재조회만 사용
+- 가용성 확인은 메모리 조회 (GStreamer 파이프라인을 만들지 않음, 스트리밍 중인 장치도 ioctl 조회는 가능)
+
+"""
+
+# app/device_registry.py
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import glob
+import os
+import select
+import struct
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# linux/videodev2.h ioctl 번호 (_IOR/_IOWR('V', nr, struct))
+VIDIOC_QUERYCAP = 0x80685600 # struct v4l2_capability (104 bytes)
+VIDIOC_ENUM_FMT = 0xC0405602 # struct v4l2_fmtdesc (64 bytes)
+VIDIOC_ENUM_FRAMESIZES = 0xC02C564A # struct v4l2_frmsizeenum (44 bytes)
+VIDIOC_ENUM_FRAMEINTERVALS = 0xC034564B # struct v4l2_frmivalenum (52 bytes)
+
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_FRMSIZE_TYPE_DISCRETE = 1
+V4L2_FRMIVAL_TYPE_DISCRETE = 1
+
+# sys/inotify.h
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+MAX_ENUM = 256 # 잘못된 드라이버가 끝없이 항목을 돌려주는 경우 대비
+
+
+def _cstr(raw):
+    return raw.split(b'\0', 1)[0].decode('utf-8', 'replace')
+
+
+def _fourcc(value):
+    return struct.pack('<I', value).decode('ascii', 'replace').strip()
+
+
+def _enumerate(fd, request, size, prefix):
+    """ index 를 0 부터 늘리며 EINVAL 이 나올 때까지 ioctl 결과 버퍼를 반환 """
+    for index in range(MAX_ENUM):
+        buf = bytearray(size)
+        struct.pack_into('I', buf, 0, index)
+        buf[4:4 + len(prefix)] = prefix
+        try:
+            fcntl.ioctl(fd, request, buf, True)
+        except OSError as e:
+            if e.errno == errno.EINVAL:
+                return
+            raise
+        yield buf
+
+
+def _frame_intervals(fd, pixelformat, width, height):
+    fps = []
+    prefix = struct.pack('III', pixelformat, width, height)
+    for buf in _enumerate(fd, VIDIOC_ENUM_FRAMEINTERVALS, 52, prefix):
+        interval_type, numerator, denominator = struct.unpack_from('III', buf, 16)
+        if interval_type != V4L2_FRMIVAL_TYPE_DISCRETE:
+            # stepwise/continuous 는 최소 간격(최대 fps)만 기록
+            if numerator:
+                fps.append(round(denominator / numerator, 2))
+            break
+        if numerator:
+            fps.append(round(denominator / numerator, 2))
+    return sorted(set(fps), reverse=True)
+
+
+def _frame_sizes(fd, pixelformat):
+    sizes = []
+    for buf in _enumerate(fd, VIDIOC_ENUM_FRAMESIZES, 44, struct.pack('I', pixelformat)):
+        size_type = struct.unpack_from('I', buf, 8)[0]
+        if size_type == V4L2_FRMSIZE_TYPE_DISCRETE:
+            width, height = struct.unpack_from('II', buf, 12)
+            sizes.append({'width': width, 'height': height, 'fps': _frame_intervals(fd, pixelformat, width, height)})
+        else:
+            min_w, max_w, step_w, min_h, max_h, step_h = struct.unpack_from('IIIIII', buf, 12)
+            sizes.append({'min_width': min_w, 'max_width': max_w, 'step_width': step_w,
+                          'min_height': min_h, 'max_height': max_h, 'step_height': step_h,
+                          'fps': _frame_intervals(fd, pixelformat, max_w, max_h)})
+            break
+    return sizes
+
+
+def query_device(path):
+    """ V4L2 장치 정보 조회, 열 수 없으면 OSError """
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    try:
+        buf = bytearray(104)
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf, True)
+        driver, card, bus_info = _cstr(buf[0:16]), _cstr(buf[16:48]), _cstr(buf[48:80])
+        capabilities, device_caps = struct.unpack_from('II', buf, 84)
+        caps = device_caps if capabilities & V4L2_CAP_DEVICE_CAPS else capabilities
+        is_capture = bool(caps & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE))
+        formats = []
+        if is_capture:
+            type_prefix = struct.pack('I', V4L2_BUF_TYPE_VIDEO_CAPTURE)
+            for fmt in _enumerate(fd, VIDIOC_ENUM_FMT, 64, type_prefix):
+                pixelformat = struct.unpack_from('I', fmt, 44)[0]
+                formats.append({
+                    'fourcc': _fourcc(pixelformat),
+                    'description': _cstr(fmt[12:44]),
+                    'sizes': _frame_sizes(fd, pixelformat),
+                })
+        return {
+            'path': path,
+            'driver': driver,
+            'card': card,
+            'bus_info': bus_info,
+            'is_capture': is_capture,
+            'formats': formats,
+        }
+    finally:
+        os.close(fd)
+
+
+class _Inotify:
+    """ libc inotify 의 최소 래퍼 (추가 의존성 없음) """
+    def __init__(self, directory, mask):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+        if libc.inotify_add_watch(self.fd, directory.encode(), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f'inotify_add_watch({directory}) failed')
+
+    def read_names(self, timeout_sec):
+        """ timeout 동안 이벤트를 기다려 변경된 파일 이름 집합 반환 """
+        ready, _, _ = select.select([self.fd], [], [], timeout_sec)
+        if not ready:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        names = set()
+        offset = 0
+        while offset + IN_EVENT_HEADER.size <= len(data):
+            _wd, _mask, _cookie, length = IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += IN_EVENT_HEADER.size
+            names.add(data[offset:offset + length].split(b'\0', 1)[0].decode('utf-8', 'replace'))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DeviceRegistry:
+    def __init__(self, dev_dir='/dev', pattern='video*'):
+        self.dev_dir = dev_dir
+        self.pattern = pattern
+        self.rescan_sec = max(float(os.getenv('DEVICE_REGISTRY_RESCAN_SEC', 60)), 1.0) # inotify 누락 대비 전체 재조회 주기
+        self._lock = threading.Lock()
+        self._devices = {} # path -> query_device 결과 또는 {'path', 'error'}
+        self.generation = 0 # 캡처 장치 목록/정보가 바뀔 때마다 증가 (CameraManager 핫플러그 감지용)
+        self.last_scan = None
+        self.watching = False # inotify 사용 여부
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self.scan()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="device-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=5.0)
+        self._thread = None
+
+    def _watch_loop(self):
+        watcher = None
+        try:
+            watcher = _Inotify(self.dev_dir, IN_CREATE | IN_DELETE | IN_ATTRIB | IN_MOVED_TO | IN_MOVED_FROM)
+            self.watching = True
+            logger.info(f"DeviceRegistry watching {self.dev_dir} for camera hotplug events.")
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}). DeviceRegistry falls back to rescanning every {self.rescan_sec}s.")
+        next_scan = time.monotonic() + self.rescan_sec
+        try:
+            while not self._stop_event.is_set():
+                timeout = min(max(next_scan - time.monotonic(), 0), 1.0) # stop 확인을 위해 최대 1 초
+                if watcher is not None:
+                    prefix = self.pattern.rstrip('*')
+                    for name in watcher.read_names(timeout):
+                        if name.startswith(prefix):
+                            # 생성 직후에는 udev 가 권한을 바꾸기 전일 수 있음 -> IN_ATTRIB 로 다시 조회됨
+                            self.refresh(os.path.join(self.dev_dir, name))
+                else:
+                    self._stop_event.wait(timeout)
+                if time.monotonic() >= next_scan:
+                    self.scan()
+                    next_scan = time.monotonic() + self.rescan_sec
+        except Exception as e:
+            logger.error(f"DeviceRegistry watcher failed: {e}")
+        finally:
+            self.watching = False
+            if watcher is not None:
+                watcher.close()
+
+    def scan(self):
+        """ 모든 videoN 노드 재조회, 사라진 노드 제거 """
+        paths = sorted(glob.glob(os.path.join(self.dev_dir, self.pattern)))
+        with self._lock:
+            removed = [path for path in self._devices if path not in paths]
+            for path in removed:
+                del self._devices[path]
+            if removed:
+                self.generation += 1
+        for path in paths:
+            self.refresh(path)
+        self.last_scan = time.time()
+
+    def refresh(self, path):
+        """ 노드 하나 재조회 (핫플러그 이벤트) """
+        try:
+            info = query_device(path)
+        except FileNotFoundError:
+            info = None
+        except OSError as e:
+            if e.errno == errno.ENOTTY: # V4L2 장치가 아닌 노드
+                info = {'path': path, 'is_capture': False}
+            else:
+                info = {'path': path, 'error': os.strerror(e.errno) if e.errno else str(e)}
+        except Exception as e:
+            info = {'path': path, 'error': str(e)}
+        with self._lock:
+            previous = self._devices.get(path)
+            if info is None:
+                if previous is not None:
+                    del self._devices[path]
+                    self.generation += 1
+                    logger.info(f"Camera device {path} removed.")
+                return
+            if info != previous:
+                self._devices[path] = info
+                self.generation += 1
+                if info.get('is_capture'):
+                    logger.info(f"Camera device {path} registered: {info['card']} ({info['driver']}), "
+                                f"formats {[f['fourcc'] for f in info['formats']]}")
+                elif 'error' in info:
+                    logger.warning(f"Camera device {path} could not be queried: {info['error']}")
+
+    def capture_devices(self):
+        """ 캡처 가능한 장치 경로 목록 (정렬) """
+        with self._lock:
+            return sorted(path for path, info in self._devices.items() if info.get('is_capture'))
+
+    def is_available(self, path):
+        """ True/False, 조회 오류(권한 등)로 판단할 수 없으면 None """
+        with self._lock:
+            info = self._devices.get(os.path.realpath(path)) # /dev/v4l/by-id/... 심볼릭 링크 허용
+        if info is None:
+            return False
+        if 'error' in info:
+            return None
+        return info['is_capture']
+
+    def get(self, path):
+        with self._lock:
+            return self._devices.get(os.path.realpath(path))
+
+    def snapshot(self):
+        with self._lock:
+            devices = [dict(info) for _, info in sorted(self._devices.items())]
+        return {
+            'devices': devices,
+            'generation': self.generation,
+            'watching': self.watching,
+            'last_scan': self.last_scan,
+        }
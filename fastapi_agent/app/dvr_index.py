@@ -0,0 +1,171 @@
+"""
+
+DVR 세그먼트 인덱스 (시각 -> 세그먼트 파일) 및 클립 byte-range 계산
+
+- DVRRecorder 가 splitmuxsink 의 fragment-opened/closed 메시지로 세그먼트 시작/종료 시각을 기록
+- 세그먼트는 각각 PAT/PMT 로 시작하는 MPEG-TS 이므로 시간순으로 이어 붙이면 그대로 재생 가능한 클립이 됨 (재인코딩 없음)
+- 클립은 요청 구간과 겹치는 세그먼트 전체 (세그먼트 안에서 자르지 않음), 실제 포함 구간은 ClipPlan.start/end
+- 클립 byte-range 는 이어 붙인 가상 파일 기준으로 계산해서 각 세그먼트 파일을 seek/read
+- GStreamer 의존성 없는 순수 로직
+
+"""
+
+# app/dvr_index.py
+import os
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class Segment:
+    def __init__(self, path, start):
+        self.path = path
+        self.start = start # 첫 프레임 시각 (epoch 초)
+        self.end = None # 닫히기 전(기록 중)이면 None
+        self.size = 0
+
+    def current_size(self):
+        if self.end is not None:
+            return self.size
+        try:
+            return os.path.getsize(self.path) # 기록 중인 세그먼트는 조회 시점 크기까지만
+        except OSError:
+            return 0
+
+    def to_dict(self, now):
+        return {
+            'file': os.path.basename(self.path),
+            'start': round(self.start, 3),
+            'end': round(self.end if self.end is not None else now, 3),
+            'bytes': self.current_size(),
+            'recording': self.end is None,
+        }
+
+
+class ClipPlan:
+    """ 요청 구간과 겹치는 세그먼트 목록과 이어 붙인 클립의 크기 """
+    def __init__(self, segments, now):
+        self.parts = [(segment.path, segment.current_size()) for segment in segments]
+        self.parts = [(path, size) for path, size in self.parts if size > 0]
+        self.start = segments[0].start if segments else None
+        self.end = (segments[-1].end or now) if segments else None
+        self.total_bytes = sum(size for _, size in self.parts)
+
+    def iter_bytes(self, first=0, last=None, chunk_size=256 * 1024):
+        """ 클립 기준 [first, last] 바이트를 세그먼트 파일에서 순서대로 읽음 """
+        last = self.total_bytes - 1 if last is None else min(last, self.total_bytes - 1)
+        offset = 0
+        for path, size in self.parts:
+            part_first = max(first - offset, 0)
+            part_last = min(last - offset, size - 1)
+            offset += size
+            if part_first > part_last:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(part_first)
+                    remaining = part_last - part_first + 1
+                    while remaining > 0:
+                        data = f.read(min(chunk_size, remaining))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                        yield data
+            except OSError as e:
+                # 링에서 덮어쓰기/삭제된 세그먼트, 이미 보낸 응답은 그대로 끝냄
+                logger.warning(f"DVR segment {path} is no longer readable: {e}")
+                return
+            if offset > last:
+                return
+
+
+def parse_byte_range(header, total):
+    """
+    'bytes=first-last' (단일 구간) -> (first, last), Range 헤더가 없으면 None
+    만족할 수 없는 구간이면 ValueError (HTTP 416)
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        raise ValueError(f"Unsupported range: {header}")
+    first, last = match.groups()
+    if first == '': # 'bytes=-N' : 마지막 N 바이트
+        length = int(last)
+        if length == 0:
+            raise ValueError(f"Unsatisfiable range: {header}")
+        return max(total - length, 0), total - 1
+    first = int(first)
+    last = int(last) if last else total - 1
+    if first >= total or last < first:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return first, min(last, total - 1)
+
+
+class SegmentIndex:
+    def __init__(self, retention_sec):
+        self.retention_sec = float(retention_sec)
+        self._lock = threading.Lock()
+        self._segments = [] # 시작 시각 순서
+
+    def open_segment(self, path, start):
+        with self._lock:
+            # splitmuxsink 는 max-files 에 도달하면 가장 오래된 파일 이름을 다시 사용
+            self._segments = [s for s in self._segments if s.path != path]
+            if self._segments and self._segments[-1].end is None:
+                self._close_locked(self._segments[-1], start) # closed 메시지를 놓친 경우
+            self._segments.append(Segment(path, start))
+            self._prune_locked(start)
+
+    def close_segment(self, path, end):
+        with self._lock:
+            for segment in reversed(self._segments):
+                if segment.path == path and segment.end is None:
+                    self._close_locked(segment, end)
+                    break
+
+    def close_recording(self, end):
+        """ 기록 중인 세그먼트를 닫음 (녹화 파이프라인이 closed 메시지 없이 끝난 경우) """
+        with self._lock:
+            if self._segments and self._segments[-1].end is None:
+                self._close_locked(self._segments[-1], end)
+
+    def _close_locked(self, segment, end):
+        segment.end = end
+        try:
+            segment.size = os.path.getsize(segment.path)
+        except OSError:
+            segment.size = 0
+
+    def _prune_locked(self, now):
+        self._segments = [s for s in self._segments
+                          if s.end is None or (now - s.end <= self.retention_sec and os.path.exists(s.path))]
+
+    def clear(self):
+        with self._lock:
+            self._segments = []
+
+    def clip(self, start, end, now=None):
+        """ [start, end] (epoch 초) 와 겹치는 세그먼트로 ClipPlan 생성 """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._prune_locked(now)
+            segments = [s for s in self._segments
+                        if s.start <= end and (s.end if s.end is not None else now) >= start]
+            return ClipPlan(segments, now)
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            segments = [s.to_dict(now) for s in self._segments]
+        return {
+            'segments': segments,
+            'oldest': segments[0]['start'] if segments else None,
+            'newest': segments[-1]['end'] if segments else None,
+            'total_bytes': sum(s['bytes'] for s in segments),
+        }
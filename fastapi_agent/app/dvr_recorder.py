@@ -0,0 +1,219 @@
+"""
+
+온디바이스 DVR: 최근 영상을 MPEG-TS 세그먼트 링으로 디스크에 보관하고 시간 구간으로 클립 조회
+
+- mount 에 H.264 warm 인코더가 있으면 appsrc(dvrsrc) 를 WarmEncoder.add_sink 로 등록해 재인코딩 없이 기록
+  (HLS 와 같은 방식, RTSP 세션/HLS/DVR 이 인코딩 결과 하나를 함께 사용, 세그먼트는 warm 인코더의 키프레임에서 분할)
+- warm 인코더가 없으면 (Kafka 전용 모드) 탭할 상시 H.264 출력이 없으므로 캡처 허브의 dvr 출력(intervideosrc) -> x264enc -> splitmuxsink(mpegtsmux) 로 직접 인코딩
+- 세그먼트 길이(DVR_SEGMENT_SEC)와 보관 시간(DVR_RETENTION_SEC)으로 파일 수가 정해지는 고정 크기 링
+  splitmuxsink 의 max-files 가 가장 오래된 파일을 덮어쓰므로 디스크 사용량이 제한됨
+- 세그먼트 시작/종료 시각은 bus 의 splitmuxsink-fragment-opened/closed 메시지로 SegmentIndex 에 기록
+- 디렉터리 정리는 생성 후 첫 시작과 stop() 이후 시작에서만, 오류 후 ensure_running() 재시작은 세그먼트/인덱스를 유지하고
+  splitmuxsink start-index 를 이어서 다음 링 위치부터 기록 (장애 직전 구간을 클립으로 받을 수 있도록)
+- 클립은 겹치는 세그먼트를 그대로 이어 붙인 TS (재인코딩 없음), byte-range 로 부분 전송 가능
+
+"""
+
+# app/dvr_recorder.py
+import glob
+import math
+import os
+import threading
+import time
+import logging
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst, GLib
+
+from .dvr_index import SegmentIndex
+from .pipeline_builder import build_dvr_pipeline_str, build_dvr_tap_pipeline_str, DVR_SOURCE_NAME
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = 'segment-%05d.ts'
+
+
+class DVRRecorder:
+    def __init__(self, name, source=None, fps=None, warm=None):
+        self.name = name
+        self.source = source # warm 인코더가 없을 때 인코딩할 캡처 허브 소스
+        self.warm = warm # H.264 WarmEncoder, 있으면 그 출력을 그대로 기록
+        self.fps = fps
+        self.segment_sec = max(float(os.getenv('DVR_SEGMENT_SEC', 4)), 1.0)
+        self.retention_sec = max(float(os.getenv('DVR_RETENTION_SEC', 120)), self.segment_sec)
+        self.max_segment_bytes = int(os.getenv('DVR_SEGMENT_MAX_MB', 0)) * 1024 * 1024 # 0 이면 시간 기준으로만 분할
+        self.bitrate_kbps = int(os.getenv('DVR_BITRATE_KBPS', 1000))
+        self.directory = os.path.join(os.getenv('DVR_DIR', '/var/tmp/camera-agent-dvr'), name)
+        # 보관 시간을 채우는 세그먼트 수 + 기록 중인 세그먼트 1 개
+        self.max_files = int(math.ceil(self.retention_sec / self.segment_sec)) + 1
+        self.index = SegmentIndex(self.retention_sec)
+        self.pipeline = None
+        self.running = False
+        self.loop = None
+        self._thread = None
+        self._appsrc = None
+        self._stop_event = threading.Event()
+        self._stopped = False # stop() 으로 끝낸 경우 (오류 종료와 구분)
+        self._wall_offset = None # 파이프라인 running-time -> epoch 초 변환값
+        self._fresh = True # 다음 시작에서 이전 세그먼트를 정리할지 (생성 직후, stop() 이후)
+        self._next_index = 0 # 다음 세그먼트의 splitmuxsink fragment 번호 (파일 이름은 max-files 로 나눈 나머지)
+        self.restarts = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run_loop, name=f"dvr-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"DVRRecorder started for {self.name} ({self.segment_sec}s segments, {self.retention_sec}s retention)")
+
+    def _prepare_directory(self):
+        """ 이전 실행(프로세스 재시작, stop())의 세그먼트는 인덱스가 없으므로 삭제 (링 크기 유지) """
+        os.makedirs(self.directory, exist_ok=True)
+        for path in glob.glob(os.path.join(self.directory, '*.ts')):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to remove stale DVR segment {path}: {e}")
+        self.index.clear()
+        self._next_index = 0
+
+    def _run_loop(self):
+        Gst.init(None)
+        context = GLib.MainContext.new()
+        context.push_thread_default()
+        self.loop = GLib.MainLoop.new(context, False)
+        try:
+            if self._fresh:
+                self._prepare_directory()
+                self._fresh = False
+            location = os.path.join(self.directory, SEGMENT_PATTERN)
+            if self.warm is not None:
+                pipeline_str = build_dvr_tap_pipeline_str(location, self.segment_sec, self.max_files,
+                                                          self.max_segment_bytes, self._next_index)
+            else:
+                pipeline_str = build_dvr_pipeline_str(self.source, location, self.segment_sec, self.max_files,
+                                                      self.fps, self.bitrate_kbps, self.max_segment_bytes,
+                                                      self._next_index)
+            logger.info(f"DVRRecorder pipeline for {self.name}: {pipeline_str}")
+            try:
+                self.pipeline = Gst.parse_launch(pipeline_str)
+            except Exception as e:
+                logger.error(f"Failed to create DVRRecorder pipeline for {self.name}: {e}")
+                return
+            if self.warm is not None:
+                self._appsrc = self.pipeline.get_by_name(DVR_SOURCE_NAME)
+                # 캐시된 GOP 부터 받으므로 첫 세그먼트가 키프레임으로 시작
+                self._appsrc.connect('need-data', lambda src, length: self.warm.add_sink(src))
+            bus = self.pipeline.get_bus()
+            bus.add_signal_watch()
+            bus.connect("message", self.on_message)
+
+            self.pipeline.set_state(Gst.State.PLAYING)
+            state = self.pipeline.get_state(timeout=5 * Gst.SECOND)[1]
+            if state != Gst.State.PLAYING:
+                logger.error(f"Failed to set DVRRecorder pipeline to PLAYING for {self.name}. Current state: {state}")
+                return
+            self._wall_offset = self._compute_wall_offset()
+            self.running = True
+            if not self._stop_event.is_set():
+                self.loop.run()
+        except Exception as e:
+            logger.error(f"Error running DVRRecorder loop for {self.name}: {e}")
+        finally:
+            self.running = False
+            if self._appsrc is not None:
+                self.warm.remove_sink(self._appsrc)
+                self._appsrc = None
+            if self.pipeline:
+                # EOS 없이 NULL 로 바꾸면 기록 중인 세그먼트는 마지막 키프레임 이후가 잘릴 수 있음 (TS 는 그대로 재생 가능)
+                self.pipeline.set_state(Gst.State.NULL)
+                self.pipeline.get_bus().remove_signal_watch()
+            self.pipeline = None
+            self.index.close_recording(time.time()) # 재시작 전까지의 빈 구간이 마지막 세그먼트에 포함되지 않도록
+            context.pop_thread_default()
+            self.loop = None
+            logger.info(f"DVRRecorder loop for {self.name} finished.")
+
+    def _compute_wall_offset(self):
+        clock = self.pipeline.get_clock()
+        if clock is None:
+            return None
+        running_time = clock.get_time() - self.pipeline.get_base_time()
+        return time.time() - running_time / Gst.SECOND
+
+    def _wall_time(self, structure):
+        if self._wall_offset is None or not structure.has_field('running-time'):
+            return time.time()
+        return self._wall_offset + structure.get_value('running-time') / Gst.SECOND
+
+    def on_message(self, bus, message):
+        t = message.type
+        if t == Gst.MessageType.ELEMENT:
+            structure = message.get_structure()
+            name = structure.get_name() if structure else None
+            if name == 'splitmuxsink-fragment-opened':
+                self._next_index += 1
+                self.index.open_segment(structure.get_value('location'), self._wall_time(structure))
+            elif name == 'splitmuxsink-fragment-closed':
+                self.index.close_segment(structure.get_value('location'), self._wall_time(structure))
+        elif t == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            logger.error(f"DVRRecorder GStreamer Error for {self.name}: {err}, Debug: {debug}")
+            self._quit_loop()
+        elif t == Gst.MessageType.EOS:
+            logger.info(f"DVRRecorder End-Of-Stream for {self.name}.")
+            self._quit_loop()
+        return True
+
+    def _quit_loop(self, *args):
+        if self.loop and self.loop.is_running():
+            self.loop.quit()
+        return GLib.SOURCE_REMOVE
+
+    def ensure_running(self):
+        """ 오류로 끝난 녹화 파이프라인 재시작 (CameraManager 주기 확인용) """
+        if not self._stopped and not self.is_alive():
+            self.restarts += 1
+            logger.warning(f"DVRRecorder for {self.name} is down. Restarting.")
+            self.start()
+
+    def stop(self):
+        self._stopped = True
+        self._fresh = True
+        self._stop_event.set()
+        loop = self.loop
+        if loop is not None:
+            source = GLib.Idle()
+            source.set_callback(self._quit_loop)
+            source.attach(loop.get_context())
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=10.0)
+            if thread.is_alive():
+                logger.warning(f"DVRRecorder thread for {self.name} did not join in time.")
+        self._thread = None
+        logger.info(f"DVRRecorder stopped for {self.name}.")
+
+    def is_alive(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def get_clip(self, start, end):
+        """ [start, end] (epoch 초) 구간의 ClipPlan, 세그먼트 경계까지 넓어질 수 있음 """
+        return self.index.clip(start, end)
+
+    def snapshot(self, include_segments=True):
+        index = self.index.snapshot()
+        if not include_segments:
+            index['segments'] = len(index['segments'])
+        return dict(index,
+                    running=self.running,
+                    directory=self.directory,
+                    segment_sec=self.segment_sec,
+                    retention_sec=self.retention_sec,
+                    source='warm' if self.warm is not None else 'encode',
+                    max_files=self.max_files,
+                    restarts=self.restarts)
@@ -0,0 +1,110 @@
+"""
+
+Kafka 프레임 메시지에 붙는 자기 기술형(self-describing) 봉투(envelope) 포맷
+
+프레임 메타데이터를 고정 크기 바이너리 헤더로 묶어 Kafka 헤더('frame-envelope') 또는 payload 앞에 붙임
+소비자는 CAMERA_RESOLUTION 같은 설정을 몰라도 디코딩 가능하고, sequence 로 유실 감지, capture_time 으로 지연 측정 가능
+
+헤더 레이아웃 (big-endian, 고정 57 바이트 + camera_id):
+    magic(4s)='CAFR' version(B) flags(B) header_size(H)
+    sequence(Q) pts_ns(q, 없으면 -1) capture_time_ns(q, unix epoch)
+    width(H) height(H) pixel_format(4s) codec(4s)
+    chunk_index(H) chunk_count(H) chunk_offset(I) frame_size(I)
+    camera_id_len(B) camera_id(utf-8)
+
+브로커 메시지 한도를 넘는 프레임은 chunk 로 나눠 보내며, 같은 (camera_id, sequence) 의
+chunk 들을 chunk_offset 위치에 채워 frame_size 만큼 모이면 하나의 프레임으로 재조립
+
+"""
+
+# app/frame_envelope.py
+import struct
+
+ENVELOPE_MAGIC = b'CAFR'
+ENVELOPE_VERSION = 1
+ENVELOPE_HEADER_KEY = 'frame-envelope'
+
+FLAG_KEYFRAME = 0x01
+FLAG_CHUNKED = 0x02
+
+_FIXED = struct.Struct('>4sBBHQqqHH4s4sHHIIB')
+FIXED_HEADER_SIZE = _FIXED.size
+
+ENVELOPE_MODES = ('headers', 'inline', 'none')
+
+
+def _fourcc(value):
+    return value.encode('ascii')[:4].ljust(4, b' ')
+
+
+class FrameEnvelope:
+    __slots__ = ('camera_id', 'sequence', 'pts_ns', 'capture_time_ns', 'width', 'height',
+                 'pixel_format', 'codec', 'flags', 'chunk_index', 'chunk_count', 'chunk_offset',
+                 'frame_size', 'header_size')
+
+    def __init__(self, camera_id, sequence, pts_ns, capture_time_ns, width, height,
+                 pixel_format, codec, frame_size, flags=0,
+                 chunk_index=0, chunk_count=1, chunk_offset=0, header_size=None):
+        self.camera_id = camera_id
+        self.sequence = sequence
+        self.pts_ns = pts_ns if pts_ns is not None else -1
+        self.capture_time_ns = capture_time_ns
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.codec = codec
+        self.flags = flags
+        self.chunk_index = chunk_index
+        self.chunk_count = chunk_count
+        self.chunk_offset = chunk_offset
+        self.frame_size = frame_size
+        self.header_size = header_size
+
+    @property
+    def is_keyframe(self):
+        return bool(self.flags & FLAG_KEYFRAME)
+
+    @property
+    def is_chunked(self):
+        return self.chunk_count > 1
+
+    def pack(self):
+        camera_id_bytes = self.camera_id.encode('utf-8')[:255]
+        flags = self.flags | (FLAG_CHUNKED if self.chunk_count > 1 else 0)
+        header_size = FIXED_HEADER_SIZE + len(camera_id_bytes)
+        return _FIXED.pack(
+            ENVELOPE_MAGIC, ENVELOPE_VERSION, flags, header_size,
+            self.sequence, self.pts_ns, self.capture_time_ns,
+            self.width, self.height, _fourcc(self.pixel_format), _fourcc(self.codec),
+            self.chunk_index, self.chunk_count, self.chunk_offset, self.frame_size,
+            len(camera_id_bytes),
+        ) + camera_id_bytes
+
+    @classmethod
+    def unpack(cls, data):
+        """ bytes/memoryview 앞부분에서 봉투를 읽음, payload 는 data[envelope.header_size:] """
+        if len(data) < FIXED_HEADER_SIZE:
+            raise ValueError("Buffer too small for frame envelope")
+        (magic, version, flags, header_size, sequence, pts_ns, capture_time_ns,
+         width, height, pixel_format, codec, chunk_index, chunk_count, chunk_offset,
+         frame_size, camera_id_len) = _FIXED.unpack_from(data, 0)
+        if magic != ENVELOPE_MAGIC:
+            raise ValueError("Not a frame envelope (bad magic)")
+        if version != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported frame envelope version {version}")
+        camera_id = bytes(data[FIXED_HEADER_SIZE:FIXED_HEADER_SIZE + camera_id_len]).decode('utf-8')
+        return cls(camera_id, sequence, pts_ns, capture_time_ns, width, height,
+                   pixel_format.decode('ascii').strip(), codec.decode('ascii').strip(), frame_size,
+                   flags=flags, chunk_index=chunk_index, chunk_count=chunk_count,
+                   chunk_offset=chunk_offset, header_size=header_size)
+
+
+def iter_chunks(frame_size, max_chunk_size):
+    """ (chunk_index, chunk_count, offset, length) 를 순서대로 반환 """
+    if max_chunk_size <= 0 or frame_size <= max_chunk_size:
+        yield 0, 1, 0, frame_size
+        return
+    chunk_count = (frame_size + max_chunk_size - 1) // max_chunk_size
+    for index in range(chunk_count):
+        offset = index * max_chunk_size
+        yield index, chunk_count, offset, min(max_chunk_size, frame_size - offset)
@@ -0,0 +1,73 @@
+"""
+
+GStreamer 버퍼를 Kafka sender 스레드로 넘길 때 사용하는 재사용 버퍼 풀
+
+매 프레임마다 새 bytes 객체를 만들지 않도록 미리 할당한 bytearray 슬롯 링을 돌려씀
+- pull 스레드: acquire() -> 매핑된 버퍼를 슬롯에 복사 -> sender 큐에 전달
+- sender 스레드: slot.view() (memoryview) 로 producer.send() 후 release()
+슬롯이 모두 사용 중이면 acquire() 가 None 을 반환하고 해당 프레임은 버림 (캡처 스레드는 절대 대기하지 않음)
+
+"""
+
+# app/frame_pool.py
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSlot:
+    __slots__ = ('index', 'buffer', 'length', 'pts', 'flags', 'meta')
+
+    def __init__(self, index, size):
+        self.index = index
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.pts = None
+        self.flags = 0
+        self.meta = None
+
+    def fill(self, data):
+        """ data(bytes/memoryview) 를 슬롯에 복사, 슬롯보다 크면 한 번만 확장 """
+        size = len(data)
+        if size > len(self.buffer):
+            logger.debug(f"FrameSlot {self.index}: growing buffer {len(self.buffer)} -> {size} bytes")
+            self.buffer.extend(bytes(size - len(self.buffer)))
+        self.buffer[:size] = data
+        self.length = size
+
+    def view(self):
+        """ 복사 없이 유효 구간만 가리키는 memoryview """
+        return memoryview(self.buffer)[:self.length]
+
+
+class FrameBufferPool:
+    def __init__(self, slot_count, slot_size):
+        if slot_count < 1:
+            raise ValueError("slot_count must be >= 1")
+        self._slots = [FrameSlot(i, slot_size) for i in range(slot_count)]
+        self._free = deque(self._slots)
+        self._lock = threading.Lock()
+
+    @property
+    def slot_count(self):
+        return len(self._slots)
+
+    def acquire(self):
+        with self._lock:
+            if not self._free:
+                return None
+            return self._free.popleft()
+
+    def release(self, slot):
+        slot.length = 0
+        slot.pts = None
+        slot.flags = 0
+        slot.meta = None
+        with self._lock:
+            self._free.append(slot)
+
+    def free_count(self):
+        with self._lock:
+            return len(self._free)
@@ -0,0 +1,177 @@
+"""
+
+브라우저용 HLS 출력: warm 인코더의 H.264 를 재인코딩 없이 hlssink2 로 세그먼트화
+
+- appsrc(hlssrc) 를 WarmEncoder.add_sink 로 등록 -> 같은 인코딩 결과를 RTSP 세션과 HLS 가 함께 사용
+  캐시된 GOP 부터 받으므로 첫 세그먼트가 키프레임으로 시작
+- 세그먼트/플레이리스트는 RAM 디렉터리(HLS_DIR, 기본 /dev/shm)에 기록, FastAPI 의 /hls/<stream>/... 로 제공
+- 세그먼트 길이는 warm 인코더의 키프레임 간격에 맞춰짐 (hlssink2 는 키프레임에서만 분할)
+- 세그먼트 이름에 실행마다 새 run_id 를 넣음: 재시작 시 hlssink2 번호가 0 부터 다시 시작해도 이전 실행의 이름을 재사용하지 않으므로
+  브라우저/프록시가 immutable 로 캐시한 세그먼트가 다른 영상으로 바뀌지 않음
+
+"""
+
+# app/hls_output.py
+import glob
+import os
+import threading
+import uuid
+import logging
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst, GLib
+
+from .pipeline_builder import build_hls_pipeline_str, HLS_SOURCE_NAME, HLS_PLAYLIST_NAME
+
+logger = logging.getLogger(__name__)
+
+
+class HLSOutput:
+    def __init__(self, name, warm, directory, segment_sec=1, playlist_length=4):
+        self.name = name # URL 경로에 쓰는 스트림 이름
+        self.warm = warm
+        self.directory = directory
+        self.segment_sec = segment_sec
+        self.playlist_length = playlist_length
+        # 플레이리스트에서 빠진 직후의 세그먼트를 받는 중인 클라이언트가 있으므로 여유분을 두고 삭제
+        self.max_files = playlist_length * 2
+        self.pipeline = None
+        self.running = False
+        self.loop = None
+        self._thread = None
+        self._appsrc = None
+        self._stop_event = threading.Event()
+        self._stopped = False
+        self.run_id = None # 세그먼트 이름 접두사, 실행마다 새로 만듦
+        self.restarts = 0
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.directory, HLS_PLAYLIST_NAME)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run_loop, name=f"hls-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"HLSOutput started for {self.name} in {self.directory}")
+
+    def _prepare_directory(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for path in glob.glob(os.path.join(self.directory, '*.ts')) + [self.playlist_path]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to remove stale HLS file {path}: {e}")
+
+    def _run_loop(self):
+        Gst.init(None)
+        context = GLib.MainContext.new()
+        context.push_thread_default()
+        self.loop = GLib.MainLoop.new(context, False)
+        try:
+            self._prepare_directory()
+            self.run_id = uuid.uuid4().hex[:8]
+            pipeline_str = build_hls_pipeline_str(self.directory, self.segment_sec, self.playlist_length, self.max_files,
+                                                  self.run_id)
+            logger.info(f"HLSOutput pipeline for {self.name}: {pipeline_str}")
+            try:
+                self.pipeline = Gst.parse_launch(pipeline_str)
+            except Exception as e:
+                logger.error(f"Failed to create HLSOutput pipeline for {self.name}: {e}")
+                return
+            self._appsrc = self.pipeline.get_by_name(HLS_SOURCE_NAME)
+            # warm 세션과 같이 appsrc 가 데이터를 요청한 뒤에 등록
+            self._appsrc.connect('need-data', lambda src, length: self.warm.add_sink(src))
+            bus = self.pipeline.get_bus()
+            bus.add_signal_watch()
+            bus.connect("message", self.on_message)
+
+            self.pipeline.set_state(Gst.State.PLAYING)
+            state = self.pipeline.get_state(timeout=5 * Gst.SECOND)[1]
+            if state != Gst.State.PLAYING:
+                logger.error(f"Failed to set HLSOutput pipeline to PLAYING for {self.name}. Current state: {state}")
+                return
+            self.running = True
+            if not self._stop_event.is_set():
+                self.loop.run()
+        except Exception as e:
+            logger.error(f"Error running HLSOutput loop for {self.name}: {e}")
+        finally:
+            self.running = False
+            if self._appsrc is not None:
+                self.warm.remove_sink(self._appsrc)
+                self._appsrc = None
+            if self.pipeline:
+                self.pipeline.set_state(Gst.State.NULL)
+                self.pipeline.get_bus().remove_signal_watch()
+            self.pipeline = None
+            context.pop_thread_default()
+            self.loop = None
+            logger.info(f"HLSOutput loop for {self.name} finished.")
+
+    def on_message(self, bus, message):
+        t = message.type
+        if t == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            logger.error(f"HLSOutput GStreamer Error for {self.name}: {err}, Debug: {debug}")
+            self._quit_loop()
+        elif t == Gst.MessageType.EOS:
+            logger.info(f"HLSOutput End-Of-Stream for {self.name}.")
+            self._quit_loop()
+        return True
+
+    def _quit_loop(self, *args):
+        if self.loop and self.loop.is_running():
+            self.loop.quit()
+        return GLib.SOURCE_REMOVE
+
+    def ensure_running(self):
+        """ 오류로 끝난 HLS 파이프라인 재시작 (CameraManager 주기 확인용) """
+        if not self._stopped and not self.is_alive():
+            self.restarts += 1
+            logger.warning(f"HLSOutput for {self.name} is down. Restarting.")
+            self.start()
+
+    def stop(self):
+        self._stopped = True
+        self._stop_event.set()
+        loop = self.loop
+        if loop is not None:
+            source = GLib.Idle()
+            source.set_callback(self._quit_loop)
+            source.attach(loop.get_context())
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=10.0)
+            if thread.is_alive():
+                logger.warning(f"HLSOutput thread for {self.name} did not join in time.")
+        self._thread = None
+        logger.info(f"HLSOutput stopped for {self.name}.")
+
+    def is_alive(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def resolve(self, filename):
+        """ 요청 파일 이름 -> 디렉터리 안의 실제 경로, 플레이리스트/세그먼트가 아니면 None """
+        if filename != HLS_PLAYLIST_NAME and not (filename.endswith('.ts') and os.path.basename(filename) == filename):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def snapshot(self):
+        return {
+            'running': self.running,
+            'directory': self.directory,
+            'segment_sec': self.segment_sec,
+            'playlist_length': self.playlist_length,
+            'run_id': self.run_id,
+            'segments': len(glob.glob(os.path.join(self.directory, '*.ts'))),
+            'restarts': self.restarts,
+        }
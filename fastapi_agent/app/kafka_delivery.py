@@ -0,0 +1,128 @@
+"""
+
+Kafka 전송 결과(비동기 콜백) 추적 및 과부하 시 프레임 드롭 정책
+
+producer.send() 의 future 에 성공/실패 콜백을 붙여 아직 ack 되지 않은(in-flight) 프레임 수를 관리
+in-flight 가 한도에 도달하면 sender 스레드는 대기하고, 그 사이 캡처 쪽은 정책에 따라 프레임을 버림
+- drop-oldest   : 큐에 쌓인 가장 오래된 프레임을 버리고 최신 프레임을 넣음 (기본값, 라이브 우선)
+- drop-newest   : 새로 들어온 프레임을 버림
+- keyframe-only : 과부하 동안에는 키 프레임만 통과
+
+"""
+
+# app/kafka_delivery.py
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_POLICIES = ('drop-oldest', 'drop-newest', 'keyframe-only')
+
+
+class DeliveryTracker:
+    def __init__(self, max_in_flight=8, policy='drop-oldest', on_result=None):
+        if policy not in OVERLOAD_POLICIES:
+            logger.error(f"Unsupported overload policy '{policy}'. Falling back to 'drop-oldest'.")
+            policy = 'drop-oldest'
+        self.max_in_flight = max(int(max_in_flight), 1)
+        self.policy = policy
+        self.on_result = on_result # 프레임 단위 전송 결과 콜백 on_result(exc 또는 None), 서킷 브레이커에서 사용
+        self._cond = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        with self._cond:
+            self.in_flight = 0
+            self.frames_sent = 0
+            self.frames_failed = 0
+            self.frames_dropped = 0
+            self.drop_reasons = {}
+            self.bytes_sent = 0
+            self.last_error = None
+            self.last_ack_time = None
+            self._cond.notify_all()
+
+    def window_full(self):
+        with self._cond:
+            return self.in_flight >= self.max_in_flight
+
+    def wait_for_window(self, timeout):
+        """ in-flight 창에 자리가 날 때까지 대기, 시간 내 자리가 나면 True """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.in_flight < self.max_in_flight, timeout=timeout)
+
+    def on_dispatched(self):
+        with self._cond:
+            self.in_flight += 1
+
+    def track(self, futures, size):
+        """
+        한 프레임을 구성하는 메시지(chunk)들의 future 에 콜백 연결 (콜백은 producer I/O 스레드에서 실행됨)
+        모든 chunk 가 ack 되면 성공, 하나라도 실패하면 실패로 한 번만 집계
+        """
+        state = {'pending': len(futures), 'error': None}
+        state_lock = threading.Lock()
+
+        def _done(exc=None):
+            with state_lock:
+                state['pending'] -= 1
+                if exc is not None and state['error'] is None:
+                    state['error'] = exc
+                if state['pending'] > 0:
+                    return
+                error = state['error']
+            if error is None:
+                self._on_success(size, None)
+            else:
+                self._on_error(error)
+            if self.on_result:
+                self.on_result(error)
+
+        for future in futures:
+            future.add_callback(lambda _metadata: _done())
+            future.add_errback(lambda exc: _done(exc))
+
+    def _on_success(self, size, record_metadata):
+        with self._cond:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self.frames_sent += 1
+            self.bytes_sent += size
+            self.last_ack_time = time.time()
+            self._cond.notify()
+
+    def _on_error(self, exc):
+        with self._cond:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self.frames_failed += 1
+            self.last_error = str(exc)
+            self._cond.notify()
+        logger.warning(f"Kafka delivery failed: {exc}")
+
+    def on_send_error(self, exc):
+        """ send() 자체가 예외를 던진 경우 (future 없음) """
+        with self._cond:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self.frames_failed += 1
+            self.last_error = str(exc)
+            self._cond.notify()
+
+    def record_drop(self, reason):
+        with self._cond:
+            self.frames_dropped += 1
+            self.drop_reasons[reason] = self.drop_reasons.get(reason, 0) + 1
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'policy': self.policy,
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self.in_flight,
+                'frames_sent': self.frames_sent,
+                'frames_dropped': self.frames_dropped,
+                'frames_failed': self.frames_failed,
+                'drop_reasons': dict(self.drop_reasons),
+                'bytes_sent': self.bytes_sent,
+                'last_error': self.last_error,
+                'last_ack_time': self.last_ack_time,
+            }
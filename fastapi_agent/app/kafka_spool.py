@@ -0,0 +1,374 @@
+"""
+
+Kafka 브로커 장애 대응: 서킷 브레이커 + 로컬 디스크 링 스풀
+
+CircuitBreaker
+- closed    : 정상 전송
+- open      : 연속 실패가 임계치를 넘으면 열림, 지수 백오프(지터 포함) 동안 전송/재연결 시도 안 함
+- half-open : 백오프가 지나면 프로브 한 건만 허용, ack 되면 closed, 실패하면 백오프를 두 배로 늘려 다시 open
+producer 재생성은 half-open 프로브 시점에만 일어나므로 프레임마다 재연결하는 폭주가 없음
+
+DiskSpool
+- 브레이커가 열려 있는 동안의 메시지(topic, key, headers, value)를 mmap 한 고정 크기 파일에 순서대로 기록
+- 공간이 부족하면 가장 오래된 레코드부터 덮어씀 (용량 고정, 캡처 스레드는 디스크 때문에 대기하지 않음)
+- 복구 후 replay 스레드가 peek -> send -> ack 대기 -> pop 순서로 오래된 것부터 재전송
+- head/tail 메타데이터를 파일 앞부분에 기록하므로 프로세스 재시작 후에도 이어서 replay 가능
+
+파일 레이아웃 (big-endian):
+    meta(64 바이트): magic(4s)='CASP' version(I) capacity(Q) head(Q) tail(Q) count(Q) used(Q) next_seq(Q)
+    data: record 들의 링, record = rec_len(I) seq(Q) enqueue_time_ns(q) topic_len(H) key_len(H) headers_len(I) value_len(I)
+          + topic + key + headers + value, 8 바이트 정렬. rec_len == 0 이면 파일 끝까지 비어 있음(wrap)
+
+"""
+
+# app/kafka_spool.py
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, base_backoff=1.0, max_backoff=60.0):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.base_backoff = max(float(base_backoff), 0.01)
+        self.max_backoff = max(float(max_backoff), self.base_backoff)
+        self._lock = threading.Lock()
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0 # 연속으로 열린 횟수 (백오프 지수)
+        self.trips = 0
+        self.open_until = 0.0
+        self.last_error = None
+        self.last_state_change = time.time()
+
+    def allow_request(self):
+        """ 전송해도 되면 True, open 상태에서 백오프가 지났으면 half-open 으로 바꾸고 프로브 한 건 허용 """
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and time.monotonic() >= self.open_until:
+                self._set_state(BREAKER_HALF_OPEN)
+                logger.info("Kafka circuit breaker half-open, sending probe.")
+                return True
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == BREAKER_OPEN
+
+    def is_closed(self):
+        with self._lock:
+            return self.state == BREAKER_CLOSED
+
+    def is_probing(self):
+        with self._lock:
+            return self.state == BREAKER_HALF_OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != BREAKER_CLOSED:
+                logger.info("Kafka circuit breaker closed, broker reachable again.")
+                self._set_state(BREAKER_CLOSED)
+                self.open_count = 0
+
+    def record_failure(self, exc=None):
+        with self._lock:
+            self.consecutive_failures += 1
+            if exc is not None:
+                self.last_error = str(exc)
+            if self.state == BREAKER_HALF_OPEN or (
+                    self.state == BREAKER_CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._open()
+
+    def trip(self, exc=None):
+        """ 임계치와 상관없이 즉시 open (producer 생성 실패 등) """
+        with self._lock:
+            if exc is not None:
+                self.last_error = str(exc)
+            if self.state != BREAKER_OPEN:
+                self._open()
+
+    def cancel_probe(self):
+        """ 허용받은 프로브를 보내지 못한 경우, 다음 요청이 바로 프로브가 될 수 있도록 되돌림 """
+        with self._lock:
+            if self.state == BREAKER_HALF_OPEN:
+                self._set_state(BREAKER_OPEN)
+                self.open_until = time.monotonic()
+
+    def _open(self):
+        backoff = min(self.base_backoff * (2 ** self.open_count), self.max_backoff)
+        backoff *= random.uniform(0.8, 1.2) # 여러 Agent 가 동시에 재연결하지 않도록 지터
+        self.open_until = time.monotonic() + backoff
+        self.open_count += 1
+        self.trips += 1
+        self._set_state(BREAKER_OPEN)
+        logger.warning(f"Kafka circuit breaker open for {backoff:.1f}s "
+                       f"(consecutive failures: {self.consecutive_failures}, last error: {self.last_error})")
+
+    def _set_state(self, state):
+        self.state = state
+        self.last_state_change = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'retry_in_sec': round(max(self.open_until - time.monotonic(), 0.0), 2) if self.state == BREAKER_OPEN else 0.0,
+                'last_error': self.last_error,
+                'last_state_change': self.last_state_change,
+            }
+
+
+_META = struct.Struct('>4sIQQQQQQ')
+_META_SIZE = 64
+_RECORD = struct.Struct('>IQqHHII')
+_SPOOL_MAGIC = b'CASP'
+_SPOOL_VERSION = 1
+_ALIGN = 8
+
+
+def _aligned(size):
+    return (size + _ALIGN - 1) & ~(_ALIGN - 1)
+
+
+def _pack_headers(headers):
+    if not headers:
+        return b''
+    parts = []
+    for key, value in headers:
+        key_bytes = key.encode('utf-8')
+        parts.append(struct.pack('>H', len(key_bytes)) + key_bytes + struct.pack('>I', len(value)) + bytes(value))
+    return b''.join(parts)
+
+
+def _unpack_headers(data):
+    headers = []
+    pos = 0
+    while pos < len(data):
+        (key_len,) = struct.unpack_from('>H', data, pos)
+        pos += 2
+        key = bytes(data[pos:pos + key_len]).decode('utf-8')
+        pos += key_len
+        (value_len,) = struct.unpack_from('>I', data, pos)
+        pos += 4
+        headers.append((key, bytes(data[pos:pos + value_len])))
+        pos += value_len
+    return headers
+
+
+class SpoolRecord:
+    __slots__ = ('seq', 'enqueue_time_ns', 'topic', 'key', 'headers', 'value')
+
+    def __init__(self, seq, enqueue_time_ns, topic, key, headers, value):
+        self.seq = seq
+        self.enqueue_time_ns = enqueue_time_ns
+        self.topic = topic
+        self.key = key
+        self.headers = headers
+        self.value = value
+
+
+class DiskSpool:
+    def __init__(self, path, capacity_bytes):
+        if capacity_bytes <= _META_SIZE + _RECORD.size:
+            raise ValueError("Spool capacity too small")
+        self.path = path
+        self.capacity = capacity_bytes - _META_SIZE # data 영역 크기
+        self._lock = threading.Lock()
+        self.records_spooled = 0
+        self.records_evicted = 0
+        self.records_rejected = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != capacity_bytes:
+                os.ftruncate(fd, capacity_bytes) # sparse 파일, 실제 디스크는 쓰는 만큼만 사용
+            self._mm = mmap.mmap(fd, capacity_bytes)
+        finally:
+            os.close(fd)
+        self._load_meta()
+
+    def _load_meta(self):
+        magic, version, capacity, head, tail, count, used, next_seq = _META.unpack_from(self._mm, 0)
+        if magic == _SPOOL_MAGIC and version == _SPOOL_VERSION and capacity == self.capacity:
+            self.head, self.tail, self.count, self.used, self.next_seq = head, tail, count, used, next_seq
+            if self.count:
+                logger.info(f"Recovered {self.count} spooled Kafka messages from {self.path}")
+        else:
+            self.head = self.tail = self.count = self.used = self.next_seq = 0
+            self._store_meta()
+
+    def _store_meta(self):
+        _META.pack_into(self._mm, 0, _SPOOL_MAGIC, _SPOOL_VERSION, self.capacity,
+                        self.head, self.tail, self.count, self.used, self.next_seq)
+
+    def _record_at(self, offset):
+        """ offset 위치 레코드 헤더, 파일 끝에 도달했거나 wrap 표시면 None """
+        if self.capacity - offset < _RECORD.size:
+            return None
+        header = _RECORD.unpack_from(self._mm, _META_SIZE + offset)
+        return header if header[0] else None
+
+    def _normalize_head(self):
+        if self.count and self._record_at(self.head) is None:
+            self.used -= self.capacity - self.head # wrap 으로 비워둔 구간
+            self.head = 0
+
+    def _evict_oldest(self):
+        self._normalize_head()
+        rec_len = self._record_at(self.head)[0]
+        self.head += rec_len
+        self.used -= rec_len
+        self.count -= 1
+        self.records_evicted += 1
+        if self.count == 0:
+            self.head = self.tail = self.used = 0
+        else:
+            self._normalize_head()
+
+    def _reserve(self, need):
+        """ tail 에서 need 바이트 연속 공간 확보 (부족하면 오래된 레코드 제거) 후 쓰기 위치 반환 """
+        while True:
+            if self.count == 0:
+                self.head = self.tail = self.used = 0
+                return 0
+            if self.tail > self.head:
+                if self.capacity - self.tail >= need:
+                    return self.tail
+                if self.head >= need:
+                    # 남은 끝 부분은 비워두고 처음으로 wrap
+                    if self.capacity - self.tail >= _RECORD.size:
+                        struct.pack_into('>I', self._mm, _META_SIZE + self.tail, 0)
+                    self.used += self.capacity - self.tail
+                    self.tail = 0
+                    return 0
+            elif self.head - self.tail >= need:
+                return self.tail
+            self._evict_oldest()
+
+    @staticmethod
+    def _encode(topic, key, headers, value):
+        topic_bytes = topic.encode('utf-8')
+        key_bytes = bytes(key) if key else b''
+        headers_bytes = _pack_headers(headers)
+        body_len = _RECORD.size + len(topic_bytes) + len(key_bytes) + len(headers_bytes) + len(value)
+        return _aligned(body_len), (topic_bytes, key_bytes, headers_bytes, value)
+
+    def _write(self, need, parts, enqueue_time_ns):
+        """ self._lock 을 잡은 상태에서 호출, 레코드 한 건을 tail 에 기록 """
+        topic_bytes, key_bytes, headers_bytes, value = parts
+        offset = self._reserve(need)
+        pos = _META_SIZE + offset
+        _RECORD.pack_into(self._mm, pos, need, self.next_seq, enqueue_time_ns,
+                          len(topic_bytes), len(key_bytes), len(headers_bytes), len(value))
+        pos += _RECORD.size
+        for part in parts:
+            size = len(part)
+            self._mm[pos:pos + size] = part
+            pos += size
+        self.tail = offset + need
+        self.used += need
+        self.count += 1
+        self.next_seq += 1
+
+    def append(self, topic, key, headers, value, enqueue_time_ns=None):
+        """ 메시지 한 건 기록, 너무 커서 스풀 전체에도 안 들어가면 False """
+        return self.append_many([(topic, key, headers, value)], enqueue_time_ns)
+
+    def append_many(self, messages, enqueue_time_ns=None):
+        """
+        여러 메시지 (topic, key, headers, value) 를 모두 기록하거나 하나도 남기지 않음 (chunk 로 나눈 프레임)
+        합계가 스풀 전체보다 크거나, wrap 으로 생긴 빈 공간 때문에 같은 묶음의 앞 레코드가 밀려나면 False
+        """
+        encoded = [self._encode(*message) for message in messages]
+        enqueue_time_ns = enqueue_time_ns or time.time_ns()
+        with self._lock:
+            if sum(need for need, _ in encoded) > self.capacity:
+                self.records_rejected += len(encoded)
+                return False
+            for need, parts in encoded:
+                self._write(need, parts, enqueue_time_ns)
+            if self.count < len(encoded):
+                # 기존 레코드를 모두 밀어내고도 묶음의 앞부분까지 덮어씀, 남은 조각도 버림
+                while self.count:
+                    self._evict_oldest()
+                self.records_rejected += len(encoded)
+                self._store_meta()
+                return False
+            self.records_spooled += len(encoded)
+            self._store_meta()
+            return True
+
+    def peek(self):
+        """ 가장 오래된 레코드를 복사해 반환 (제거하지 않음) """
+        with self._lock:
+            if self.count == 0:
+                return None
+            self._normalize_head()
+            _, seq, enqueue_time_ns, topic_len, key_len, headers_len, value_len = self._record_at(self.head)
+            pos = _META_SIZE + self.head + _RECORD.size
+            topic = self._mm[pos:pos + topic_len].decode('utf-8')
+            pos += topic_len
+            key = self._mm[pos:pos + key_len] if key_len else None
+            pos += key_len
+            headers = _unpack_headers(self._mm[pos:pos + headers_len]) if headers_len else None
+            pos += headers_len
+            value = self._mm[pos:pos + value_len]
+            return SpoolRecord(seq, enqueue_time_ns, topic, key, headers, value)
+
+    def pop(self, seq):
+        """ peek 한 레코드가 그 사이 덮어쓰이지 않았을 때만 제거 """
+        with self._lock:
+            if self.count == 0:
+                return False
+            self._normalize_head()
+            if self._record_at(self.head)[1] != seq:
+                return False
+            rec_len = self._record_at(self.head)[0]
+            self.head += rec_len
+            self.used -= rec_len
+            self.count -= 1
+            if self.count == 0:
+                self.head = self.tail = self.used = 0
+            else:
+                self._normalize_head()
+            self._store_meta()
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return self.count
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'capacity_bytes': self.capacity,
+                'used_bytes': self.used,
+                'records': self.count,
+                'records_spooled': self.records_spooled,
+                'records_evicted': self.records_evicted,
+                'records_rejected': self.records_rejected,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._store_meta()
+                self._mm.flush()
+                self._mm.close()
+                self._mm = None
@@ -3,6 +3,31 @@
 
 250518 송인용
 
+10ms 주기로 GLib 컨텍스트를 폴링하던 루프를 이벤트 기반으로 변경
+- 버스 메시지는 스트리머 전용 GLib MainContext 위의 MainLoop 가 블로킹으로 처리
+- 프레임은 전용 pull 스레드가 appsink 의 try-pull-sample 로 블로킹 대기 후 처리
+프레임/메시지가 없으면 깨어나지 않으므로 idle CPU 사용량이 거의 0 이 됨
+
+프레임 hand-off 는 FrameBufferPool(미리 할당한 bytearray 링)에 복사 후 sender 스레드가 전송
+pull 스레드는 producer 락이나 메모리 할당 때문에 막히지 않음
+
+각 메시지는 FrameEnvelope(camera_id, sequence, PTS, 캡처 시각, 해상도, 코덱)를 Kafka 헤더 또는 payload 앞에 포함하고
+KAFKA_MAX_MESSAGE_BYTES 를 넘는 프레임은 chunk 로 나눠 전송 (브로커 max_request_size 상향 불필요)
+
+전송 결과는 DeliveryTracker 가 콜백으로 추적, in-flight 한도를 넘으면 KAFKA_OVERLOAD_POLICY 에 따라 드롭
+GStreamer 쪽에서 producer 를 재생성하지 않음 (연속 실패 시 sender 스레드에서만 제한적으로 재생성)
+
+KAFKA_RENDITIONS 설정 시 v4l2 캡처 하나를 tee 로 나눠 여러 rendition(해상도/fps/코덱)을 만들고
+rendition 별 토픽으로 전송 (예: "full:1280x720@15:jpeg,ai:320x240@2:raw")
+각 rendition 은 자체 appsink, pull/sender 스레드, 버퍼 풀, 전송 추적기를 가짐
+
+브로커 장애 시 CircuitBreaker 가 열려 전송/재연결을 지수 백오프로 멈추고, 그동안의 메시지는
+DiskSpool(mmap 링 파일)에 기록했다가 브레이커가 닫히면 replay 스레드가 순서대로 재전송
+
+KAFKA_MOTION_GATE=true 이면 tee 에 64x48 GRAY8 썸네일 분기를 추가해 MotionGate 가 움직임을 판단하고
+정적인 장면의 프레임은 보내지 않음 (keepalive 프레임과 움직임 이후 hold 구간은 전송)
+
+/subscriptions 로 등록된 저빈도 구독자에게는 같은 캡처에서 due 시점의 프레임만 복사해 전달 (SubscriptionManager)
 
 """
 
@@ -12,18 +37,449 @@ import gi
 import logging
 import time
 gi.require_version('Gst', '1.0')
-from gi.repository import Gst, GObject
+from gi.repository import Gst, GLib
 from kafka import KafkaProducer
-import signal
 import os
+import queue
+from fractions import Fraction
+from .frame_pool import FrameBufferPool
+from .kafka_delivery import DeliveryTracker
+from .kafka_spool import CircuitBreaker, DiskSpool
+from .motion_gate import MotionGate, GATE_WIDTH, GATE_HEIGHT
+from .subscriptions import SubscriptionManager, SampledFrame
+from .frame_envelope import FrameEnvelope, ENVELOPE_MODES, ENVELOPE_VERSION, ENVELOPE_HEADER_KEY, FIXED_HEADER_SIZE, FLAG_KEYFRAME, iter_chunks
 
 
 logger = logging.getLogger(__name__)
 
-class KafkaStreamer(threading.Thread):
+# 코덱별 appsink 직전 raw 포맷 (pngenc 는 BGR 을 지원하지 않아 RGB 사용)
+FRAME_CODECS = {
+    'raw': 'BGR',
+    'jpeg': 'I420',
+    'png': 'RGB',
+}
+
+DEFAULT_RENDITION_NAME = 'main'
+MOTION_SINK_NAME = 'sink_motion'
+
+
+class DispatchLatencyStats:
+    """ 프레임 캡처 시점(버퍼 PTS)부터 Kafka producer 로 넘기기까지의 지연을 집계 """
+
     def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.frames = 0
+            self.last_ms = 0.0
+            self.max_ms = 0.0
+            self.total_ms = 0.0
+
+    def record(self, latency_ns):
+        latency_ms = latency_ns / 1e6
+        with self._lock:
+            self.frames += 1
+            self.last_ms = latency_ms
+            self.total_ms += latency_ms
+            if latency_ms > self.max_ms:
+                self.max_ms = latency_ms
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'frames': self.frames,
+                'last_ms': round(self.last_ms, 3),
+                'avg_ms': round(self.total_ms / self.frames, 3) if self.frames else 0.0,
+                'max_ms': round(self.max_ms, 3),
+            }
+
+
+def parse_renditions(spec, default_width, default_height, default_fps, default_codec):
+    """
+    KAFKA_RENDITIONS 문자열 파싱
+    형식: name:WIDTHxHEIGHT@FPS[:codec[:quality]], 콤마로 여러 개 (fps 는 0.5 처럼 소수 가능)
+    해상도/fps/코덱을 생략하면 CAMERA_RESOLUTION/CAMERA_FPS/KAFKA_FRAME_CODEC 값을 사용
+    """
+    renditions = []
+    for entry in [e.strip() for e in spec.split(',') if e.strip()]:
+        parts = entry.split(':')
+        name = parts[0].strip()
+        width, height, fps = default_width, default_height, default_fps
+        if len(parts) > 1 and parts[1]:
+            geometry = parts[1]
+            if '@' in geometry:
+                geometry, fps_str = geometry.split('@', 1)
+                fps = float(fps_str)
+            if geometry:
+                width, height = map(int, geometry.lower().split('x'))
+        codec = parts[2].strip().lower() if len(parts) > 2 and parts[2] else default_codec
+        quality = int(parts[3]) if len(parts) > 3 and parts[3] else None
+        if not name or not name.replace('-', '').replace('_', '').isalnum():
+            raise ValueError(f"Invalid rendition name '{name}'")
+        if codec not in FRAME_CODECS:
+            raise ValueError(f"Unsupported codec '{codec}' for rendition '{name}'")
+        if fps <= 0 or width <= 0 or height <= 0:
+            raise ValueError(f"Invalid geometry for rendition '{name}'")
+        renditions.append({'name': name, 'width': width, 'height': height, 'fps': fps,
+                           'codec': codec, 'quality': quality})
+    if len({r['name'] for r in renditions}) != len(renditions):
+        raise ValueError("Duplicate rendition names in KAFKA_RENDITIONS")
+    return renditions
+
+
+def _framerate_caps(fps):
+    fraction = Fraction(fps).limit_denominator(1000)
+    return f"{fraction.numerator}/{fraction.denominator}"
+
+
+class KafkaRendition:
+    """ 하나의 해상도/fps/코덱 조합과 그 전송 경로 (appsink -> pull 스레드 -> 버퍼 풀 -> sender 스레드) """
+
+    def __init__(self, streamer, name, topic, width, height, fps, codec, quality=None):
+        self.streamer = streamer
+        self.name = name
+        self.topic = topic
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.codec = codec
+        self.jpeg_quality = quality if quality is not None else streamer.jpeg_quality
+        self.png_compression_level = streamer.png_compression_level
+        self.sink_name = f"sink_{name}"
+        # raw/jpeg/png 는 모든 프레임이 인트라 프레임이므로 keyframe-only 정책에서 키 프레임으로 볼 간격
+        self.keyframe_interval = max(int(os.environ.get('KAFKA_KEYFRAME_INTERVAL', round(fps))), 1)
+
+        self.latency_stats = DispatchLatencyStats()
+        # 원본 프레임 크기로 슬롯을 미리 할당 (압축 코덱은 항상 이보다 작음)
+        self.buffer_pool = FrameBufferPool(streamer.buffer_pool_slots, width * height * 3)
+        self._send_queue = queue.Queue()
+        self.delivery = DeliveryTracker(streamer.max_in_flight_frames, streamer.overload_policy,
+                                        on_result=streamer._on_delivery_result)
+        self._frame_index = 0
+        self._spool_counter = 0
+        self.frames_spooled = 0
+        self.frames_gated = 0
+        self._gate_last_passed = None
+        self.latest_sample = None # 스냅샷용 최신 샘플 (참조만 보관, 복사 없음)
+        self._pull_thread = None
+        self._sender_thread = None
+
+    @property
+    def raw_format(self):
+        return FRAME_CODECS[self.codec]
+
+    def encoder_str(self):
+        if self.codec == 'jpeg':
+            return f"jpegenc quality={self.jpeg_quality} !"
+        if self.codec == 'png':
+            return f"pngenc compression-level={self.png_compression_level} snapshot=false !"
+        return "" # 기존 BGR 원본 전송
+
+    def appsink_str(self):
+        # 샘플은 pull 스레드가 직접 가져가므로 시그널 비활성화
+        return f"appsink name={self.sink_name} emit-signals=false max-buffers=1 drop=true sync=false"
+
+    def branch_str(self):
+        """ tee 이후 rendition 별 분기: 프레임 솎아내기 -> 축소 -> 포맷 변환 -> 인코딩 -> appsink """
+        return (
+            f"queue max-size-buffers=2 leaky=downstream ! "
+            f"videorate drop-only=true ! video/x-raw,framerate={_framerate_caps(self.fps)} ! "
+            f"videoscale ! videoconvert ! "
+            f"video/x-raw,format={self.raw_format},width={self.width},height={self.height} ! "
+            f"{self.encoder_str()} {self.appsink_str()}"
+        )
+
+    def describe(self):
+        """ stream_details.renditions 항목 """
+        return {
+            'name': self.name,
+            'kafka_topic': self.topic,
+            'resolution': f"{self.width}x{self.height}",
+            'fps': self.fps,
+            'frame_codec': self.codec,
+            'frame_pixel_format': self.raw_format,
+        }
+
+    def start(self, appsink):
+        self.latency_stats.reset()
+        self.delivery.reset()
+        self._frame_index = 0
+        self._spool_counter = 0
+        self.frames_spooled = 0
+        self.frames_gated = 0
+        self._gate_last_passed = None
+        self._sender_thread = threading.Thread(target=self._sender_loop, daemon=True)
+        self._sender_thread.start()
+        self._pull_thread = threading.Thread(target=self._pull_loop, args=(appsink,), daemon=True)
+        self._pull_thread.start()
+
+    def join(self):
+        """ 파이프라인이 NULL 로 전환된 뒤 호출 (appsink flushing 으로 pull 대기가 풀린 상태) """
+        if self._pull_thread and self._pull_thread.is_alive():
+            self._pull_thread.join(timeout=5.0)
+        self._pull_thread = None
+        if self._sender_thread and self._sender_thread.is_alive():
+            self._send_queue.put(None) # sender 종료 신호
+            self._sender_thread.join(timeout=5.0)
+        self._sender_thread = None
+        self._drain_send_queue()
+
+    def _pull_loop(self, appsink):
+        """ appsink 에서 샘플을 블로킹으로 가져와 처리하는 전용 스레드 """
+        timeout_ns = self.streamer.pull_timeout_ms * Gst.MSECOND
+        stop_event = self.streamer._stop_event
+        while not stop_event.is_set():
+            sample = appsink.emit('try-pull-sample', timeout_ns)
+            if sample is None:
+                # 타임아웃 또는 flushing/EOS, EOS 자체는 버스 메시지로 처리됨
+                continue
+            self.on_new_sample(sample)
+        logger.info(f"KafkaStreamer pull loop finished for rendition '{self.name}'.")
+
+    def on_new_sample(self, sample):
+        # pull 스레드에서 호출됨, 슬롯에 복사만 하고 전송은 sender 스레드가 담당
+        streamer = self.streamer
+        if not streamer.running: # 실행 중이 아니면 무시 (producer 가 없으면 sender 가 스풀로 보냄)
+            return Gst.FlowReturn.OK
+        self.latest_sample = sample
+
+        # 샘플링 구독은 모션 게이트와 무관하게 주기대로 전달
+        if streamer.subscriptions.has_due(self.name, time.monotonic()):
+            self._fan_out_to_subscriptions(sample)
+
+        gate = streamer.motion_gate
+        if gate is not None:
+            now = time.monotonic()
+            send, _reason = gate.should_send(self._gate_last_passed, now)
+            if not send: # 정적인 장면, sequence 를 소비하지 않으므로 소비자 쪽 유실로 집계되지 않음
+                self.frames_gated += 1
+                return Gst.FlowReturn.OK
+            self._gate_last_passed = now
+
+        try:
+            buf = sample.get_buffer()
+            is_keyframe = self._is_keyframe(buf)
+            sequence = self._frame_index # 드롭된 프레임도 번호를 소비하므로 소비자는 gap 으로 유실 감지 가능
+            self._frame_index += 1
+            capture_time_ns = streamer._estimate_capture_time_ns(buf.pts)
+
+            overloaded = self.delivery.window_full() or self.buffer_pool.free_count() == 0
+            if overloaded and self.delivery.policy == 'keyframe-only' and not is_keyframe:
+                self.delivery.record_drop('keyframe_only')
+                return Gst.FlowReturn.OK
+
+            slot = self.buffer_pool.acquire()
+            if slot is None:
+                # sender 가 밀려 모든 슬롯이 사용 중, 캡처 스레드는 기다리지 않고 정책대로 처리
+                if self.delivery.policy == 'drop-newest':
+                    self.delivery.record_drop('drop_newest')
+                    return Gst.FlowReturn.OK
+                slot = self._evict_oldest_queued()
+                if slot is None: # 큐는 비었고 sender 가 모든 슬롯을 잡고 있는 경우
+                    self.delivery.record_drop('pool_exhausted')
+                    return Gst.FlowReturn.OK
+                self.delivery.record_drop('drop_oldest')
+
+            result, map_info = buf.map(Gst.MapFlags.READ)
+            if not result:
+                self.buffer_pool.release(slot)
+                logger.error("Failed to map buffer for reading.")
+                return Gst.FlowReturn.ERROR
+
+            try:
+                # gst-python override 가 있으면 map_info.data 는 매핑된 메모리에 대한 memoryview,
+                # 없으면 PyGObject 가 만든 bytes. 어느 경우든 슬롯으로의 복사는 한 번뿐
+                slot.fill(map_info.data)
+                slot.pts = buf.pts
+                slot.flags = buf.get_flags()
+                width, height = self._sample_dimensions(sample)
+                slot.meta = (sequence, capture_time_ns, width, height, is_keyframe)
+            finally:
+                buf.unmap(map_info) # 항상 버퍼 unmap
+
+            self._send_queue.put(slot)
+
+        except Exception as e:
+            logger.error(f"Error in on_new_sample ({self.name}): {e}")
+
+        return Gst.FlowReturn.OK
+
+    def _fan_out_to_subscriptions(self, sample):
+        """ due 가 된 구독에게 보낼 프레임 복사본 생성 (전달은 SubscriptionManager worker 가 담당) """
+        streamer = self.streamer
+        subscriptions = streamer.subscriptions
+        due = subscriptions.collect_due(self.name, time.monotonic())
+        if not due:
+            return
+        buf = sample.get_buffer()
+        result, map_info = buf.map(Gst.MapFlags.READ)
+        if not result:
+            subscriptions.release(due)
+            return
+        try:
+            data = bytes(map_info.data)
+        finally:
+            buf.unmap(map_info)
+        width, height = self._sample_dimensions(sample)
+        pts = buf.pts if buf.pts != Gst.CLOCK_TIME_NONE else None
+        subscriptions.submit(due, SampledFrame(data, streamer.camera_id, pts, streamer._estimate_capture_time_ns(buf.pts),
+                                               width, height, self.raw_format, self.codec))
+
+    def _sample_dimensions(self, sample):
+        caps = sample.get_caps()
+        if caps and caps.get_size() > 0:
+            structure = caps.get_structure(0)
+            ok_w, width = structure.get_int('width')
+            ok_h, height = structure.get_int('height')
+            if ok_w and ok_h:
+                return width, height
+        return self.width, self.height
+
+    def _is_keyframe(self, buf):
+        if buf.has_flags(Gst.BufferFlags.DELTA_UNIT):
+            return False
+        # 인트라 전용 코덱은 모든 프레임이 독립 디코딩 가능, 일정 간격의 프레임만 키 프레임으로 취급
+        return self._frame_index % self.keyframe_interval == 0
+
+    def _evict_oldest_queued(self):
+        """ 전송 대기 큐에서 가장 오래된 프레임 슬롯을 빼앗아 재사용 """
+        try:
+            slot = self._send_queue.get_nowait()
+        except queue.Empty:
+            return None
+        if slot is None: # 종료 신호는 되돌려 놓음
+            self._send_queue.put(None)
+        return slot
+
+    def _sender_loop(self):
+        """ 슬롯 큐에서 프레임을 꺼내 Kafka 로 전송하는 전용 스레드 """
+        while True:
+            slot = self._send_queue.get()
+            if slot is None:
+                break
+            try:
+                self._send_slot(slot)
+            finally:
+                self.buffer_pool.release(slot)
+        logger.info(f"KafkaStreamer sender loop finished for rendition '{self.name}'.")
+
+    def _send_slot(self, slot):
+        streamer = self.streamer
+        breaker = streamer.breaker
+        if not breaker.allow_request():
+            # 브로커 장애 중: 전송/재연결 시도 없이 디스크 스풀로
+            self._spool_slot(slot)
+            return
+        producer = streamer._producer_for_send()
+        if producer is None:
+            streamer._on_send_failure(RuntimeError("Kafka producer unavailable"))
+            self._spool_slot(slot)
+            return
+        # in-flight 창이 빌 때까지 대기, 그동안 캡처 쪽은 슬롯 부족으로 드롭 정책을 적용함
+        while not self.delivery.wait_for_window(timeout=0.5):
+            if streamer._stop_event.is_set():
+                breaker.cancel_probe()
+                self.delivery.record_drop('shutdown')
+                return
+            if breaker.is_open(): # 대기 중 다른 전송 실패로 브레이커가 열림
+                self._spool_slot(slot)
+                return
+        self.delivery.on_dispatched()
+        try:
+            # kafka-python 은 send() 안에서 value 를 배치 버퍼로 복사하므로 반환 직후 슬롯 재사용 가능
+            with slot.view() as frame_view:
+                futures = [producer.send(self.topic, value, key=key, headers=headers)
+                           for value, key, headers in self._iter_messages(slot, frame_view)]
+            self.delivery.track(futures, slot.length)
+            streamer._record_dispatch_latency(self.latency_stats, slot.pts)
+            logger.debug(f"Sent frame to Kafka topic {self.topic} (size: {slot.length}, messages: {len(futures)})")
+        except Exception as e: # 버퍼 가득 참, 메타데이터 타임아웃 등 send() 자체의 실패
+            self.delivery.on_send_error(e)
+            streamer._on_send_failure(e)
+            self._spool_slot(slot)
+
+    def _spool_slot(self, slot):
+        """ 브레이커가 열려 있는 동안의 프레임을 디스크 스풀에 기록 (KAFKA_SPOOL_DECIMATION 마다 한 장) """
+        spool = self.streamer.spool
+        if spool is None:
+            self.delivery.record_drop('breaker_open')
+            return
+        self._spool_counter += 1
+        if (self._spool_counter - 1) % self.streamer.spool_decimation != 0:
+            self.delivery.record_drop('spool_decimated')
+            return
+        try:
+            with slot.view() as frame_view:
+                # chunk 로 나눈 프레임은 일부 chunk 만 남지 않도록 한 번에 기록
+                messages = [(self.topic, key, headers, value)
+                            for value, key, headers in self._iter_messages(slot, frame_view)]
+                if not spool.append_many(messages):
+                    self.delivery.record_drop('spool_too_large')
+                    return
+            self.frames_spooled += 1
+        except Exception as e:
+            logger.error(f"Failed to spool frame for rendition '{self.name}': {e}")
+            self.delivery.record_drop('spool_error')
+
+    def _iter_messages(self, slot, frame_view):
+        """ 봉투 방식에 맞춰 프레임을 구성하는 Kafka 메시지 (value, key, headers) 를 순서대로 생성 """
+        streamer = self.streamer
+        if streamer.envelope_mode == 'none':
+            yield frame_view, None, None
+            return
+
+        sequence, capture_time_ns, width, height, is_keyframe = slot.meta
+        envelope = FrameEnvelope(
+            streamer.camera_id, sequence, slot.pts if slot.pts != Gst.CLOCK_TIME_NONE else None,
+            capture_time_ns, width, height, self.raw_format, self.codec,
+            slot.length, flags=FLAG_KEYFRAME if is_keyframe else 0,
+        )
+        message_key = streamer._message_key
+        max_chunk = streamer.max_message_bytes - FIXED_HEADER_SIZE - len(message_key) - 512 # 레코드 오버헤드 여유
+        for chunk_index, chunk_count, offset, length in iter_chunks(slot.length, max_chunk):
+            envelope.chunk_index = chunk_index
+            envelope.chunk_count = chunk_count
+            envelope.chunk_offset = offset
+            header = envelope.pack()
+            chunk = frame_view[offset:offset + length]
+            if streamer.envelope_mode == 'headers':
+                yield chunk, message_key, [(ENVELOPE_HEADER_KEY, header)]
+            else: # inline: 헤더 + chunk 를 하나의 value 로 (헤더를 지원하지 않는 소비자용, chunk 복사 1회 추가)
+                yield header + chunk, message_key, None
+
+    def _drain_send_queue(self):
+        while True:
+            try:
+                slot = self._send_queue.get_nowait()
+            except queue.Empty:
+                break
+            if slot is not None:
+                self.buffer_pool.release(slot)
+
+    def get_stats(self):
+        return {
+            'topic': self.topic,
+            'frame_codec': self.codec,
+            'resolution': f"{self.width}x{self.height}",
+            'fps': self.fps,
+            'buffer_pool_free': self.buffer_pool.free_count(),
+            'send_queue_depth': self._send_queue.qsize(),
+            'frames_spooled': self.frames_spooled,
+            'frames_gated': self.frames_gated,
+            'delivery': self.delivery.snapshot(),
+            'dispatch_latency': self.latency_stats.snapshot(),
+        }
+
+
+class KafkaStreamer(threading.Thread):
+    def __init__(self, camera_id=None, source=None):
         super().__init__()
         self.topic = os.environ.get('KAFKA_TOPIC', 'default_topic')
+        # 메시지 key 및 봉투에 들어가는 카메라 식별자 (CameraManager 가 주입)
+        self.camera_id = camera_id or os.environ.get('CAMERA_ID_OVERRIDE') or os.path.basename(os.environ.get('CAMERA_DEVICE', '/dev/video0'))
+        self._message_key = self.camera_id.encode('utf-8')
         raw_bootstrap_servers = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
         self.bootstrap_servers = [s.strip() for s in raw_bootstrap_servers.split(',')] # 콤마로 구분된 서버 리스트 처리
 
@@ -38,12 +494,70 @@ class KafkaStreamer(threading.Thread):
             self.image_height = 480
         
         self.device = os.environ.get('CAMERA_DEVICE', '/dev/video0')
-        self.pipeline_str_format = f"""
-            v4l2src device={self.device} !
-            videorate ! video/x-raw,framerate={self.frame_rate}/1 !
-            videoconvert ! video/x-raw,format=BGR,width={self.image_width},height={self.image_height} !
-            appsink name=sink emit-signals=true max-buffers=1 drop=true
-        """ # 기존 BGR 포맷 유지
+        # CaptureHub 사용 시 intervideosrc 소스 (장치를 직접 열지 않음), 없으면 v4l2src 로 직접 캡처
+        self.source_str = source or f"v4l2src device={self.device}"
+
+        # 프레임 전송 코덱: raw(BGR 원본), jpeg, png. 인코딩은 GStreamer 파이프라인 안에서 수행
+        self.frame_codec = os.environ.get('KAFKA_FRAME_CODEC', 'raw').lower()
+        if self.frame_codec not in FRAME_CODECS:
+            logger.error(f"Unsupported KAFKA_FRAME_CODEC '{self.frame_codec}'. Falling back to 'raw'.")
+            self.frame_codec = 'raw'
+        try:
+            self.jpeg_quality = min(max(int(os.environ.get('KAFKA_JPEG_QUALITY', 85)), 1), 100)
+            self.png_compression_level = min(max(int(os.environ.get('KAFKA_PNG_COMPRESSION_LEVEL', 1)), 0), 9)
+        except ValueError:
+            logger.error("Invalid KAFKA_JPEG_QUALITY/KAFKA_PNG_COMPRESSION_LEVEL. Using defaults.")
+            self.jpeg_quality = 85
+            self.png_compression_level = 1
+
+        # pull 스레드가 종료 요청을 확인하는 최대 주기 (프레임이 오면 즉시 깨어남)
+        self.pull_timeout_ms = int(os.environ.get('KAFKA_PULL_TIMEOUT_MS', 500))
+        # pull -> sender 스레드 hand-off 용 재사용 버퍼 슬롯 개수
+        self.buffer_pool_slots = max(int(os.environ.get('KAFKA_BUFFER_POOL_SLOTS', 4)), 1)
+        # 브로커 ack 를 기다리는 프레임 최대 개수 및 과부하 시 드롭 정책
+        self.max_in_flight_frames = int(os.environ.get('KAFKA_MAX_IN_FLIGHT_FRAMES', 8))
+        self.overload_policy = os.environ.get('KAFKA_OVERLOAD_POLICY', 'drop-oldest').lower()
+        self.max_block_ms = int(os.environ.get('KAFKA_MAX_BLOCK_MS', 1000))
+        # 브레이커 half-open 프로브 시 producer 를 새로 만들 연속 실패 횟수
+        self.reinit_after_failures = int(os.environ.get('KAFKA_REINIT_AFTER_FAILURES', 10))
+        # 서킷 브레이커: 연속 실패 임계치, 지수 백오프 시작/최대 값
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.environ.get('KAFKA_BREAKER_FAILURE_THRESHOLD', 3)),
+            base_backoff=int(os.environ.get('KAFKA_BREAKER_BASE_BACKOFF_MS', 1000)) / 1000.0,
+            max_backoff=int(os.environ.get('KAFKA_BREAKER_MAX_BACKOFF_MS', 60000)) / 1000.0,
+        )
+        # 브레이커가 열린 동안 메시지를 보관할 디스크 스풀 (0 이면 스풀 없이 드롭)
+        self.spool_max_bytes = int(os.environ.get('KAFKA_SPOOL_MAX_MB', 256)) * 1024 * 1024
+        self.spool_path = os.environ.get('KAFKA_SPOOL_PATH', '')
+        self.spool_replay_rate = max(float(os.environ.get('KAFKA_SPOOL_REPLAY_RATE', 50)), 0.1) # 초당 재전송 메시지 수
+        self.spool_max_age = float(os.environ.get('KAFKA_SPOOL_MAX_AGE_SEC', 600)) # 이보다 오래된 메시지는 재전송하지 않음
+        self.spool_decimation = max(int(os.environ.get('KAFKA_SPOOL_DECIMATION', 1)), 1) # N 프레임 중 1 장만 스풀
+        self.spool_ack_timeout = int(os.environ.get('KAFKA_SPOOL_ACK_TIMEOUT_MS', 10000)) / 1000.0 # 재전송 메시지 ack 대기 시간
+        # 봉투 방식: headers(Kafka 헤더, 기본) / inline(payload 앞에 바이너리 헤더) / none(기존 bare bytes)
+        self.envelope_mode = os.environ.get('KAFKA_FRAME_ENVELOPE', 'headers').lower()
+        if self.envelope_mode not in ENVELOPE_MODES:
+            logger.error(f"Unsupported KAFKA_FRAME_ENVELOPE '{self.envelope_mode}'. Falling back to 'headers'.")
+            self.envelope_mode = 'headers'
+        # 메시지 한 개의 최대 크기, 이보다 큰 프레임은 chunk 로 분할 (브로커 기본 한도 1MB 이하로 유지)
+        self.max_message_bytes = int(os.environ.get('KAFKA_MAX_MESSAGE_BYTES', 1000000))
+
+        # 모션 게이트: 정적인 장면 프레임 억제 (임계치는 64x48 썸네일 평균 절대 차이, 0~255)
+        self.motion_gate = None
+        if os.environ.get('KAFKA_MOTION_GATE', 'false').lower() == 'true':
+            self.motion_gate = MotionGate(
+                threshold=float(os.environ.get('KAFKA_MOTION_THRESHOLD', 4.0)),
+                hold_sec=float(os.environ.get('KAFKA_MOTION_HOLD_SEC', 2.0)),
+                keepalive_sec=float(os.environ.get('KAFKA_MOTION_KEEPALIVE_SEC', 10.0)),
+            )
+
+        self.renditions = self._load_renditions()
+        # 소비자별 샘플링 구독, 스트림 재시작과 상관없이 유지
+        self.subscriptions = SubscriptionManager(
+            producer_getter=lambda: self.producer,
+            max_message_bytes=self.max_message_bytes,
+            max_subscriptions=int(os.environ.get('KAFKA_MAX_SUBSCRIPTIONS', 64)),
+        )
+        self.pipeline_str_format = self._build_pipeline_str()
 
         self.running = False
         self.pipeline = None
@@ -51,14 +565,91 @@ class KafkaStreamer(threading.Thread):
         self.loop = None
         self._thread = None # 내부 스레드 변수명 변경 (외부에서 직접 접근 방지)
         self._stop_event = threading.Event()
+        self._producer_lock = threading.Lock()
+        self.spool = None
+        self._replay_thread = None
+        self._motion_thread = None
+        self.spool_replayed = 0
+        self.spool_expired = 0
+        # SIGTERM/SIGINT 는 uvicorn 이 처리, 스트림 중지는 lifespan 종료 -> CameraManager.shutdown() 에서
+
+    def _load_renditions(self):
+        spec = os.environ.get('KAFKA_RENDITIONS', '').strip()
+        if spec:
+            try:
+                configs = parse_renditions(spec, self.image_width, self.image_height, self.frame_rate, self.frame_codec)
+            except ValueError as e:
+                logger.error(f"Invalid KAFKA_RENDITIONS '{spec}': {e}. Using single default rendition.")
+                configs = []
+        else:
+            configs = []
+
+        if not configs:
+            # 기존과 동일한 단일 스트림 (KAFKA_TOPIC 그대로 사용)
+            return [KafkaRendition(self, DEFAULT_RENDITION_NAME, self.topic, self.image_width, self.image_height,
+                                   self.frame_rate, self.frame_codec)]
 
-        # 깔끔한 shutdown을 위한 시그널 핸들러 등록
-        signal.signal(signal.SIGTERM, self._handle_signal)
-        signal.signal(signal.SIGINT, self._handle_signal)
+        topic_format = os.environ.get('KAFKA_RENDITION_TOPIC_FORMAT', '{topic}.{name}')
+        return [
+            KafkaRendition(self, c['name'], topic_format.format(topic=self.topic, name=c['name']),
+                           c['width'], c['height'], c['fps'], c['codec'], c['quality'])
+            for c in configs
+        ]
 
-    def _handle_signal(self, signum, frame):
-        logger.warning(f"Signal {signum} received, initiating shutdown...")
-        self.stop_stream()
+    def _build_pipeline_str(self):
+        single = len(self.renditions) == 1 and self.renditions[0].name == DEFAULT_RENDITION_NAME
+        if single and self.motion_gate is None:
+            # 단일 스트림은 기존 파이프라인 구조 유지 (카메라가 요청 해상도로 직접 협상)
+            rendition = self.renditions[0]
+            return f"""
+                {self.source_str} !
+                videorate ! video/x-raw,framerate={_framerate_caps(rendition.fps)} !
+                videoconvert ! video/x-raw,format={rendition.raw_format},width={rendition.width},height={rendition.height} !
+                {rendition.encoder_str()}
+                {rendition.appsink_str()}
+            """
+
+        # 한 번 캡처해서 tee 로 rendition 별 분기, 소스는 가장 큰 해상도/가장 높은 fps 로 맞춤
+        max_fps = max(r.fps for r in self.renditions)
+        largest = max(self.renditions, key=lambda r: r.width * r.height)
+        branches = [f"t. ! {r.branch_str()}" for r in self.renditions]
+        if self.motion_gate is not None:
+            # 썸네일 분기는 밀리면 버리도록 leaky 큐 사용, 프레임당 64x48 변환 비용만 추가됨
+            branches.append(
+                f"t. ! queue max-size-buffers=1 leaky=downstream ! videoscale ! videoconvert ! "
+                f"video/x-raw,format=GRAY8,width={GATE_WIDTH},height={GATE_HEIGHT} ! "
+                f"appsink name={MOTION_SINK_NAME} emit-signals=false max-buffers=1 drop=true sync=false"
+            )
+        branches_str = "\n".join(branches)
+        return f"""
+            {self.source_str} !
+            videorate ! video/x-raw,width={largest.width},height={largest.height},framerate={_framerate_caps(max_fps)} !
+            tee name=t
+            {branches_str}
+        """
+
+    def get_stream_details(self):
+        """ 소비자가 프레임을 디코딩하는데 필요한 정보 (camera 의 stream_details 에 포함됨) """
+        primary = self.renditions[0]
+        return {
+            'frame_codec': primary.codec,
+            'frame_pixel_format': primary.raw_format,
+            'frame_width': primary.width,
+            'frame_height': primary.height,
+            'frame_rate': primary.fps,
+            'frame_envelope': self.envelope_mode,
+            'frame_envelope_version': ENVELOPE_VERSION if self.envelope_mode != 'none' else None,
+            'max_message_bytes': self.max_message_bytes if self.envelope_mode != 'none' else None,
+        }
+
+    def get_renditions(self):
+        return [r.describe() for r in self.renditions]
+
+    def get_latest_sample(self):
+        """ 가장 큰 rendition 의 최신 샘플 (스냅샷용), 스트리밍 중이 아니면 None """
+        if not self.running:
+            return None
+        return max(self.renditions, key=lambda r: r.width * r.height).latest_sample
 
     def start_stream(self): # device 파라미터 제거 (초기화 시 환경 변수에서 로드)
         if self.is_alive():
@@ -68,86 +659,143 @@ class KafkaStreamer(threading.Thread):
         self._stop_event.clear() # 스레드 시작 전 이벤트 초기화
         self._thread = threading.Thread(target=self._run_loop, daemon=True) # 데몬 스레드로 변경 고려
         self._thread.start()
-        logger.info(f"KafkaStreamer thread started for device {self.device} sending to topic {self.topic}.")
+        logger.info(f"KafkaStreamer thread started for device {self.device} sending to topic(s) {[r.topic for r in self.renditions]}.")
         return True
 
     def _run_loop(self): # 실제 스레드에서 실행될 메소드 (이름 변경)
         Gst.init(None)
         logger.info("GStreamer And Kafka initializing...")
-        self.loop = GObject.MainLoop()
-        
-        if not self.initialize_producer(): # Producer 초기화 실패 시 종료
-            logger.error("Failed to initialize Kafka producer. Stopping stream.")
-            return
+        # 스레드 전용 컨텍스트를 사용해야 버스 watch 가 다른 GLib 루프(RTSP 등)와 섞이지 않음
+        context = GLib.MainContext.new()
+        context.push_thread_default()
+        self.loop = GLib.MainLoop.new(context, False)
+        started_renditions = []
 
-        pipeline_str = self.pipeline_str_format # 현재 설정으로 파이프라인 문자열 생성
-        logger.info(f"GStreamer pipeline: {pipeline_str}")
-        
         try:
-            self.pipeline = Gst.parse_launch(pipeline_str)
-        except Exception as e:
-            logger.error(f"Failed to create GStreamer pipeline: {e}")
-            if self.producer: self.producer.close()
-            return
-        
-        appsink = self.pipeline.get_by_name('sink')
-        if not appsink:
-            logger.error("Failed to get 'sink' from pipeline. Stopping stream.")
-            self.pipeline.set_state(Gst.State.NULL)
-            if self.producer: self.producer.close()
-            return
-        appsink.connect('new-sample', self.on_new_sample)
+            self._open_spool()
+            if not self.initialize_producer():
+                # 브로커가 아직 없어도 캡처는 계속, 백오프 후 프로브 시점에 다시 생성 시도
+                logger.error("Failed to initialize Kafka producer. Spooling until broker is reachable.")
+                self.breaker.trip(RuntimeError("Kafka producer initialization failed"))
 
-        bus = self.pipeline.get_bus()
-        bus.add_signal_watch()
-        bus.connect("message", self.on_message)
+            pipeline_str = self.pipeline_str_format # 현재 설정으로 파이프라인 문자열 생성
+            logger.info(f"GStreamer pipeline: {pipeline_str}")
 
-        self.pipeline.set_state(Gst.State.PLAYING)
-        # 상태 변경 확인 (약간의 타임아웃 허용)
-        state_change_result = self.pipeline.get_state(timeout=5 * Gst.SECOND)[1] # Gst.CLOCK_TIME_NONE 대신 타임아웃
-        if state_change_result != Gst.State.PLAYING:
-            logger.error(f"Failed to set pipeline to PLAYING state. Current state: {state_change_result}")
-        else:
-            logger.info("GStreamer pipeline set to PLAYING state.")
-            self.running = True # 파이프라인이 실제로 PLAYING 상태가 되면 running을 True로
-        
-        try:
-            while not self._stop_event.is_set(): # 이벤트 플래그 확인
-                 # GLib 메인 루프 컨텍스트를 주기적으로 반복하여 GStreamer 메시지 및 앱 싱크 콜백 처리
-                context = self.loop.get_context()
-                context.iteration(may_block=False) # Non-blocking iteration
-                time.sleep(0.01) # CPU 사용량 줄이기 위해 짧은 sleep
+            try:
+                self.pipeline = Gst.parse_launch(pipeline_str)
+            except Exception as e:
+                logger.error(f"Failed to create GStreamer pipeline: {e}")
+                return
+
+            appsinks = {}
+            for rendition in self.renditions:
+                appsink = self.pipeline.get_by_name(rendition.sink_name)
+                if not appsink:
+                    logger.error(f"Failed to get '{rendition.sink_name}' from pipeline. Stopping stream.")
+                    return
+                appsinks[rendition.name] = appsink
+
+            bus = self.pipeline.get_bus()
+            bus.add_signal_watch() # thread-default 컨텍스트(위에서 push)에 watch 가 붙음
+            bus.connect("message", self.on_message)
+
+            self.pipeline.set_state(Gst.State.PLAYING)
+            # 상태 변경 확인 (약간의 타임아웃 허용)
+            state_change_result = self.pipeline.get_state(timeout=5 * Gst.SECOND)[1] # Gst.CLOCK_TIME_NONE 대신 타임아웃
+            if state_change_result != Gst.State.PLAYING:
+                logger.error(f"Failed to set pipeline to PLAYING state. Current state: {state_change_result}")
+            else:
+                logger.info("GStreamer pipeline set to PLAYING state.")
+                self.running = True # 파이프라인이 실제로 PLAYING 상태가 되면 running을 True로
+
+            for rendition in self.renditions:
+                rendition.start(appsinks[rendition.name])
+                started_renditions.append(rendition)
+            if self.spool is not None:
+                self._replay_thread = threading.Thread(target=self._replay_loop, daemon=True)
+                self._replay_thread.start()
+            self.subscriptions.start()
+            if self.motion_gate is not None:
+                motion_sink = self.pipeline.get_by_name(MOTION_SINK_NAME)
+                if motion_sink:
+                    self.motion_gate.reset()
+                    self._motion_thread = threading.Thread(target=self._motion_loop, args=(motion_sink,), daemon=True)
+                    self._motion_thread.start()
+                else:
+                    logger.error(f"Failed to get '{MOTION_SINK_NAME}' from pipeline. Motion gate will only send keepalive frames.")
+
+            # 메시지가 올 때만 깨어나는 블로킹 루프, stop_stream()/on_message() 에서 quit
+            if not self._stop_event.is_set():
+                self.loop.run()
             logger.info("Stop event received, exiting run loop.")
         except Exception as e:
             logger.error(f"Error running main loop: {e}")
         finally:
+            self._stop_event.set()
             self.running = False
             if self.pipeline:
                 logger.info("Setting pipeline to NULL state.")
+                # NULL 로 전환하면 appsink 가 flushing 되어 pull 스레드의 대기가 즉시 풀림
                 self.pipeline.set_state(Gst.State.NULL)
+                self.pipeline.get_bus().remove_signal_watch()
+            for rendition in started_renditions:
+                rendition.join()
+            if self._replay_thread and self._replay_thread.is_alive():
+                self._replay_thread.join(timeout=5.0)
+            self._replay_thread = None
+            if self._motion_thread and self._motion_thread.is_alive():
+                self._motion_thread.join(timeout=5.0)
+            self._motion_thread = None
+            self.subscriptions.stop()
+            self.pipeline = None
             if self.producer:
                 logger.info("Closing Kafka producer.")
-                self.producer.close()
-            if self.loop and self.loop.is_running(): # 루프가 실행 중일 때만 quit 호출
-                 self.loop.quit()
+                self.producer.close(timeout=5)
+                self.producer = None
+            if self.spool is not None:
+                self.spool.close() # 남은 메시지는 파일에 유지, 다음 시작 시 이어서 replay
+                self.spool = None
+            context.pop_thread_default()
+            self.loop = None
             logger.info("KafkaStreamer run loop finished.")
 
+    def _quit_loop(self, *args):
+        if self.loop and self.loop.is_running():
+            self.loop.quit()
+        return GLib.SOURCE_REMOVE
+
+    def _wake_loop(self):
+        """ 다른 스레드에서 루프 종료를 요청, 루프가 아직 run() 전이어도 시작 직후 처리됨 """
+        loop = self.loop
+        if loop is None:
+            return
+        source = GLib.Idle()
+        source.set_callback(self._quit_loop)
+        source.attach(loop.get_context())
 
     def initialize_producer(self): # 성공 여부 반환
         try:
             # 이전 producer가 있다면 명시적으로 닫기
             if self.producer:
-                self.producer.close()
+                self.producer.close(timeout=5)
                 logger.info("Closed existing KafkaProducer before reinitialization.")
 
-            # Frame 크기 계산
-            current_frame_size = self.image_width * self.image_height * 3
-            producer_max_request_size = max(current_frame_size + 1024, 5 * 1024 * 1024) # 최소 5MB
-            logger.info(f"KafkaStreamer [{self.device}]: Calculated current_frame_size: {current_frame_size} bytes")
+            # Frame 크기 계산 (가장 큰 rendition 기준)
+            current_frame_size = max(r.width * r.height * 3 for r in self.renditions)
+            if self.envelope_mode != 'none':
+                # 큰 프레임은 chunk 로 나눠 보내므로 메시지 한도만큼만 허용
+                producer_max_request_size = max(self.max_message_bytes + 16 * 1024, 1024 * 1024)
+            elif all(r.codec == 'jpeg' for r in self.renditions):
+                # 압축 프레임은 Kafka 기본 한도(1MB) 안에 들어가므로 max_request_size 를 늘리지 않음
+                producer_max_request_size = 1024 * 1024
+            else:
+                producer_max_request_size = max(current_frame_size + 1024, 5 * 1024 * 1024) # 최소 5MB
+            logger.info(f"KafkaStreamer [{self.device}]: renditions={[r.name for r in self.renditions]}, max raw frame size: {current_frame_size} bytes, max_request_size: {producer_max_request_size}")
             self.producer = KafkaProducer(
                 bootstrap_servers=self.bootstrap_servers,
                 retries=5, # Kafka 전송 재시도 횟수
                 retry_backoff_ms=1000, # 재시도 간격
+                max_block_ms=self.max_block_ms, # 버퍼/메타데이터 대기로 sender 스레드가 오래 막히지 않도록
                 # api_version_auto_timeout_ms=10000, # Kafka 브로커 버전 자동 감지 타임아웃 (필요시)
                 # request_timeout_ms=30000, # 요청 타임아웃 (필요시)
                 # linger_ms=10, # 배치 전송을 위한 대기 시간 (처리량 향상 목적)
@@ -164,15 +812,108 @@ class KafkaStreamer(threading.Thread):
     #     logger.info("Reinitializing KafkaProducer...")
     #     return self.initialize_producer()
 
+    def _open_spool(self):
+        if self.spool is not None or self.spool_max_bytes <= 0:
+            return
+        path = self.spool_path or os.path.join('/var/tmp/camera-agent', f"kafka_spool_{self.camera_id}.bin")
+        try:
+            self.spool = DiskSpool(path, self.spool_max_bytes)
+            logger.info(f"Kafka disk spool ready at {path} ({self.spool_max_bytes // (1024 * 1024)} MB)")
+        except Exception as e:
+            logger.error(f"Failed to open Kafka disk spool at {path}: {e}. Frames will be dropped during broker outages.")
+            self.spool = None
+
+    def _producer_for_send(self):
+        """ half-open 프로브일 때만 producer 재생성 (없거나 연속 실패가 누적된 경우) """
+        if self.breaker.is_probing() and (
+                self.producer is None or self.breaker.consecutive_failures >= self.reinit_after_failures):
+            with self._producer_lock:
+                if self.breaker.is_probing():
+                    logger.warning("Reinitializing Kafka producer for circuit breaker probe.")
+                    self.initialize_producer()
+        return self.producer
+
+    def _on_delivery_result(self, exc):
+        """ DeliveryTracker 콜백 (producer I/O 스레드), ack 결과로 브레이커 상태 갱신 """
+        if exc is None:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure(exc)
+
+    def _on_send_failure(self, exc):
+        self.breaker.record_failure(exc)
+        logger.error(f"Failed to send frame to Kafka: {exc} (consecutive failures: {self.breaker.consecutive_failures})")
+
+    def _motion_loop(self, appsink):
+        """ 썸네일 appsink 에서 GRAY8 프레임을 받아 모션 게이트 상태 갱신 """
+        timeout_ns = self.pull_timeout_ms * Gst.MSECOND
+        while not self._stop_event.is_set():
+            sample = appsink.emit('try-pull-sample', timeout_ns)
+            if sample is None:
+                continue
+            buf = sample.get_buffer()
+            result, map_info = buf.map(Gst.MapFlags.READ)
+            if not result:
+                continue
+            try:
+                self.motion_gate.analyze(map_info.data)
+            except Exception as e:
+                logger.error(f"Error in motion gate: {e}")
+            finally:
+                buf.unmap(map_info)
+        logger.info("KafkaStreamer motion loop finished.")
+
+    def get_motion_gate_state(self):
+        """ Visibility Server 로 보고하는 카메라 상태용, 게이트를 쓰지 않으면 None """
+        if self.motion_gate is None:
+            return None
+        state = self.motion_gate.snapshot()
+        state['frames_gated'] = sum(r.frames_gated for r in self.renditions)
+        return state
+
+    def _replay_loop(self):
+        """ 브레이커가 닫혀 있는 동안 스풀의 메시지를 오래된 순서로 KAFKA_SPOOL_REPLAY_RATE 속도로 재전송 """
+        interval = 1.0 / self.spool_replay_rate
+        max_age_ns = int(self.spool_max_age * 1e9)
+        while not self._stop_event.is_set():
+            spool = self.spool
+            producer = self.producer
+            if spool is None or producer is None or not self.breaker.is_closed() or len(spool) == 0:
+                self._stop_event.wait(0.5)
+                continue
+            record = spool.peek()
+            if record is None:
+                self._stop_event.wait(interval)
+                continue
+            if max_age_ns > 0 and time.time_ns() - record.enqueue_time_ns > max_age_ns:
+                spool.pop(record.seq)
+                self.spool_expired += 1
+                continue
+            try:
+                # 브로커 ack 를 받은 뒤에만 스풀에서 제거
+                producer.send(record.topic, record.value, key=record.key, headers=record.headers).get(
+                    timeout=self.spool_ack_timeout)
+            except Exception as e:
+                self._on_send_failure(e)
+                self._stop_event.wait(interval)
+                continue # 스풀에 그대로 남김, 브레이커가 닫히면 다시 시도
+            self.breaker.record_success()
+            spool.pop(record.seq)
+            self.spool_replayed += 1
+            self._stop_event.wait(interval)
+        logger.info("KafkaStreamer spool replay loop finished.")
+
     def on_message(self, bus, message):
         t = message.type
         if t == Gst.MessageType.ERROR:
             err, debug = message.parse_error()
             logger.error(f"GStreamer Error: {err}, Debug: {debug}")
             self._stop_event.set() # 오류 발생 시 스레드 종료 이벤트 설정
+            self._quit_loop()
         elif t == Gst.MessageType.EOS:
             logger.info("GStreamer End-Of-Stream reached.")
             self._stop_event.set() # EOS 도달 시 스레드 종료 이벤트 설정
+            self._quit_loop()
         elif t == Gst.MessageType.WARNING:
             err, debug = message.parse_warning()
             logger.warning(f"GStreamer Warning: {err}, Debug: {debug}")
@@ -180,53 +921,46 @@ class KafkaStreamer(threading.Thread):
             # logger.debug(f"GStreamer message type: {t}") # 너무 많은 로그를 유발할 수 있음
         return True # 핸들러 계속 유지
 
-    def on_new_sample(self, sink):
-        # logger.debug("on_new_sample called.") # 너무 자주 호출될 수 있으므로 주의
-        if not self.producer or not self.running: # 프로듀서가 없거나, 실행 중이 아니면 무시
-            # logger.warning("Kafka producer not available or streamer not running. Skipping sample.")
-            return Gst.FlowReturn.OK 
-        
-        try:
-            sample = sink.emit('pull-sample')
-            if not sample:
-                logger.warning("Failed to pull sample from appsink.")
-                return Gst.FlowReturn.ERROR # 샘플 가져오기 실패 시 에러 반환
-
-            buf = sample.get_buffer()
-            result, map_info = buf.map(Gst.MapFlags.READ)
-            if not result:
-                logger.error("Failed to map buffer for reading.")
-                return Gst.FlowReturn.ERROR
-            
-            data_to_send = map_info.data # 바이트 데이터
-            # logger.info(f"Extracted frame of size {len(data_to_send)} bytes.") # 너무 많은 로그 생성 가능
+    def _estimate_capture_time_ns(self, pts):
+        """ 현재 wall-clock 에서 버퍼가 파이프라인에 머문 시간(running time - PTS)을 빼서 캡처 시각 추정 """
+        now_ns = time.time_ns()
+        pipeline = self.pipeline
+        if pipeline is None or pts == Gst.CLOCK_TIME_NONE:
+            return now_ns
+        clock = pipeline.get_clock()
+        if clock is None:
+            return now_ns
+        running_time = clock.get_time() - pipeline.get_base_time()
+        return now_ns - max(running_time - pts, 0)
 
-            try:
-                future = self.producer.send(self.topic, data_to_send)
-                # future.get(timeout=1.0) # 동기 전송 및 결과 확인 (성능에 영향 줄 수 있음, 비동기가 기본)
-                                        # 타임아웃을 짧게 주거나, 콜백 기반으로 변경 고려
-                logger.debug(f"Sent frame to Kafka topic {self.topic} (size: {len(data_to_send)})")
-            except Exception as e: # Kafka 전송 중 예외 발생 (네트워크 문제 등)
-                logger.error(f"Failed to send frame to Kafka: {e}. Attempting to reinitialize producer.")
-                # 프로듀서 재초기화 시도 (연결 문제일 수 있으므로)
-                # 너무 자주 재초기화하는 것을 방지하기 위해 카운터나 시간 제한 둘 수 있음
-                if not self.initialize_producer(): # 재초기화 실패하면 더 이상 진행 어려움
-                    self._stop_event.set() # 스레드 종료
-                    return Gst.FlowReturn.ERROR
-
-            finally:
-                buf.unmap(map_info) # 항상 버퍼 unmap
-
-        except Exception as e:
-            logger.error(f"Error in on_new_sample: {e}")
-            # 여기서 Gst.FlowReturn.ERROR를 반환하면 파이프라인이 멈출 수 있음
-            # 상황에 따라 OK를 반환하고 에러 카운팅 후 특정 임계값 초과 시 스레드 종료 등의 로직도 가능
+    def _record_dispatch_latency(self, latency_stats, pts):
+        """ 버퍼 PTS(running time) 와 현재 파이프라인 running time 차이를 기록 """
+        pipeline = self.pipeline
+        if pipeline is None or pts is None or pts == Gst.CLOCK_TIME_NONE:
+            return
+        clock = pipeline.get_clock()
+        if clock is None:
+            return
+        running_time = clock.get_time() - pipeline.get_base_time()
+        if running_time >= pts:
+            latency_stats.record(running_time - pts)
 
-        return Gst.FlowReturn.OK
+    def get_stats(self):
+        """ Agent API 로 노출되는 스트리머 통계 """
+        return {
+            'running': self.running,
+            'topic': self.topic,
+            'breaker': self.breaker.snapshot(),
+            'motion_gate': self.get_motion_gate_state(),
+            'subscriptions': self.subscriptions.snapshot(),
+            'spool': dict(self.spool.snapshot(), replayed=self.spool_replayed, expired=self.spool_expired) if self.spool else None,
+            'renditions': {r.name: r.get_stats() for r in self.renditions},
+        }
 
     def stop_stream(self):
         logger.info("Attempting to stop KafkaStreamer...")
         self._stop_event.set() # 스레드 루프 종료 요청
+        self._wake_loop() # 블로킹 중인 메인 루프 깨우기
 
         if self._thread and self._thread.is_alive():
             logger.info("Waiting for KafkaStreamer thread to join...")
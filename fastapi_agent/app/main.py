@@ -18,29 +18,65 @@ FAST API 는 후에 gRPC 로 대체될 수 있음
 
 """
 
-from fastapi import FastAPI , HTTPException
+from fastapi import FastAPI , HTTPException, Request
+from fastapi.responses import StreamingResponse, Response, FileResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+from typing import Optional
 from contextlib import asynccontextmanager
 from .rtsp_server import RTSPServer
-from .camera_manager import CameraManager
-from .ptp_synchronization import synchronize_with_ptp_server
-import threading
+from .camera_manager import CameraManager, parse_streaming_methods
+from .dvr_index import parse_byte_range
+import asyncio
 import logging
 import os
-import requests
+import httpx
 import time
 import uuid
-from datetime import datetime
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+async def register_agent(cm, registration_payload):
+    """ 서버 등록을 성공할 때까지 재시도 (REGISTRATION_RETRY_SEC 부터 최대 60초 간격), 성공하면 CameraManager 에 agent_id 설정 """
+    retry_delay = float(os.getenv('REGISTRATION_RETRY_SEC', 5))
+    attempt = 0
+    while True:
+        attempt += 1
+        logger.info(f"Attempting agent registration with payload: {registration_payload}")
+        try:
+            response = await cm.http.post(f"{cm.server_url}/agent_register", json=registration_payload, timeout=10)
+            logger.info(f"Agent registration response status: {response.status_code}")
+            if response.status_code == 201:
+                server_assigned_agent_id = response.json().get("agent_id")
+                if server_assigned_agent_id:
+                    cm.agent_id = server_assigned_agent_id # 실제 ID로 업데이트
+                    cm.registered = True
+                    logger.info(f"Agent registered successfully. CameraManager will use final agent_id: {server_assigned_agent_id}")
+                    return server_assigned_agent_id
+                logger.error(f"'agent_id' not found in successful registration response: {response.text}")
+            else:
+                logger.error(f"Agent registration failed. Status: {response.status_code}, Body: {response.text}")
+        except httpx.HTTPError as e:
+            logger.error(f"Agent registration request failed (network/request error): {e}")
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during agent registration: {e}", exc_info=True)
+        logger.info(f"Registration attempt {attempt} failed. Retrying in {retry_delay} seconds (placeholder agent_id: {cm.agent_id}).")
+        await asyncio.sleep(retry_delay)
+        retry_delay = min(retry_delay * 2, 60)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application lifespan: startup sequence initiated.")
     # 환경 변수 로드
     app.state.streaming_method = os.getenv('STREAMING_METHOD', 'RTSP').upper()
+    # 'RTSP,KAFKA' (또는 'RTSP+KAFKA') 처럼 여러 방식을 함께 지정하면 캡처 허브로 장치를 공유해 동시에 전송
+    streaming_methods = parse_streaming_methods(app.state.streaming_method)
+    if streaming_methods:
+        app.state.streaming_method = '+'.join(streaming_methods)
     
     # Visibility 서버 정보
     # VISIBILITY_SERVER_URL 환경 변수가 전체 URL을 포함하도록 권장
@@ -74,6 +110,9 @@ async def lifespan(app: FastAPI):
         'camera_resolution': os.getenv('CAMERA_RESOLUTION', '640x480'),
         'camera_fps': os.getenv('CAMERA_FPS', '15'),
         'camera_location': os.getenv('CAMERA_LOCATION'), # CameraManager에서 None일 경우 기본값 처리
+        'multi_camera': os.getenv('RTSP_MULTI_CAMERA', 'false').lower() == 'true', # RTSP 모드에서 모든 장치를 장치별 mount 로 제공
+        'capture_hub': os.getenv('CAPTURE_HUB', 'false').lower() == 'true', # 단일 방식에서도 캡처 허브 사용 (로컬 스냅샷 등)
+        'dvr': os.getenv('DVR_ENABLED', 'false').lower() == 'true', # 최근 영상을 세그먼트 링으로 보관 (GET /dvr/clip)
     }
     logger.info(f"Camera Environment Configs: {camera_env_configs}")
 
@@ -83,21 +122,22 @@ async def lifespan(app: FastAPI):
     app.state.rtsp_server = None # app.state에도 초기화
     app.state.kafka_params = None
 
-    if app.state.streaming_method == 'RTSP':
+    if 'RTSP' in streaming_methods:
         rtsp_listen_port = int(os.getenv('RTSP_SERVER_LISTEN_PORT', 8554))
         rtsp_mount_point = os.getenv('RTSP_MOUNT_POINT', '/default_stream')
         rtsp_server_instance = RTSPServer(port=rtsp_listen_port, mount_point=rtsp_mount_point)
         rtsp_server_instance.start() 
         app.state.rtsp_server = rtsp_server_instance
         logger.info(f"RTSPServer thread started. Listening on port {rtsp_listen_port}, mount point {rtsp_mount_point}.")
-    elif app.state.streaming_method == 'KAFKA':
+    if 'KAFKA' in streaming_methods:
         kafka_init_params = {
             'topic': os.getenv('KAFKA_TOPIC', 'default_video_topic'),
             'bootstrap_servers': os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'),
+            'frame_codec': os.getenv('KAFKA_FRAME_CODEC', 'raw').lower(),
         }
         app.state.kafka_params = kafka_init_params
         logger.info(f"Kafka streaming configured with params: {kafka_init_params}")
-    else:
+    if not streaming_methods:
         logger.warning(f"Unsupported or 'NONE' STREAMING_METHOD: {app.state.streaming_method}. No specific streaming server will be initialized by main.py directly.")
 
     # --- Agent 등록 로직 ---
@@ -115,81 +155,41 @@ async def lifespan(app: FastAPI):
     if not initial_cameras_list and app.state.streaming_method != 'NONE':
         logger.error("No camera(s) configured or detected for registration. Registration payload will be empty for cameras.")
     
-    def perform_agent_registration():
-        registration_payload = {
-            "agent_name": app.state.agent_name,
-            "agent_port": app.state.agent_fastapi_port,
-            "cameras": initial_cameras_list if initial_cameras_list else []
-        }
-        logger.info(f"Attempting agent registration with payload: {registration_payload}")
-        try:
-            response = requests.post(
-                f"{app.state.server_url}/agent_register", 
-                json=registration_payload,
-                timeout=10
-            )
-            logger.info(f"Agent registration response status: {response.status_code}")
-            if response.status_code == 201:
-                data = response.json()
-                server_assigned_agent_id = data.get("agent_id")
-                if server_assigned_agent_id:
-                    logger.info(f"Agent registered successfully. Server assigned Agent ID: {server_assigned_agent_id}")
-                    return server_assigned_agent_id
-                else:
-                    logger.error(f"'agent_id' not found in successful registration response: {data}")
-                    return None
-            else:
-                logger.error(f"Agent registration failed. Status: {response.status_code}, Body: {response.text}")
-                return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Agent registration request failed (network/request error): {e}")
-            return None
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during agent registration: {e}", exc_info=True)
-            return None
-
-    server_assigned_agent_id = None
-    max_retries = 3
-    retry_delay = 5
-    for attempt in range(max_retries):
-        server_assigned_agent_id = perform_agent_registration()
-        if server_assigned_agent_id:
-            break
-        logger.error(f"Registration attempt {attempt + 1} of {max_retries} failed.")
-        if attempt < max_retries - 1:
-            logger.info(f"Retrying registration in {retry_delay} seconds...")
-            time.sleep(retry_delay)
-        else:
-            logger.error("Maximum registration attempts reached. Agent may not function correctly with the server.")
-            # raise RuntimeError("Failed to register agent with server after multiple retries.") # 필요시 에러 발생
-
-    # CameraManager 최종 설정 및 시작
-    app.state.camera_manager = temp_cm_for_init # 어쨌든 camera_manager는 app.state에 할당
-    if server_assigned_agent_id:
-        app.state.camera_manager.agent_id = server_assigned_agent_id # 실제 ID로 업데이트
-        logger.info(f"CameraManager will use final agent_id: {server_assigned_agent_id}")
-    else:
-        logger.warning(f"CameraManager will use placeholder agent_id: {app.state.camera_manager.agent_id} due to registration failure.")
-    
-    # 등록 성공 여부와 관계없이 CameraManager 스레드는 시작 (로컬 기능 또는 재시도 등 고려)
-    # 단, server_url이 있어야 서버 통신 시도라도 할 수 있음
-    if app.state.server_url: # 서버 URL이 있을 때만 CM 스레드 시작 (서버 통신 시도)
-         app.state.camera_manager.start()
-         logger.info("CameraManager thread started.")
+    # 제어 평면(등록, 상태 보고, 설정 동기화)은 이벤트 루프의 asyncio 태스크, 서버 요청은 연결 풀을 쓰는 httpx 클라이언트 하나로
+    app.state.http_client = httpx.AsyncClient(timeout=10)
+    app.state.camera_manager = temp_cm_for_init # 등록 전에는 agent_name 을 임시 agent_id 로 사용
+    app.state.camera_manager.http = app.state.http_client
+    registration_payload = {
+        "agent_name": app.state.agent_name,
+        "agent_port": app.state.agent_fastapi_port,
+        "cameras": initial_cameras_list if initial_cameras_list else []
+    }
+
+    control_tasks = []
+    if app.state.server_url: # 서버 URL이 있을 때만 제어 평면 시작 (등록은 백그라운드에서 재시도하므로 시작을 막지 않음)
+        control_tasks.append(asyncio.create_task(register_agent(app.state.camera_manager, registration_payload)))
+        control_tasks.append(asyncio.create_task(app.state.camera_manager.run()))
+        logger.info("CameraManager control plane started.")
     else:
-        logger.warning("VISIBILITY_SERVER_URL not set. CameraManager thread not started. Agent will operate locally if possible.")
+        logger.warning("VISIBILITY_SERVER_URL not set. CameraManager control plane not started. Agent will operate locally if possible.")
+
+    # /health 용 상태는 백그라운드 태스크가 주기적으로 계산
+    app.state.health = None
+    health_task = asyncio.create_task(health_refresh_loop(max(float(os.getenv('HEALTH_REFRESH_SEC', 5)), 0.5)))
 
 
     yield # FastAPI 애플리케이션 실행 구간
 
     # --- 애플리케이션 종료 시 처리 ---
     logger.info("Application lifespan: shutdown sequence initiated.")
-    if hasattr(app.state, 'camera_manager') and app.state.camera_manager and app.state.camera_manager.is_alive():
-        logger.info("Stopping CameraManager thread...")
-        app.state.camera_manager.stop_manager_thread()
-        app.state.camera_manager.join(timeout=10)
-        if app.state.camera_manager.is_alive():
-            logger.warning("CameraManager thread did not terminate gracefully.")
+    health_task.cancel()
+    for task in control_tasks:
+        task.cancel()
+    await asyncio.gather(health_task, *control_tasks, return_exceptions=True) # 진행 중인 서버 요청도 함께 취소됨
+    if hasattr(app.state, 'camera_manager') and app.state.camera_manager:
+        logger.info("Shutting down CameraManager...")
+        await run_in_threadpool(app.state.camera_manager.shutdown)
+    await app.state.http_client.aclose()
     
     if hasattr(app.state, 'rtsp_server') and app.state.rtsp_server and app.state.rtsp_server.is_alive():
         logger.info("Stopping RTSPServer thread...")
@@ -220,8 +220,9 @@ def get_cm(): # Helper function to get camera_manager from app.state
 @app.post("/start_stream", summary="Start the camera stream")
 async def start_stream_endpoint():
     cm = get_cm()
-    if cm.start_stream(): # CameraManager.start_stream()은 성공 시 True 반환하도록 수정 가정
-        return {"message": f"{app.state.streaming_method} streaming started for device {cm.current_device_path}"}
+    # GStreamer 파이프라인 생성/상태 변경은 블로킹이므로 이벤트 루프(제어 평면)를 막지 않도록 스레드 풀에서 실행
+    if await run_in_threadpool(cm.start_stream): # CameraManager.start_stream()은 성공 시 True 반환하도록 수정 가정
+        return {"message": f"{app.state.streaming_method} streaming started for device {', '.join(cm.device_paths)}"}
     else:
         # start_stream이 False를 반환했거나, current_device_path가 없을 수 있음
         detail_msg = f"Failed to start {app.state.streaming_method} stream"
@@ -234,13 +235,14 @@ async def start_stream_endpoint():
 @app.post("/stop_stream", summary="Stop the camera stream")
 async def stop_stream_endpoint():
     cm = get_cm()
-    cm.stop_stream() # 반환값 없어도 일단 실행
+    await run_in_threadpool(cm.stop_stream) # 반환값 없어도 일단 실행
     return {"message": f"{app.state.streaming_method} streaming stopped."}
 
 @app.get("/camera_info", summary="Get information about managed camera(s)")
 async def get_camera_info_endpoint():
     cm = get_cm()
-    camera_list_details = cm.get_camera_info() 
+    # 카메라 객체 구성(rtpbin/Kafka/허브 상태 조회)은 블로킹이므로 제어 평면과 같은 이벤트 루프를 막지 않도록 스레드 풀에서
+    camera_list_details = await run_in_threadpool(cm.get_camera_info)
     return {
         "agent_id": cm.agent_id, # 현재 CM이 알고있는 agent_id 포함
         "streaming_method": app.state.streaming_method,
@@ -248,19 +250,196 @@ async def get_camera_info_endpoint():
         "camera_list": camera_list_details if camera_list_details else []
     }
 
-@app.get("/health", summary="Perform a health check of the agent")
-async def health_check_endpoint():
+@app.get("/devices", summary="List V4L2 devices and their formats from the device registry")
+async def get_devices_endpoint():
+    cm = get_cm()
+    return dict(cm.device_registry.snapshot(), managed_devices=cm.device_paths)
+
+@app.get("/stream_stats", summary="Get runtime statistics of the streaming pipeline")
+async def get_stream_stats_endpoint():
+    cm = get_cm()
+    return {
+        "agent_id": cm.agent_id,
+        "streaming_method": app.state.streaming_method,
+        "streaming_pipeline_active": await run_in_threadpool(cm.check_status),
+        "stats": await run_in_threadpool(cm.get_stream_stats)
+    }
+
+@app.get("/rtsp_sessions", summary="Get per-client RTSP session statistics")
+async def get_rtsp_sessions_endpoint(mount_point: Optional[str] = None):
+    cm = get_cm()
+    if not cm.rtsp_server:
+        raise HTTPException(status_code=409, detail=f"RTSP session statistics require STREAMING_METHOD=RTSP (current: {app.state.streaming_method})")
+    mounts = await run_in_threadpool(cm.rtsp_server.get_session_stats, mount_point)
+    return {
+        "agent_id": cm.agent_id,
+        "total_sessions": sum(mount['count'] for mount in mounts.values()),
+        "total_connections": cm.rtsp_server.sessions.total_connections,
+        "mounts": mounts
+    }
+
+def device_path_for(device: Optional[str]):
+    """ 쿼리의 장치 이름(video0) 또는 경로(/dev/video0) -> 장치 경로, 생략 시 None (현재 장치) """
+    return f"/dev/{device}" if device and not device.startswith('/') else device
+
+async def snapshot_response(device: Optional[str], width: Optional[int]):
+    cm = get_cm()
+    device_path = device_path_for(device)
+    # 인코딩/짧은 캡처는 블로킹이므로 이벤트 루프 밖에서 실행
+    snapshot = await run_in_threadpool(cm.get_snapshot, device_path, width)
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail=f"No frame available from {device_path or cm.current_device_path}")
+    return Response(content=snapshot.jpeg, media_type="image/jpeg", headers={
+        "Cache-Control": f"public, max-age={int(cm.snapshots.interval_sec)}",
+        "X-Frame-Source": snapshot.source,
+        "X-Frame-Timestamp": f"{snapshot.timestamp:.3f}",
+    })
+
+@app.get("/snapshot", summary="Get a JPEG of the latest camera frame")
+async def get_snapshot_endpoint(device: Optional[str] = None):
+    return await snapshot_response(device, None)
+
+@app.get("/thumbnail", summary="Get a downscaled JPEG of the latest camera frame")
+async def get_thumbnail_endpoint(w: int = 320, device: Optional[str] = None):
+    if w <= 0:
+        raise HTTPException(status_code=400, detail="w must be positive")
+    return await snapshot_response(device, w)
+
+HLS_CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+}
+
+@app.get("/hls/{stream}/{filename}", summary="Serve HLS playlist and segments for browsers")
+async def get_hls_file_endpoint(stream: str, filename: str):
+    cm = get_cm()
+    hls = cm.rtsp_server.get_hls_output(stream) if cm.rtsp_server else None
+    if hls is None:
+        raise HTTPException(status_code=404, detail=f"No HLS output for stream {stream} (set HLS_ENABLED=true and start the stream)")
+    path = hls.resolve(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+    extension = os.path.splitext(filename)[1]
+    if extension == '.m3u8':
+        # 플레이리스트는 세그먼트마다 바뀌므로 캐시하지 않음
+        cache_control = "no-cache, no-store"
+    else:
+        # 세그먼트 이름에는 실행마다 새 run_id 가 들어가 재시작 후에도 다시 쓰이지 않으므로 플레이리스트에 남아 있는 동안 캐시 가능
+        cache_control = f"public, max-age={hls.segment_sec * hls.playlist_length}, immutable"
+    return FileResponse(path, media_type=HLS_CONTENT_TYPES[extension], headers={"Cache-Control": cache_control})
+
+def get_dvr(cm, device: Optional[str]):
+    if not cm.dvr_enabled:
+        raise HTTPException(status_code=409, detail="DVR is disabled (set DVR_ENABLED=true)")
+    device_path = device_path_for(device)
+    recorder = cm.get_dvr_recorder(device_path)
+    if recorder is None:
+        raise HTTPException(status_code=404, detail=f"No DVR recording for device {device_path or cm.current_device_path} (stream not running)")
+    return recorder
+
+@app.get("/dvr/segments", summary="List DVR segments kept in the on-disk ring")
+async def get_dvr_segments_endpoint(device: Optional[str] = None):
+    cm = get_cm()
+    return get_dvr(cm, device).snapshot()
+
+@app.get("/dvr/clip", summary="Get a recorded clip (MPEG-TS) by time range")
+async def get_dvr_clip_endpoint(request: Request, start: Optional[float] = None, end: Optional[float] = None,
+                                last_sec: Optional[float] = None, device: Optional[str] = None):
+    """ start/end 는 epoch 초, 또는 last_sec 로 최근 N 초. 겹치는 세그먼트 전체를 이어 붙여 전송 (Range 지원) """
+    cm = get_cm()
+    recorder = get_dvr(cm, device)
+    now = time.time()
+    if last_sec is not None:
+        start, end = now - last_sec, now
+    if start is None:
+        raise HTTPException(status_code=400, detail="Either start (epoch seconds) or last_sec is required")
+    end = now if end is None else end
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be earlier than start")
+
+    clip = recorder.get_clip(start, end)
+    if clip.total_bytes == 0:
+        raise HTTPException(status_code=404, detail="No recorded segments in the requested range")
+    headers = {
+        "Accept-Ranges": "bytes",
+        "X-Clip-Start": f"{clip.start:.3f}", # 세그먼트 경계로 넓어진 실제 구간
+        "X-Clip-End": f"{clip.end:.3f}",
+        "Content-Disposition": f"inline; filename=clip-{int(clip.start)}-{int(clip.end)}.ts",
+    }
+    try:
+        byte_range = parse_byte_range(request.headers.get('range'), clip.total_bytes)
+    except ValueError as e:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{clip.total_bytes}"}, content=str(e))
+    if byte_range is None:
+        headers["Content-Length"] = str(clip.total_bytes)
+        return StreamingResponse(clip.iter_bytes(), media_type="video/mp2t", headers=headers)
+    first, last = byte_range
+    headers["Content-Range"] = f"bytes {first}-{last}/{clip.total_bytes}"
+    headers["Content-Length"] = str(last - first + 1)
+    return StreamingResponse(clip.iter_bytes(first, last), status_code=206, media_type="video/mp2t", headers=headers)
+
+class SubscriptionRequest(BaseModel):
+    interval_sec: float # 몇 초마다 한 장
+    target_type: str # 'kafka' 또는 'http'
+    target: str # Kafka 토픽 이름 또는 HTTP 콜백 URL
+    rendition: Optional[str] = None # KAFKA_RENDITIONS 사용 시 rendition 이름, 없으면 첫 번째
+    max_failures: int = 10 # 연속 전달 실패 시 자동 해제 기준
+
+def get_subscriptions(cm):
+    subscriptions = cm.get_subscription_manager()
+    if subscriptions is None:
+        raise HTTPException(status_code=409, detail=f"Frame subscriptions require STREAMING_METHOD=KAFKA (current: {app.state.streaming_method})")
+    return subscriptions
+
+@app.post("/subscriptions", status_code=201, summary="Register a frame-sampling subscription")
+async def create_subscription_endpoint(body: SubscriptionRequest):
+    cm = get_cm()
+    subscriptions = get_subscriptions(cm)
+    renditions = [r['name'] for r in cm.kafka_streamer.get_renditions()]
+    rendition = body.rendition or renditions[0]
+    if rendition not in renditions:
+        raise HTTPException(status_code=400, detail=f"Unknown rendition '{rendition}'. Available: {renditions}")
+    try:
+        subscription = subscriptions.add(body.interval_sec, body.target_type.lower(), body.target,
+                                         rendition, max_failures=body.max_failures)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return subscription.to_dict()
+
+@app.get("/subscriptions", summary="List frame-sampling subscriptions")
+async def list_subscriptions_endpoint():
+    cm = get_cm()
+    subscriptions = get_subscriptions(cm)
+    return {"agent_id": cm.agent_id, "subscriptions": subscriptions.list()}
+
+@app.get("/subscriptions/{subscription_id}", summary="Get a frame-sampling subscription")
+async def get_subscription_endpoint(subscription_id: str):
+    subscription = get_subscriptions(get_cm()).get(subscription_id)
+    if subscription is None:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return subscription.to_dict()
+
+@app.delete("/subscriptions/{subscription_id}", summary="Remove a frame-sampling subscription")
+async def delete_subscription_endpoint(subscription_id: str):
+    if not get_subscriptions(get_cm()).remove(subscription_id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"message": f"Subscription {subscription_id} removed."}
+
+def compute_health(deep=False):
+    """
+    에이전트 상태 계산 (장치 확인이 블로킹될 수 있으므로 스레드 풀에서 실행)
+    deep=True 이면 레지스트리 대신 스트리밍 상태 또는 실제 파이프라인 probe 로 장치 확인
+    """
     # STREAMING_METHOD을 app.state에서 가져오도록 수정
     current_streaming_method = app.state.streaming_method if hasattr(app.state, 'streaming_method') else 'UNKNOWN'
     
     if not hasattr(app.state, 'camera_manager') or not app.state.camera_manager:
-        uptime = time.time() - app.state.start_time if hasattr(app.state, 'start_time') else 0
-        return {"status": "error", "message": "CameraManager not initialized", "uptime_seconds": uptime}
+        return {"status": "error", "message": "CameraManager not initialized"}
 
     cm = app.state.camera_manager
     try:
         device_path = cm.current_device_path
-        camera_device_ok = cm.is_camera_available(device_path) if device_path else False
+        camera_device_ok = cm.is_camera_available(device_path, deep=deep) if device_path else False
         streaming_pipeline_active = cm.check_status()
         
         agent_overall_status = "ok"
@@ -286,9 +465,36 @@ async def health_check_endpoint():
             "configured_streaming_method": current_streaming_method,
             "expected_vs_actual_transmission": is_transmitting_when_should,
             "visibility_server_url": app.state.server_url if hasattr(app.state, 'server_url') else "N/A",
-            "uptime_seconds": time.time() - app.state.start_time
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}", exc_info=True)
-        uptime = time.time() - app.state.start_time if hasattr(app.state, 'start_time') else 0
-        return {"status": "error", "detail": str(e), "uptime_seconds": uptime}
\ No newline at end of file
+        return {"status": "error", "detail": str(e)}
+
+async def health_refresh_loop(interval_sec):
+    """ HEALTH_REFRESH_SEC 마다 상태를 스레드 풀에서 계산해 app.state.health 에 (계산 시각, 결과) 로 캐시 """
+    while True:
+        try:
+            result = await run_in_threadpool(compute_health)
+            app.state.health = (time.time(), result)
+        except Exception as e:
+            logger.error(f"Background health refresh failed: {e}")
+        await asyncio.sleep(interval_sec)
+
+@app.get("/health", summary="Perform a health check of the agent")
+async def health_check_endpoint(deep: bool = False):
+    # 기본 요청은 캐시만 읽음 (장치 확인이 느려도 이벤트 루프와 다른 API 가 멈추지 않음)
+    uptime = time.time() - app.state.start_time if hasattr(app.state, 'start_time') else 0
+    if deep:
+        result = await run_in_threadpool(compute_health, True)
+        checked_at = time.time()
+        app.state.health = (checked_at, result)
+    else:
+        cached = getattr(app.state, 'health', None)
+        if cached is None: # 첫 계산이 끝나기 전
+            return {"status": "starting", "checked_at": None, "age_seconds": None, "deep": False, "uptime_seconds": uptime}
+        checked_at, result = cached
+    return dict(result,
+                checked_at=checked_at,
+                age_seconds=round(time.time() - checked_at, 3),
+                deep=deep,
+                uptime_seconds=uptime)
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+
+정적인 장면의 프레임 전송을 줄이는 모션 게이트
+
+파이프라인 tee 에서 64x48 GRAY8 썸네일 분기를 받아 이전 썸네일과의 평균 절대 차이(NumPy)를 계산
+- score >= threshold        : 움직임, 프레임 전송
+- 움직임 이후 hold_sec 동안  : 계속 전송 (히스테리시스, 움직임이 멈춰도 바로 끊기지 않음)
+- 그 외                      : 전송 안 함, 단 keepalive_sec 마다 한 장은 전송 (소비자가 카메라 생존/최신 장면 확인)
+썸네일 한 장당 연산량이 고정(3072 픽셀)이므로 해상도와 상관없이 프레임당 CPU 비용이 일정
+
+"""
+
+# app/motion_gate.py
+import threading
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GATE_WIDTH = 64
+GATE_HEIGHT = 48
+
+GATE_MOTION = 'motion'
+GATE_HOLD = 'hold'
+GATE_STATIC = 'static'
+
+
+class MotionGate:
+    def __init__(self, threshold=4.0, hold_sec=2.0, keepalive_sec=10.0, width=GATE_WIDTH, height=GATE_HEIGHT):
+        self.threshold = float(threshold)
+        self.hold_sec = float(hold_sec)
+        self.keepalive_sec = float(keepalive_sec)
+        self.width = width
+        self.height = height
+        self._lock = threading.Lock()
+        self._previous = np.zeros((height, width), dtype=np.int16)
+        self._current = np.zeros((height, width), dtype=np.int16)
+        self._diff = np.zeros((height, width), dtype=np.int16)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._has_previous = False
+            self.last_score = 0.0
+            self.last_motion_time = None
+            self.frames_analyzed = 0
+            self.motion_events = 0
+            self._in_motion = False
+
+    def analyze(self, gray_bytes, now=None):
+        """ GRAY8 썸네일 한 장의 움직임 점수(0~255 평균 절대 차이) 계산 후 상태 갱신 """
+        now = time.monotonic() if now is None else now
+        thumbnail = np.frombuffer(gray_bytes, dtype=np.uint8, count=self.width * self.height)
+        with self._lock:
+            # 미리 할당한 배열만 사용 (프레임마다 임시 배열을 만들지 않음)
+            np.copyto(self._current, thumbnail.reshape(self.height, self.width))
+            if self._has_previous:
+                np.subtract(self._current, self._previous, out=self._diff)
+                np.abs(self._diff, out=self._diff)
+                score = float(self._diff.mean())
+            else:
+                score = 255.0 # 첫 프레임은 움직임으로 취급
+                self._has_previous = True
+            self._previous, self._current = self._current, self._previous
+            self.frames_analyzed += 1
+            self.last_score = score
+            if score >= self.threshold:
+                if not self._in_motion:
+                    self.motion_events += 1
+                    logger.debug(f"Motion detected (score {score:.2f} >= {self.threshold})")
+                self._in_motion = True
+                self.last_motion_time = now
+            else:
+                self._in_motion = False
+            return score
+
+    def state(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._state_locked(now)
+
+    def _state_locked(self, now):
+        if self.last_motion_time is None:
+            return GATE_STATIC
+        if self._in_motion:
+            return GATE_MOTION
+        if now - self.last_motion_time <= self.hold_sec:
+            return GATE_HOLD
+        return GATE_STATIC
+
+    def should_send(self, last_sent_time, now=None):
+        """
+        (전송 여부, 이유) 반환. last_sent_time 은 호출하는 쪽(rendition)이 마지막으로 보낸 시각
+        rendition 마다 keepalive 를 따로 계산할 수 있도록 게이트는 전송 시각을 저장하지 않음
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._state_locked(now)
+        if state != GATE_STATIC:
+            return True, state
+        if last_sent_time is None or now - last_sent_time >= self.keepalive_sec:
+            return True, 'keepalive'
+        return False, state
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {
+                'state': self._state_locked(now),
+                'score': round(self.last_score, 2),
+                'threshold': self.threshold,
+                'hold_sec': self.hold_sec,
+                'keepalive_sec': self.keepalive_sec,
+                'seconds_since_motion': round(now - self.last_motion_time, 1) if self.last_motion_time is not None else None,
+                'frames_analyzed': self.frames_analyzed,
+                'motion_events': self.motion_events,
+            }
@@ -0,0 +1,208 @@
+"""
+
+장치 caps 를 조회해서 RTSP 파이프라인을 구성하는 빌더
+
+- CAMERA_RESOLUTION / CAMERA_FPS 를 소스 caps 로 요청 (카메라가 직접 해당 해상도/fps 로 출력)
+- 카메라가 이미 압축 영상을 내보내면 CPU 인코딩 없이 그대로 전달
+    video/x-h264 -> h264parse ! rtph264pay
+    image/jpeg   -> rtpjpegpay
+    video/x-raw  -> videoconvert ! x264enc (기존 방식)
+- 우선순위는 h264 > mjpeg > raw, RTSP_SOURCE_FORMAT 으로 강제 지정 가능
+- 요청한 해상도/fps 를 지원하는 포맷이 없으면 기존처럼 caps 없이 raw 인코딩
+
+"""
+
+# app/pipeline_builder.py
+import logging
+from fractions import Fraction
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+logger = logging.getLogger(__name__)
+
+SOURCE_FORMATS = ('h264', 'mjpeg', 'raw')
+SOURCE_CAPS_NAMES = {
+    'h264': 'video/x-h264',
+    'mjpeg': 'image/jpeg',
+    'raw': 'video/x-raw',
+}
+# RTP/JPEG(RFC 2435) 헤더는 가로/세로를 8 픽셀 단위 1 바이트로 표현하므로 2040 까지만 전달 가능
+RTP_JPEG_MAX_DIMENSION = 2040
+
+ENCODER_NAME = 'encoder' # 적응형 비트레이트에서 bitrate 속성을 바꿀 x264enc
+RATE_CAPS_NAME = 'abr_rate' # 적응형 fps 사용 시 framerate 를 바꿀 capsfilter
+
+
+def x264_encoder_str(bitrate_kbps=500, key_int_max=None):
+    encoder = f"x264enc name={ENCODER_NAME} tune=zerolatency bitrate={int(bitrate_kbps)} speed-preset=superfast"
+    if key_int_max:
+        encoder += f" key-int-max={int(key_int_max)}" # 키프레임 간격 (warm 모드 GOP 캐시, DVR 세그먼트 길이)
+    return encoder
+
+
+def probe_device_caps(device):
+    """ v4l2src 를 READY 상태로 열어 장치가 지원하는 caps 조회, 실패 시 None """
+    Gst.init(None)
+    source = Gst.ElementFactory.make('v4l2src', None)
+    if source is None:
+        logger.error("v4l2src element is not available.")
+        return None
+    source.set_property('device', device)
+    try:
+        if source.set_state(Gst.State.READY) == Gst.StateChangeReturn.FAILURE:
+            logger.warning(f"Failed to open {device} for caps probing.")
+            return None
+        caps = source.get_static_pad('src').query_caps(None)
+        logger.debug(f"Device caps for {device}: {caps.to_string() if caps else None}")
+        return caps
+    except Exception as e:
+        logger.error(f"Error probing caps of {device}: {e}")
+        return None
+    finally:
+        source.set_state(Gst.State.NULL)
+
+
+def source_caps_str(source_format, width=None, height=None, fps=None):
+    caps = [SOURCE_CAPS_NAMES[source_format]]
+    if width and height:
+        caps.append(f"width={width},height={height}")
+    if fps:
+        fraction = Fraction(fps).limit_denominator(1001)
+        caps.append(f"framerate={fraction.numerator}/{fraction.denominator}")
+    return ','.join(caps)
+
+
+def select_source_format(device_caps, width, height, fps, preferred='auto'):
+    """
+    (source_format, width, height, fps) 반환
+    장치가 요청 해상도/fps 를 지원하는 포맷 중 우선순위가 가장 높은 것, 해상도만 맞으면 fps 는 카메라에 맡김
+    """
+    if preferred in SOURCE_FORMATS:
+        candidates = [preferred]
+    else:
+        candidates = list(SOURCE_FORMATS)
+    if device_caps is None or device_caps.is_any():
+        # 조회 실패 시 기존 동작(raw, caps 없음) 유지, 강제 지정한 포맷이 있으면 그대로 요청
+        return (preferred if preferred in SOURCE_FORMATS else 'raw'), None, None, None
+
+    for exact in (True, False):
+        for source_format in candidates:
+            if source_format == 'mjpeg' and max(width or 0, height or 0) > RTP_JPEG_MAX_DIMENSION:
+                continue
+            requested_fps = fps if exact else None
+            wanted = Gst.Caps.from_string(source_caps_str(source_format, width, height, requested_fps))
+            if device_caps.can_intersect(wanted):
+                return source_format, width, height, requested_fps
+    logger.warning(f"Device does not support {width}x{height}@{fps} in {candidates}. Using camera default raw format.")
+    return 'raw', None, None, None
+
+
+# 압축 스트림 코덱별 RTP payloader
+PAYLOADERS = {
+    'h264': 'rtph264pay name=pay0 pt=96 config-interval=1',
+    'jpeg': 'rtpjpegpay name=pay0 pt=26',
+}
+# warm 모드에서 인코더 출력/세션 appsrc 사이에 주고받는 caps
+WARM_CAPS = {
+    'h264': 'video/x-h264,stream-format=byte-stream,alignment=au',
+    'jpeg': 'image/jpeg',
+}
+WARM_SINK_NAME = 'sink_warm'
+WARM_SOURCE_NAME = 'warmsrc'
+
+
+def build_encoded_chain_str(source_format, device=None, width=None, height=None, fps=None, source=None,
+                            bitrate_kbps=500, rate_caps_fps=None, key_int_max=None):
+    """
+    소스부터 압축 스트림까지의 체인 문자열과 코덱('h264' 또는 'jpeg') 반환
+    source 가 주어지면(CaptureHub 의 intervideosrc) 원본 프레임이므로 항상 raw 인코딩 경로
+    rate_caps_fps 를 주면 인코더 앞에 videorate + 이름 있는 capsfilter 를 넣어 실행 중 fps 변경 가능
+    """
+    encoder_str = x264_encoder_str(bitrate_kbps, key_int_max)
+    if rate_caps_fps:
+        encoder_str = (f"videorate ! capsfilter name={RATE_CAPS_NAME} caps=\"video/x-raw,framerate={int(rate_caps_fps)}/1\" ! "
+                       f"{encoder_str}")
+    if source is not None:
+        return f"{source} ! videoconvert ! {encoder_str} ! h264parse config-interval=-1", 'h264'
+
+    caps = source_caps_str(source_format, width, height, fps)
+    if source_format == 'h264':
+        return f"v4l2src device={device} ! {caps} ! h264parse config-interval=-1", 'h264'
+    if source_format == 'mjpeg':
+        return f"v4l2src device={device} ! {caps}", 'jpeg'
+    return f"v4l2src device={device} ! {caps} ! videoconvert ! {encoder_str} ! h264parse config-interval=-1", 'h264'
+
+
+def build_rtsp_pipeline_str(source_format, device=None, width=None, height=None, fps=None, source=None,
+                            bitrate_kbps=500, rate_caps_fps=None):
+    """ RTSP factory 용 파이프라인 문자열 (바깥 괄호 포함) """
+    chain, codec = build_encoded_chain_str(source_format, device, width, height, fps, source,
+                                           bitrate_kbps, rate_caps_fps)
+    return f"( {chain} ! {PAYLOADERS[codec]} )"
+
+
+def build_warm_pipeline_str(source_format, device=None, width=None, height=None, fps=None, source=None,
+                            bitrate_kbps=500, rate_caps_fps=None, key_int_max=None):
+    """ 항상 켜져 있는 캡처/인코딩 파이프라인, 압축 프레임을 appsink 로 받아 GOP 캐시 및 세션 appsrc 로 전달 """
+    chain, codec = build_encoded_chain_str(source_format, device, width, height, fps, source,
+                                           bitrate_kbps, rate_caps_fps, key_int_max)
+    pipeline_str = (f"{chain} ! {WARM_CAPS[codec]} ! "
+                    f"appsink name={WARM_SINK_NAME} emit-signals=false max-buffers=8 drop=false sync=false")
+    return pipeline_str, codec
+
+
+def build_warm_session_str(codec):
+    """ warm 모드의 세션별 RTSP 파이프라인: 인코딩 없이 appsrc -> payloader """
+    parse = 'h264parse ! ' if codec == 'h264' else ''
+    return (f"( appsrc name={WARM_SOURCE_NAME} is-live=true format=time do-timestamp=true block=false "
+            f"max-bytes=8388608 caps=\"{WARM_CAPS[codec]}\" ! {parse}{PAYLOADERS[codec]} )")
+
+
+DVR_SINK_NAME = 'dvr_sink'
+
+
+def build_dvr_pipeline_str(source, location, segment_sec, max_files, fps=None, bitrate_kbps=1000, max_segment_bytes=0,
+                           start_index=0):
+    """
+    DVR 녹화 파이프라인 (warm 인코더가 없을 때): 캡처 허브의 원본 프레임을 H.264 로 인코딩해 MPEG-TS 세그먼트 링으로 기록
+    키프레임 간격을 세그먼트 길이에 맞춰 각 세그먼트가 키프레임으로 시작하고 거의 일정한 길이가 되도록 함
+    start_index 는 오류 후 재시작 시 이어서 쓸 fragment 번호 (링의 다음 위치부터 기록, 인덱스된 최근 세그먼트는 유지)
+    """
+    key_int_max = int((fps or 15) * segment_sec)
+    return (f"{source} ! queue max-size-buffers=4 leaky=downstream ! videoconvert ! "
+            f"{x264_encoder_str(bitrate_kbps, key_int_max)} ! h264parse config-interval=-1 ! "
+            f"splitmuxsink name={DVR_SINK_NAME} location=\"{location}\" muxer-factory=mpegtsmux "
+            f"max-size-time={int(segment_sec * Gst.SECOND)} max-size-bytes={int(max_segment_bytes)} "
+            f"max-files={int(max_files)} start-index={int(start_index)} send-keyframe-requests=true")
+
+
+DVR_SOURCE_NAME = 'dvrsrc'
+
+
+def build_dvr_tap_pipeline_str(location, segment_sec, max_files, max_segment_bytes=0, start_index=0):
+    """
+    DVR 녹화 파이프라인 (warm 인코더 사용 시): warm 인코더의 H.264 를 재인코딩 없이 MPEG-TS 세그먼트 링으로 기록
+    공유 인코더에 키프레임을 요청할 수 없으므로 세그먼트는 warm 인코더의 키프레임에서만 분할됨
+    """
+    return (f"appsrc name={DVR_SOURCE_NAME} is-live=true format=time do-timestamp=true block=false "
+            f"max-bytes=8388608 caps=\"{WARM_CAPS['h264']}\" ! h264parse config-interval=-1 ! "
+            f"splitmuxsink name={DVR_SINK_NAME} location=\"{location}\" muxer-factory=mpegtsmux "
+            f"max-size-time={int(segment_sec * Gst.SECOND)} max-size-bytes={int(max_segment_bytes)} "
+            f"max-files={int(max_files)} start-index={int(start_index)} send-keyframe-requests=false")
+
+
+HLS_SOURCE_NAME = 'hlssrc'
+HLS_PLAYLIST_NAME = 'playlist.m3u8'
+HLS_SEGMENT_PATTERN = 'segment-{run_id}-%05d.ts' # run_id: 실행마다 새로 (재시작 후 번호가 0 부터 다시 시작해도 이름이 겹치지 않음)
+
+
+def build_hls_pipeline_str(directory, segment_sec, playlist_length, max_files, run_id):
+    """ warm 인코더의 H.264 를 그대로 받아 HLS 세그먼트/플레이리스트로 기록 (재인코딩 없음) """
+    return (f"appsrc name={HLS_SOURCE_NAME} is-live=true format=time do-timestamp=true block=false "
+            f"max-bytes=8388608 caps=\"{WARM_CAPS['h264']}\" ! h264parse ! "
+            f"hlssink2 location=\"{directory}/{HLS_SEGMENT_PATTERN.format(run_id=run_id)}\" "
+            f"playlist-location=\"{directory}/{HLS_PLAYLIST_NAME}\" "
+            f"target-duration={int(segment_sec)} playlist-length={int(playlist_length)} max-files={int(max_files)} "
+            f"send-keyframe-requests=false")
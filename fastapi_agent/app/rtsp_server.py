@@ -17,6 +17,14 @@ import logging
 import socket
 import os
 
+from .pipeline_builder import (probe_device_caps, select_source_format, build_rtsp_pipeline_str,
+                               build_warm_pipeline_str, build_warm_session_str,
+                               ENCODER_NAME, RATE_CAPS_NAME, WARM_SOURCE_NAME)
+from .warm_encoder import WarmEncoder
+from .hls_output import HLSOutput
+from .bitrate_controller import BitrateController, parse_receiver_reports
+from .rtsp_sessions import RTSPSessionTracker
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -32,16 +40,71 @@ def get_ip_address():
         s.close()
     return ip_address
 
+# 전송 방식별 클라이언트가 선택할 수 있는 RTSP 하위 전송 (뒤쪽은 대체 경로, TCP 는 항상 허용)
+RTSP_TRANSPORTS = {
+    'tcp': GstRtsp.RTSPLowerTrans.TCP, # interleaved, 클라이언트마다 복사본
+    'udp': GstRtsp.RTSPLowerTrans.UDP | GstRtsp.RTSPLowerTrans.TCP, # 유니캐스트 UDP
+    'multicast': GstRtsp.RTSPLowerTrans.UDP_MCAST | GstRtsp.RTSPLowerTrans.UDP | GstRtsp.RTSPLowerTrans.TCP, # 모든 클라이언트가 한 그룹을 수신
+}
+
+
+def parse_range(value):
+    """ 'first-last' -> (first, last) 문자열 쌍 (포트 범위, 멀티캐스트 주소 범위) """
+    first, _, last = value.strip().partition('-')
+    return first.strip(), (last or first).strip()
+
+
+def parse_camera_transports(value):
+    """ RTSP_CAMERA_TRANSPORTS (예: 'video0=multicast,video2=udp') -> {장치 이름: 전송 방식} """
+    transports = {}
+    for item in (value or '').split(','):
+        name, _, transport = item.partition('=')
+        name, transport = os.path.basename(name.strip()), transport.strip().lower()
+        if not name:
+            continue
+        if transport not in RTSP_TRANSPORTS:
+            logger.warning(f"Unknown RTSP transport '{transport}' for {name}. Available: {list(RTSP_TRANSPORTS)}")
+            continue
+        transports[name] = transport
+    return transports
+
 # Gstreamer의 CustomRTSPMediaFactory를 상속받아 파이프라인 제어를 동적으로 수행
 class CustomRTSPMediaFactory(GstRtspServer.RTSPMediaFactory):
-    def __init__(self, device, **properties):
+    def __init__(self, device, source=None, source_format='raw', width=None, height=None, fps=None,
+                 bitrate_kbps=500, abr=None, warm=None, transport='tcp', shared=True, **properties):
         super(CustomRTSPMediaFactory, self).__init__(**properties)
         self.device = device
+        # CaptureHub 사용 시 intervideosrc 소스 (장치를 직접 열지 않음), 없으면 v4l2src 로 직접 캡처
+        self.source = source
+        # 장치 caps 조회 결과: h264/mjpeg 이면 인코딩 없이 전달, raw 면 x264enc
+        self.source_format = 'raw' if source else source_format
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.bitrate_kbps = bitrate_kbps
+        # 적응형 비트레이트 컨트롤러, 인코딩 경로(raw)에서만 사용 (패스스루는 비트레이트를 바꿀 인코더가 없음)
+        self.abr = abr if self.source_format == 'raw' else None
+        self._encoder = None
+        self._rate_caps = None
+        # warm 모드: 항상 켜진 인코더(WarmEncoder)를 세션별 appsrc 파이프라인이 받음 (세션마다 미디어를 따로 만듦)
+        self.warm = warm
+        self.transport = transport
+        self.shared = shared
         self.media = None
         self.pipeline = None
 
     def do_create_element(self, url):
-        pipeline_str = f"( v4l2src device={self.device} ! videoconvert ! x264enc tune=zerolatency bitrate=500 speed-preset=superfast ! h264parse ! rtph264pay name=pay0 pt=96 config-interval=1 )"
+        if self.warm is not None:
+            pipeline_str = build_warm_session_str(self.warm.codec)
+            logger.info(f"Creating warm session pipeline: {pipeline_str}")
+            return Gst.parse_launch(pipeline_str)
+
+        # 새 미디어의 인코더는 컨트롤러의 현재 값으로 시작 (클라이언트가 모두 나갔다 다시 접속해도 유지)
+        bitrate_kbps = self.abr.bitrate_kbps if self.abr else self.bitrate_kbps
+        rate_caps_fps = self.abr.fps if self.abr and self.abr.adapt_fps else None
+        pipeline_str = build_rtsp_pipeline_str(self.source_format, self.device, self.width, self.height, self.fps,
+                                               source=self.source, bitrate_kbps=bitrate_kbps,
+                                               rate_caps_fps=rate_caps_fps)
         logger.info(f"Creating pipeline: {pipeline_str}")
         pipeline = Gst.parse_launch(pipeline_str)
         
@@ -72,21 +135,67 @@ class CustomRTSPMediaFactory(GstRtspServer.RTSPMediaFactory):
 
     def do_media_configure(self, rtsp_media):
         logger.info("do_media_configure called.")
-        # 인터리브 모드 활성화 (TCP 기반 전송)
-        rtsp_media.set_protocols(GstRtsp.RTSPLowerTrans.TCP)
+        # tcp 는 인터리브 모드만, udp/multicast 는 UDP 를 우선 허용하고 TCP 로 대체 가능
+        rtsp_media.set_protocols(RTSP_TRANSPORTS[self.transport])
         #rtsp_media.set_protocols(GstRtsp.RTSPLowerTrans.HTTP)
-        logger.info("RTSP media configured to use TCP interleaved mode.")
+        logger.info(f"RTSP media configured for {self.transport} transport.")
         self.media = rtsp_media
         # media에서 파이프라인 요소 가져오기
         self.pipeline = rtsp_media.get_element()
-        self.set_shared(True)
+        # warm 모드는 세션마다 GOP 캐시부터 받아야 하므로 미디어를 공유하지 않음 (멀티캐스트는 그룹 하나를 공유)
+        self.set_shared(self.shared)
         self.set_eos_shutdown(False)
         try:
             self.set_permissions(None)  # 모든 클라이언트 허용
         except AttributeError:
             logger.warning("Permissions setup not available")
+        if self.warm is not None:
+            appsrc = rtsp_media.get_element().get_by_name(WARM_SOURCE_NAME)
+            # appsrc 는 시작(need-data) 이후에만 버퍼를 받으므로 그 시점에 등록, 미디어 해제 시 제거
+            appsrc.connect('need-data', lambda src, length: self.warm.add_sink(src))
+            rtsp_media.connect('unprepared', lambda media: self.warm.remove_sink(appsrc))
+        if self.abr:
+            rtsp_media.connect('prepared', self._on_media_prepared)
+
+    def _on_media_prepared(self, rtsp_media):
+        """ 미디어 준비 후 인코더/capsfilter 를 찾고 stream 별 RTP 세션의 RTCP 수신을 구독 """
+        if self.warm is not None:
+            # 세션 파이프라인에는 인코더가 없음, 공유 warm 인코더를 조절
+            self._encoder = self.warm.get_element(ENCODER_NAME)
+            self._rate_caps = self.warm.get_element(RATE_CAPS_NAME)
+        else:
+            element = rtsp_media.get_element()
+            self._encoder = element.get_by_name(ENCODER_NAME)
+            self._rate_caps = element.get_by_name(RATE_CAPS_NAME)
+        for index in range(rtsp_media.n_streams()):
+            session = rtsp_media.get_stream(index).get_rtpsession()
+            if session is not None:
+                session.connect('on-receiving-rtcp', self._on_receiving_rtcp)
+        logger.info(f"Adaptive bitrate enabled for {self.device} (encoder found: {self._encoder is not None})")
+
+    def _on_receiving_rtcp(self, session, buffer):
+        success, map_info = buffer.map(Gst.MapFlags.READ)
+        if not success:
+            return
+        try:
+            reports = parse_receiver_reports(bytes(map_info.data))
+        finally:
+            buffer.unmap(map_info)
+        for reporter_ssrc, _, fraction_lost, _, jitter in reports:
+            change = self.abr.on_receiver_report(reporter_ssrc, fraction_lost, jitter)
+            if change is not None:
+                self._apply_rate(*change)
+
+    def _apply_rate(self, bitrate_kbps, fps):
+        # x264enc 의 bitrate 는 PLAYING 중 변경 가능, fps 는 videorate 뒤 capsfilter 재협상으로 적용
+        if self._encoder is not None:
+            self._encoder.set_property('bitrate', int(bitrate_kbps))
+        if self._rate_caps is not None and fps:
+            self._rate_caps.set_property('caps', Gst.Caps.from_string(f"video/x-raw,framerate={int(fps)}/1"))
 
     def stop(self):
+        if self.warm is not None:
+            self.warm.stop()
         if self.pipeline:
             # 파이프라인의 상태를 NULL로 변경하여 스트리밍 중지
             self.pipeline.set_state(Gst.State.NULL)
@@ -116,20 +225,151 @@ class RTSPServer(threading.Thread):
         self.server.props.address = '0.0.0.0'
         self.server.props.service = str(port)
 
-        self.mount_point = mount_point
-        self.factory = None
-        self.is_streaming = False
+        self.mount_point = mount_point # 단일 카메라 모드의 기본 mount, 다중 카메라 모드에서는 prefix
+        self.factories = {} # mount_point -> CustomRTSPMediaFactory (카메라 하나당 mount 하나)
+        self.devices = {} # mount_point -> device
+        self._lock = threading.Lock()
         self.loop = GLib.MainLoop()
         self.mounts = self.server.get_mount_points()
+        # 클라이언트 세션별 전송량/RTCP 통계 (GET /rtsp_sessions, 서버 상태 보고)
+        self.sessions = RTSPSessionTracker()
+        self.sessions.attach(self.server)
         self.external_ip = os.getenv('EXTERNAL_IP', get_ip_address())
         self.external_port = int(os.getenv('EXTERNAL_PORT', port))
+        # 소스 caps 로 요청할 해상도/fps, 포맷 선택 (auto: 장치 caps 조회 후 h264 > mjpeg > raw)
+        try:
+            self.width, self.height = map(int, os.getenv('CAMERA_RESOLUTION', '640x480').split('x'))
+            self.fps = int(os.getenv('CAMERA_FPS', 15))
+        except ValueError:
+            logger.error("Invalid CAMERA_RESOLUTION/CAMERA_FPS for RTSP. Using camera defaults.")
+            self.width = self.height = self.fps = None
+        self.source_format = os.getenv('RTSP_SOURCE_FORMAT', 'auto').lower()
+        # x264 인코딩 비트레이트 및 RTCP 기반 적응형 비트레이트 설정
+        self.bitrate_kbps = int(os.getenv('RTSP_BITRATE_KBPS', 500))
+        self.abr_enabled = os.getenv('RTSP_ABR', 'false').lower() == 'true'
+        # warm 모드: mount 가 켜져 있는 동안 캡처/인코딩 유지 + GOP 캐시로 새 클라이언트 즉시 재생
+        self.warm_enabled = os.getenv('RTSP_WARM', 'false').lower() == 'true'
+        self.warm_gop_frames = int(os.getenv('RTSP_WARM_GOP_FRAMES', 2 * (self.fps or 15)))
+        self.abr_config = {
+            'min_kbps': int(os.getenv('RTSP_ABR_MIN_KBPS', 200)),
+            'max_kbps': int(os.getenv('RTSP_ABR_MAX_KBPS', 4000)),
+            'adapt_fps': os.getenv('RTSP_ABR_ADAPT_FPS', 'false').lower() == 'true',
+            'min_fps': int(os.getenv('RTSP_ABR_MIN_FPS', 5)),
+            'loss_high': float(os.getenv('RTSP_ABR_LOSS_HIGH', 0.05)),
+            'loss_low': float(os.getenv('RTSP_ABR_LOSS_LOW', 0.01)),
+            'jitter_high_ms': float(os.getenv('RTSP_ABR_JITTER_HIGH_MS', 40)),
+        }
+        # 전송 방식: 기본값(RTSP_TRANSPORT) 과 장치별 지정(RTSP_CAMERA_TRANSPORTS)
+        self.transport = os.getenv('RTSP_TRANSPORT', 'tcp').lower()
+        if self.transport not in RTSP_TRANSPORTS:
+            logger.warning(f"Unknown RTSP_TRANSPORT '{self.transport}'. Falling back to tcp.")
+            self.transport = 'tcp'
+        self.camera_transports = parse_camera_transports(os.getenv('RTSP_CAMERA_TRANSPORTS', ''))
+        self.address_pool = self._build_address_pool()
+        # 브라우저용 HLS: warm 인코더의 H.264 를 RAM 디렉터리에 세그먼트로 기록 (GET /hls/<stream>/playlist.m3u8)
+        self.hls_enabled = os.getenv('HLS_ENABLED', 'false').lower() == 'true'
+        self.hls_dir = os.getenv('HLS_DIR', '/dev/shm/camera-agent-hls')
+        self.hls_segment_sec = max(int(os.getenv('HLS_SEGMENT_SEC', 1)), 1)
+        self.hls_playlist_length = max(int(os.getenv('HLS_PLAYLIST_LENGTH', 4)), 2)
+        self.hls_external_port = int(os.getenv('HLS_EXTERNAL_PORT', os.getenv('AGENT_PORT', 8000)))
+        self.hls_outputs = {} # mount_point -> HLSOutput
+        # DVR 은 mount 의 warm 인코더 출력을 그대로 기록하므로 DVR 사용 시 warm 인코더를 켬 (CameraManager 가 탭)
+        self.dvr_enabled = os.getenv('DVR_ENABLED', 'false').lower() == 'true'
         
         logger.info(f"RTSP Server initialized on port {port} with mount point {mount_point}")
         logger.info(f"RTSP Server is accessible at rtsp://{self.external_ip}:{self.external_port}{mount_point}")
-        
-    def get_full_stream_uri(self):
+
+    def _build_address_pool(self):
+        """ UDP/멀티캐스트 mount 가 공유하는 주소 풀 (mount 마다 겹치지 않는 멀티캐스트 그룹/포트 할당) """
+        pool = GstRtspServer.RTSPAddressPool()
+        first, last = parse_range(os.getenv('RTSP_MULTICAST_ADDRESS_RANGE', '239.255.42.1-239.255.42.254'))
+        port_min, port_max = map(int, parse_range(os.getenv('RTSP_MULTICAST_PORT_RANGE', '5000-5999')))
+        ttl = int(os.getenv('RTSP_MULTICAST_TTL', 16))
+        if not pool.add_range(first, last, port_min, port_max, ttl):
+            logger.error(f"Invalid RTSP multicast address range {first}-{last}:{port_min}-{port_max}.")
+        udp_port_range = os.getenv('RTSP_UDP_PORT_RANGE')
+        if udp_port_range:
+            # 유니캐스트 UDP 서버 포트를 방화벽에서 열어둔 범위로 제한 (미설정 시 임의 포트)
+            port_min, port_max = map(int, parse_range(udp_port_range))
+            if not pool.add_range(GstRtspServer.RTSP_ADDRESS_POOL_ANY_IPV4, GstRtspServer.RTSP_ADDRESS_POOL_ANY_IPV4,
+                                  port_min, port_max, 0):
+                logger.error(f"Invalid RTSP_UDP_PORT_RANGE {udp_port_range}.")
+        return pool
+
+    def transport_for(self, device):
+        return self.camera_transports.get(os.path.basename(device), self.transport)
+
+    @property
+    def is_streaming(self):
+        """ 하나 이상의 mount 가 스트리밍 중인지 여부 """
+        return bool(self.factories)
+
+    def is_mount_streaming(self, mount_point=None):
+        return (mount_point or self.mount_point) in self.factories
+
+    def mount_for_device(self, device):
+        """ 다중 카메라 모드의 장치별 mount (예: /default_stream/video0) """
+        return f"{self.mount_point.rstrip('/')}/{os.path.basename(device)}"
+
+    def get_mount_details(self, mount_point=None):
+        """ 카메라 stream_details 에 포함되는 mount 별 소스 정보 (스트리밍 중일 때만) """
+        mount_point = mount_point or self.mount_point
+        factory = self.factories.get(mount_point)
+        if factory is None:
+            return {}
+        details = {
+            'rtsp_source_format': factory.source_format,
+            'rtsp_encoding': 'passthrough' if factory.source_format in ('h264', 'mjpeg') else 'x264',
+            'rtsp_transport': factory.transport,
+        }
+        if mount_point in self.hls_outputs:
+            details['hls_playlist_url'] = self.get_hls_playlist_url(mount_point)
+        return details
+
+    def ensure_warm_encoders(self):
+        for factory in list(self.factories.values()):
+            if factory.warm is not None:
+                factory.warm.ensure_running()
+
+    def ensure_hls_outputs(self):
+        for hls in list(self.hls_outputs.values()):
+            hls.ensure_running()
+
+    def get_hls_output(self, name):
+        """ URL 의 스트림 이름으로 HLS 출력 조회 """
+        return next((hls for hls in list(self.hls_outputs.values()) if hls.name == name), None)
+
+    def get_hls_playlist_url(self, mount_point):
+        hls = self.hls_outputs.get(mount_point)
+        if hls is None:
+            return None
+        return f"http://{self.external_ip}:{self.hls_external_port}/hls/{hls.name}/playlist.m3u8"
+
+    def get_hls_state(self):
+        return {mount_point: hls.snapshot() for mount_point, hls in list(self.hls_outputs.items())}
+
+    def get_warm_encoder(self, mount_point=None):
+        """ mount 의 H.264 warm 인코더 (DVR 이 재인코딩 없이 기록), 없거나 다른 코덱이면 None """
+        factory = self.factories.get(mount_point or self.mount_point)
+        if factory is None or factory.warm is None or factory.warm.codec != 'h264':
+            return None
+        return factory.warm
+
+    def get_warm_state(self):
+        """ mount 별 warm 인코더 상태 (세션 수, 캐시된 GOP 크기) """
+        return {mount_point: factory.warm.snapshot() for mount_point, factory in list(self.factories.items()) if factory.warm}
+
+    def get_abr_state(self):
+        """ mount 별 적응형 비트레이트 컨트롤러 상태 (GET /stream_stats) """
+        return {mount_point: factory.abr.snapshot() for mount_point, factory in list(self.factories.items()) if factory.abr}
+
+    def get_session_stats(self, mount_point=None):
+        """ mount 별 접속 중인 클라이언트 수와 세션별 통계, mount_point 를 주면 해당 mount 만 """
+        return self.sessions.snapshot(mount_point)
+
+    def get_full_stream_uri(self, mount_point=None):
         """외부에서 접속 가능한 전체 RTSP URI를 반환"""
-        return f"rtsp://{self.external_ip}:{self.external_port}{self.mount_point}"
+        return f"rtsp://{self.external_ip}:{self.external_port}{mount_point or self.mount_point}"
 
     def run(self):
         self.server.attach(None)
@@ -144,35 +384,86 @@ class RTSPServer(threading.Thread):
             self.loop.quit()
             logger.info("RTSP server stopped.")
 
-    def start_stream(self, device='/dev/video0'):
-        if self.is_streaming:
-            logger.info("Streaming is already in progress.")
-            return
+    def start_stream(self, device='/dev/video0', mount_point=None, source=None, transport=None):
+        mount_point = mount_point or self.mount_point
+        transport = transport if transport in RTSP_TRANSPORTS else self.transport_for(device)
+        with self._lock:
+            if mount_point in self.factories:
+                logger.info(f"Streaming is already in progress on {mount_point}.")
+                return True
 
-        if not os.path.exists(device):
-            logger.error(f"Device {device} not found")
-            return False
-            
-        try:
-            self.factory = CustomRTSPMediaFactory(device)
-            self.factory.set_shared(True)
-            self.mounts.add_factory(self.mount_point, self.factory)
-            self.is_streaming = True
-            logger.info("Streaming started successfully.")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to start streaming: {str(e)}")
-            return False
-
-    def stop_stream(self):
-        if not self.is_streaming:
-            logger.info("Stream is not active.")
+            if not os.path.exists(device):
+                logger.error(f"Device {device} not found")
+                return False
+                
+            try:
+                # 모든 mount 가 같은 RTSPServer / GLib 루프를 공유, 장치별 파이프라인만 따로 생성
+                if source is None:
+                    # 장치 caps 는 스트림 시작 시 한 번만 조회 (factory 는 shared 라 클라이언트 접속마다 다시 열지 않음)
+                    source_format, width, height, fps = select_source_format(
+                        probe_device_caps(device), self.width, self.height, self.fps, self.source_format)
+                else:
+                    source_format, width, height, fps = 'raw', None, None, None
+                logger.info(f"RTSP source for {device}: format={source_format}, size={width}x{height}, fps={fps}")
+                abr = None
+                if self.abr_enabled and source_format == 'raw':
+                    abr = BitrateController(initial_kbps=self.bitrate_kbps, max_fps=fps or self.fps, **self.abr_config)
+                warm = None
+                if self.warm_enabled or self.hls_enabled or self.dvr_enabled:
+                    # HLS/DVR 은 warm 인코더 출력을 재사용하므로 RTSP 세션도 같은 인코딩을 받음 (인코딩 1회)
+                    key_int_max = self.warm_gop_frames
+                    if self.hls_enabled:
+                        key_int_max = min(key_int_max, (fps or self.fps or 15) * self.hls_segment_sec)
+                    warm_pipeline_str, codec = build_warm_pipeline_str(
+                        source_format, device, width, height, fps, source, self.bitrate_kbps,
+                        rate_caps_fps=abr.fps if abr and abr.adapt_fps else None, key_int_max=key_int_max)
+                    warm = WarmEncoder(mount_point, warm_pipeline_str, codec)
+                    warm.start()
+                # 멀티캐스트는 그룹 하나를 모든 클라이언트가 받아야 하므로 warm 인코더를 쓰더라도 미디어 공유
+                shared = warm is None or transport == 'multicast'
+                factory = CustomRTSPMediaFactory(device, source=source, source_format=source_format,
+                                                 width=width, height=height, fps=fps,
+                                                 bitrate_kbps=self.bitrate_kbps, abr=abr, warm=warm,
+                                                 transport=transport, shared=shared)
+                factory.set_shared(shared)
+                if transport != 'tcp':
+                    factory.set_address_pool(self.address_pool)
+                self.mounts.add_factory(mount_point, factory)
+                self.factories[mount_point] = factory
+                self.devices[mount_point] = device
+                if self.hls_enabled:
+                    self._start_hls(mount_point, warm)
+                logger.info(f"Streaming started successfully for {device} on {mount_point} ({transport}).")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to start streaming for {device}: {str(e)}")
+                return False
+
+    def _start_hls(self, mount_point, warm):
+        if warm.codec != 'h264':
+            logger.warning(f"HLS requires H.264. Skipping HLS for {mount_point} ({warm.codec} passthrough).")
             return
+        name = mount_point.strip('/').replace('/', '-') or 'stream'
+        hls = HLSOutput(name, warm, os.path.join(self.hls_dir, name), self.hls_segment_sec, self.hls_playlist_length)
+        hls.start()
+        self.hls_outputs[mount_point] = hls
 
-        if self.factory:
-            self.factory.stop()
-            self.mounts.remove_factory(self.mount_point)
-            self.factory = None
-            logger.info("Streaming stopped.")
+    def stop_stream(self, mount_point=None):
+        """ mount_point 를 생략하면 모든 mount 중지 """
+        with self._lock:
+            targets = [mount_point] if mount_point else list(self.factories)
+            if not any(m in self.factories for m in targets):
+                logger.info("Stream is not active.")
+                return
 
-        self.is_streaming = False
+            for target in targets:
+                factory = self.factories.pop(target, None)
+                if factory is None:
+                    continue
+                hls = self.hls_outputs.pop(target, None)
+                if hls is not None:
+                    hls.stop() # warm 인코더보다 먼저 중지
+                factory.stop()
+                self.mounts.remove_factory(target)
+                device = self.devices.pop(target, None)
+                logger.info(f"Streaming stopped for {device} on {target}.")
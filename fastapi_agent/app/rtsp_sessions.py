@@ -0,0 +1,241 @@
+"""
+
+RTSP 클라이언트 세션 추적 (mount 별 접속 수, 세션별 전송량/RTCP 손실/jitter/RTT)
+
+GstRtspServer 시그널로 세션 수명 추적
+- client-connected : 클라이언트 IP 기록, 이후 new-session / play-request / pause-request / closed 구독
+- play-request     : mount 경로(요청 URI 의 control 접미사를 뗀 등록 mount), 전송 방식(TCP/UDP), RTP 세션 연결 및 시작 시점의 송신 바이트 기록
+- closed           : 해당 클라이언트의 세션 제거
+통계는 API 호출 시점에 rtpbin 세션의 source-stats 에서 읽음 (시그널 콜백에서는 계산하지 않음)
+- bytes_sent : 세션 시작 이후 송신 source 의 octets-sent 증가분 (공유 미디어는 모든 클라이언트가 같은 패킷을 받으므로 추정치)
+- rtcp       : 해당 클라이언트가 보낸 receiver report (UDP 는 RTCP 송신 주소로, TCP 는 미디어의 클라이언트가 하나일 때 매칭)
+  매칭되지 않은 receiver report 는 mount 의 unattributed_receivers 로 보고
+
+"""
+
+# app/rtsp_sessions.py
+import threading
+import time
+import logging
+
+import gi
+gi.require_version('GstRtsp', '1.0')
+from gi.repository import GstRtsp
+
+logger = logging.getLogger(__name__)
+
+RTP_VIDEO_CLOCK_RATE = 90000
+
+
+class RTSPSessionInfo:
+    def __init__(self, client_key, client_ip):
+        self.client_key = client_key
+        self.client_ip = client_ip
+        self.session_id = None
+        self.mount_point = None
+        self.transport = None
+        self.client_rtcp_port = None
+        self.state = 'connected'
+        self.connected_at = time.time()
+        self.play_started_at = None
+        self.rtp_session = None # rtpbin 의 RTPSession (stats 조회용)
+        self.octets_baseline = 0
+
+
+def _source_stats(rtp_session):
+    """ RTPSession 의 source-stats (Gst.Structure 목록) """
+    if rtp_session is None:
+        return []
+    try:
+        stats = rtp_session.get_property('stats')
+        return list(stats.get_value('source-stats') or [])
+    except Exception as e:
+        logger.debug(f"Failed to read RTP session stats: {e}")
+        return []
+
+
+def _field(structure, name, default=None):
+    return structure.get_value(name) if structure.has_field(name) else default
+
+
+def _sender_octets(source_stats):
+    """ 내부(송신) source 의 누적 송신 바이트 """
+    return max((_field(s, 'octets-sent', 0) for s in source_stats if _field(s, 'internal', False)), default=0)
+
+
+def _receiver_reports(source_stats):
+    """ 원격 source(클라이언트) 가 보낸 receiver report 요약 목록 """
+    reports = []
+    for s in source_stats:
+        if _field(s, 'internal', False) or not _field(s, 'have-rb', False):
+            continue
+        reports.append({
+            'ssrc': _field(s, 'ssrc'),
+            'rtcp_from': _field(s, 'rtcp-from'),
+            'fraction_lost': round(_field(s, 'rb-fractionlost', 0) / 256.0, 3),
+            'packets_lost': _field(s, 'rb-packetslost', 0),
+            'jitter_ms': round(_field(s, 'rb-jitter', 0) * 1000.0 / RTP_VIDEO_CLOCK_RATE, 1),
+            'rtt_ms': round(_field(s, 'rb-round-trip', 0) * 1000.0 / 65536, 1), # compact NTP (1/65536 초) 단위
+        })
+    return reports
+
+
+def _mount_path(client, path):
+    """
+    PLAY 요청 경로 -> 등록된 mount 경로
+    요청 URI 에는 aggregate control 의 '/' 나 'stream=0' 같은 control 접미사가 붙으므로
+    서버가 factory 를 찾을 때와 같은 방식(mount points 의 최장 prefix 매칭)으로 되돌림
+    """
+    if not path:
+        return None
+    mounts = client.get_mount_points()
+    if mounts is not None:
+        factory, matched = mounts.match(path)
+        if factory is not None and matched > 0:
+            return path[:matched]
+    base, _, last = path.rstrip('/').rpartition('/')
+    if last.startswith('stream='):
+        return base or '/'
+    return path.rstrip('/') or '/'
+
+
+class RTSPSessionTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {} # client_key -> RTSPSessionInfo
+        self.total_connections = 0
+
+    def attach(self, server):
+        server.connect('client-connected', self._on_client_connected)
+
+    def _on_client_connected(self, server, client):
+        connection = client.get_connection()
+        client_ip = connection.get_ip() if connection else None
+        key = id(client)
+        with self._lock:
+            self._sessions[key] = RTSPSessionInfo(key, client_ip)
+            self.total_connections += 1
+        client.connect('new-session', self._on_new_session, key)
+        client.connect('play-request', self._on_play_request, key)
+        client.connect('pause-request', self._on_pause_request, key)
+        client.connect('closed', self._on_closed, key)
+        logger.info(f"RTSP client connected from {client_ip}")
+
+    def _on_new_session(self, client, session, key):
+        with self._lock:
+            info = self._sessions.get(key)
+            if info:
+                info.session_id = session.get_sessionid()
+
+    def _on_play_request(self, client, context, key):
+        mount_point = _mount_path(client, context.uri.abspath if context.uri else None)
+        rtp_session = None
+        transport = None
+        client_rtcp_port = None
+        sessmedia = context.sessmedia
+        if sessmedia is not None:
+            media = sessmedia.get_media()
+            if media is not None and media.n_streams() > 0:
+                rtp_session = media.get_stream(0).get_rtpsession()
+            stream_transport = sessmedia.get_transport(0)
+            if stream_transport is not None:
+                rtsp_transport = stream_transport.get_transport()
+                if rtsp_transport.lower_transport == GstRtsp.RTSPLowerTrans.TCP:
+                    transport = 'tcp'
+                else:
+                    transport = 'udp-multicast' if rtsp_transport.lower_transport == GstRtsp.RTSPLowerTrans.UDP_MCAST else 'udp'
+                    client_rtcp_port = rtsp_transport.client_port.max
+        with self._lock:
+            info = self._sessions.get(key)
+            if info is None:
+                return
+            info.mount_point = mount_point
+            info.transport = transport
+            info.client_rtcp_port = client_rtcp_port
+            info.state = 'playing'
+            if info.play_started_at is None:
+                info.play_started_at = time.time()
+                info.rtp_session = rtp_session
+                info.octets_baseline = _sender_octets(_source_stats(rtp_session))
+        logger.info(f"RTSP client {info.client_ip} playing {mount_point} over {transport}")
+
+    def _on_pause_request(self, client, context, key):
+        with self._lock:
+            info = self._sessions.get(key)
+            if info:
+                info.state = 'paused'
+
+    def _on_closed(self, client, key):
+        with self._lock:
+            info = self._sessions.pop(key, None)
+        if info:
+            logger.info(f"RTSP client {info.client_ip} disconnected from {info.mount_point} "
+                        f"after {time.time() - info.connected_at:.1f}s")
+
+    def count(self, mount_point=None):
+        with self._lock:
+            return sum(1 for info in self._sessions.values()
+                       if mount_point is None or info.mount_point == mount_point)
+
+    def snapshot(self, mount_point=None):
+        """ mount 별 {'count', 'sessions', 'unattributed_receivers'}, mount_point 를 주면 해당 mount 만 """
+        now = time.time()
+        with self._lock:
+            sessions = [info for info in self._sessions.values()
+                        if mount_point is None or info.mount_point == mount_point]
+
+        # 같은 RTP 세션(공유 미디어)을 쓰는 클라이언트끼리 묶어 stats 는 한 번만 조회
+        by_rtp_session = {}
+        for info in sessions:
+            if info.rtp_session is not None:
+                by_rtp_session.setdefault(id(info.rtp_session), (info.rtp_session, []))[1].append(info)
+
+        session_rows = {}
+        unattributed = {}
+        for rtp_session, infos in by_rtp_session.values():
+            source_stats = _source_stats(rtp_session)
+            octets = _sender_octets(source_stats)
+            reports = _receiver_reports(source_stats)
+            matched = set()
+            rtcp_by_key = {}
+            for info in infos:
+                for index, report in enumerate(reports):
+                    if index in matched:
+                        continue
+                    address = report['rtcp_from'] or ''
+                    if info.client_rtcp_port and address == f"{info.client_ip}:{info.client_rtcp_port}":
+                        rtcp_by_key[info.client_key] = report
+                        matched.add(index)
+                        break
+            remaining = [r for i, r in enumerate(reports) if i not in matched]
+            unmatched_infos = [info for info in infos if info.client_key not in rtcp_by_key]
+            if len(unmatched_infos) == 1 and len(remaining) == 1:
+                # TCP interleaved 는 RTCP 송신 주소가 없음, 미디어의 클라이언트가 하나면 그대로 매칭
+                rtcp_by_key[unmatched_infos[0].client_key] = remaining.pop()
+            for info in infos:
+                session_rows[info.client_key] = (max(octets - info.octets_baseline, 0), rtcp_by_key.get(info.client_key))
+                if remaining:
+                    unattributed.setdefault(info.mount_point, remaining)
+
+        mounts = {}
+        for info in sessions:
+            bytes_sent, rtcp = session_rows.get(info.client_key, (0, None))
+            started = info.play_started_at
+            row = {
+                'session_id': info.session_id,
+                'client_ip': info.client_ip,
+                'transport': info.transport,
+                'state': info.state,
+                'age_sec': round(now - info.connected_at, 1),
+                'playing_sec': round(now - started, 1) if started else None,
+                'bytes_sent': bytes_sent,
+                'bitrate_kbps': round(bytes_sent * 8 / 1000.0 / (now - started), 1) if started and now > started else None,
+                'rtcp': rtcp,
+            }
+            mount = mounts.setdefault(info.mount_point or 'pending', {'count': 0, 'sessions': [], 'unattributed_receivers': []})
+            mount['count'] += 1
+            mount['sessions'].append(row)
+        for mount_name, reports in unattributed.items():
+            if mount_name in mounts:
+                mounts[mount_name]['unattributed_receivers'] = reports
+        return mounts
@@ -0,0 +1,232 @@
+"""
+
+스냅샷/썸네일 JPEG 캐시 (GET /snapshot, GET /thumbnail)
+
+- 실행 중인 파이프라인의 최신 프레임(캡처 허브의 sink_local 또는 Kafka rendition 의 마지막 샘플)을 참조로 받아 인코딩
+- 인코딩은 요청이 있을 때만, (장치, 너비) 별로 SNAPSHOT_INTERVAL_SEC 에 최대 한 번 수행하고 메모리에 캐시
+  썸네일 너비는 THUMBNAIL_WIDTHS 중 요청 이상인 가장 작은 값으로 맞춤 (임의의 w 로 캐시/락이 늘어나지 않도록)
+  (장치, 너비) 별 락은 참조 수를 세어, 기다리거나 잡고 있는 요청이 없고 캐시 항목도 없을 때만 제거
+  (잡혀 있는 락을 지우면 다음 요청이 새 락으로 같은 키를 동시에 인코딩/캡처하게 됨)
+  같은 시점에 들어온 요청은 락에서 기다렸다가 캐시된 결과를 받음 (대시보드가 많아도 인코딩은 한 번)
+- 스트리밍 중이 아니면 v4l2src 로 몇 프레임만 짧게 캡처 (같은 간격 안의 스냅샷/썸네일 요청은 캡처 결과를 공유)
+  허브 없이 RTSP/Kafka 가 장치를 직접 열고 있으면 짧은 캡처가 실패할 수 있음 (CAPTURE_HUB=true 권장)
+
+"""
+
+# app/snapshot_cache.py
+import os
+import threading
+from contextlib import contextmanager
+import time
+import logging
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+logger = logging.getLogger(__name__)
+
+# 프레임 caps 별 디코더 (raw 는 변환만)
+DECODERS = {
+    'video/x-raw': '',
+    'image/jpeg': 'jpegdec ! ',
+    'image/png': 'pngdec ! ',
+}
+THUMBNAIL_WIDTHS = (80, 160, 320, 480, 640, 960, 1280, 1920)
+MAX_CACHE_ENTRIES = 64
+
+
+class Snapshot:
+    __slots__ = ('jpeg', 'width', 'height', 'source', 'encoded_at', 'timestamp')
+
+    def __init__(self, jpeg, width, height, source):
+        self.jpeg = jpeg
+        self.width = width
+        self.height = height
+        self.source = source # hub / kafka / capture
+        self.encoded_at = time.monotonic() # 캐시 만료 판단용
+        self.timestamp = time.time() # 응답 헤더용 (epoch 초)
+
+
+def _sample_size(sample):
+    structure = sample.get_caps().get_structure(0)
+    return structure.get_value('width'), structure.get_value('height')
+
+
+def _run_once(pipeline, sink, timeout_sec, push=None):
+    """ 파이프라인을 실행해 appsink 의 마지막 샘플 반환 (push 가 있으면 appsrc 에 버퍼 하나를 넣고 EOS) """
+    last = None
+    try:
+        if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            return None
+        if push is not None:
+            push()
+        deadline = time.monotonic() + timeout_sec
+        while time.monotonic() < deadline:
+            sample = sink.try_pull_sample(100 * Gst.MSECOND)
+            if sample is not None:
+                last = sample
+            elif sink.is_eos():
+                break
+        msg = pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+        if msg is not None:
+            err, debug = msg.parse_error()
+            logger.warning(f"Snapshot pipeline error: {err}, Debug: {debug}")
+        return last
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+
+class SnapshotCache:
+    def __init__(self, frame_source):
+        self.frame_source = frame_source # device_path -> (Gst.Sample, source 이름) 또는 None
+        self.interval_sec = max(float(os.getenv('SNAPSHOT_INTERVAL_SEC', 1.0)), 0.0)
+        self.quality = min(max(int(os.getenv('SNAPSHOT_JPEG_QUALITY', 85)), 1), 100)
+        self.capture_frames = max(int(os.getenv('SNAPSHOT_CAPTURE_FRAMES', 5)), 1) # 노출이 안정되도록 몇 프레임 버림
+        self.capture_timeout_sec = float(os.getenv('SNAPSHOT_CAPTURE_TIMEOUT_SEC', 3.0))
+        self._lock = threading.Lock()
+        self._key_locks = {} # (device, width) -> [Lock, 기다리거나 잡고 있는 요청 수]
+        self._cache = {} # (device, width) -> Snapshot
+        self._captured = {} # device -> (Gst.Sample, monotonic 시각), 짧은 캡처 결과
+        self.encodes = 0
+        self.captures = 0
+        self.hits = 0
+
+    @contextmanager
+    def _key_lock(self, key):
+        """ 키별 락, 마지막 사용자가 놓을 때 캐시 항목이 없으면 제거 """
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1 # 기다리기 전에 증가 (대기 중인 락이 제거되지 않도록)
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0 and key not in self._cache:
+                    self._key_locks.pop(key, None)
+
+    @staticmethod
+    def _bucket_width(width):
+        """ 요청 너비 이상인 가장 작은 THUMBNAIL_WIDTHS 값 (가장 큰 값보다 크면 가장 큰 값) """
+        width = int(width)
+        return next((allowed for allowed in THUMBNAIL_WIDTHS if allowed >= width), THUMBNAIL_WIDTHS[-1])
+
+    def get(self, device_path, width=None):
+        """ 캐시된 JPEG 또는 새로 인코딩한 Snapshot, 프레임을 얻지 못하면 None """
+        if width is not None:
+            width = self._bucket_width(width)
+        key = (device_path, width)
+        with self._key_lock(key):
+            now = time.monotonic()
+            cached = self._cache.get(key)
+            if cached is not None and now - cached.encoded_at < self.interval_sec:
+                self.hits += 1
+                return cached
+
+            frame = self.frame_source(device_path)
+            if frame is None:
+                frame = (self._capture(device_path), 'capture')
+            sample, source = frame
+            if sample is None:
+                return None
+            snapshot = self._encode(sample, width, source)
+            if snapshot is None:
+                return None
+            with self._lock:
+                if len(self._cache) >= MAX_CACHE_ENTRIES and key not in self._cache:
+                    oldest = min(self._cache, key=lambda k: self._cache[k].encoded_at)
+                    del self._cache[oldest]
+                    entry = self._key_locks.get(oldest)
+                    if entry is not None and entry[1] == 0: # 사용 중인 락은 마지막 사용자가 놓을 때 제거
+                        del self._key_locks[oldest]
+                self._cache[key] = snapshot
+            return snapshot
+
+    def _capture(self, device_path):
+        """ 스트리밍 중이 아닐 때 짧게 캡처한 원본 프레임, 간격 안에서는 재사용 """
+        with self._key_lock((device_path, 'capture')):
+            captured = self._captured.get(device_path)
+            if captured is not None and time.monotonic() - captured[1] < self.interval_sec:
+                return captured[0]
+            if not device_path or not os.path.exists(device_path):
+                return None
+            pipeline_str = (f"v4l2src device={device_path} num-buffers={self.capture_frames} ! videoconvert ! "
+                            f"video/x-raw,format=I420 ! appsink name=sink sync=false max-buffers=1 drop=true")
+            try:
+                pipeline = Gst.parse_launch(pipeline_str)
+            except Exception as e:
+                logger.error(f"Failed to create snapshot capture pipeline for {device_path}: {e}")
+                return None
+            sample = _run_once(pipeline, pipeline.get_by_name('sink'), self.capture_timeout_sec)
+            self.captures += 1
+            if sample is None:
+                logger.warning(f"Snapshot capture from {device_path} returned no frame (device busy?).")
+                return None
+            self._captured[device_path] = (sample, time.monotonic())
+            return sample
+
+    def _encode(self, sample, width, source):
+        caps = sample.get_caps()
+        caps_name = caps.get_structure(0).get_name()
+        if caps_name not in DECODERS:
+            logger.warning(f"Cannot build snapshot from {caps_name} frames.")
+            return None
+        src_width, src_height = _sample_size(sample)
+        if width is None or width >= src_width:
+            out_width, out_height = src_width, src_height
+        else:
+            out_width = width
+            out_height = max(int(round(src_height * width / src_width / 2)) * 2, 2) # 비율 유지
+        if caps_name == 'image/jpeg' and (out_width, out_height) == (src_width, src_height):
+            jpeg = self._buffer_bytes(sample.get_buffer()) # 이미 원본 크기 JPEG 이면 그대로 사용
+        else:
+            pipeline_str = (f"appsrc name=src format=time ! {DECODERS[caps_name]}videoconvert ! videoscale ! "
+                            f"video/x-raw,width={out_width},height={out_height} ! jpegenc quality={self.quality} ! "
+                            f"appsink name=sink sync=false")
+            try:
+                pipeline = Gst.parse_launch(pipeline_str)
+            except Exception as e:
+                logger.error(f"Failed to create snapshot encode pipeline: {e}")
+                return None
+            appsrc = pipeline.get_by_name('src')
+            appsrc.set_property('caps', caps)
+
+            def push():
+                appsrc.emit('push-buffer', sample.get_buffer())
+                appsrc.emit('end-of-stream')
+
+            encoded = _run_once(pipeline, pipeline.get_by_name('sink'), self.capture_timeout_sec, push)
+            if encoded is None:
+                return None
+            jpeg = self._buffer_bytes(encoded.get_buffer())
+        if jpeg is None:
+            return None
+        self.encodes += 1
+        return Snapshot(jpeg, out_width, out_height, source)
+
+    @staticmethod
+    def _buffer_bytes(buf):
+        success, map_info = buf.map(Gst.MapFlags.READ)
+        if not success:
+            return None
+        try:
+            return bytes(map_info.data)
+        finally:
+            buf.unmap(map_info)
+
+    def snapshot(self):
+        with self._lock:
+            entries = len(self._cache)
+            locks = len(self._key_locks)
+        return {
+            'interval_sec': self.interval_sec,
+            'cached_entries': entries,
+            'key_locks': locks,
+            'encodes': self.encodes,
+            'captures': self.captures,
+            'hits': self.hits,
+        }
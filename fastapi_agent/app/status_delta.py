@@ -0,0 +1,58 @@
+"""
+
+heartbeat 상태 변경분 계산 (POST /agent_heartbeat)
+
+- 서버가 확인(2xx)한 카메라 객체를 기준으로 두고, 다음 heartbeat 에는 달라진 필드만 보냄
+- 기준은 실제로 보낸 내용의 깊은 복사본 (self.cameras 의 dict 는 스트림 시작/중지 시 제자리에서 바뀌므로 참조를 두면 변경이 사라짐)
+- 카메라가 추가/제거되었거나 서버가 409 를 응답하면 전체 전송
+- 매 주기 바뀌는 관측값(VOLATILE_FIELDS: 모션 게이트 점수, RTSP 세션 전송량/경과 시간)은 비교에서 제외
+  (포함하면 변경분이 비지 않아 매 heartbeat 마다 revision 증가와 DB 쓰기가 일어남), 다른 필드가 바뀐 카메라에만 함께 실어 보냄
+- GStreamer 의존성 없는 순수 로직
+
+"""
+
+# app/status_delta.py
+import copy
+
+VOLATILE_FIELDS = ('motion_gate', 'rtsp_sessions')
+
+
+class StatusDelta:
+    def __init__(self):
+        self.revision = 0 # 서버가 확인한 마지막 상태 revision
+        self._acked = None # camera_id -> 서버가 확인한 카메라 객체 복사본, None 이면 다음 heartbeat 는 전체 전송
+
+    def reset(self):
+        """ 다음 heartbeat 를 전체 전송으로 (서버 409) """
+        self._acked = None
+
+    def prepare(self, cameras):
+        """
+        현재 카메라 목록 -> (보낸 내용 복사본, 변경분 목록, 전체 전송 여부, 보낼 status_revision)
+        복사본은 응답을 받은 뒤 ack() 에 그대로 넘김
+        """
+        sent = copy.deepcopy(list(cameras))
+        acked = self._acked
+        full = acked is None or set(acked) != {camera['camera_id'] for camera in sent} # 카메라 추가/제거 시 전체
+        if full:
+            deltas = sent
+        else:
+            deltas = [delta for delta in (self._camera_delta(acked[camera['camera_id']], camera) for camera in sent) if delta]
+        revision = self.revision + 1 if full or deltas else self.revision
+        return sent, deltas, full, revision
+
+    def ack(self, sent, revision):
+        """ 서버가 확인한 내용을 다음 변경분의 기준으로 """
+        self.revision = revision
+        self._acked = {camera['camera_id']: camera for camera in sent}
+
+    @staticmethod
+    def _camera_delta(acked, camera):
+        """ 서버가 확인한 카메라 객체와 달라진 필드만 (last_update 는 서버가 기록하므로 제외, 관측값은 변경으로 보지 않음) """
+        changed = {key: value for key, value in camera.items()
+                   if key != 'last_update' and key not in VOLATILE_FIELDS and acked.get(key) != value}
+        if not changed:
+            return None
+        changed.update((key, camera[key]) for key in VOLATILE_FIELDS if key in camera)
+        changed['camera_id'] = camera['camera_id']
+        return changed
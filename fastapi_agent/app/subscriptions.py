@@ -0,0 +1,271 @@
+"""
+
+소비자별 프레임 샘플링 구독 (POST/GET/DELETE /subscriptions)
+
+소비자가 "N 초마다 한 장" 과 전달 대상(Kafka 토픽 또는 HTTP 콜백 URL)을 등록하면
+KafkaStreamer 의 기존 캡처/인코딩 결과에서 해당 시점의 프레임만 복사해 전달 (추가 캡처/인코딩 파이프라인 없음)
+- rendition 의 pull 스레드는 due 여부만 확인하고, 실제 전달은 worker 스레드가 담당
+- 이전 전달이 끝나지 않은 구독은 그 주기를 건너뜀 (느린 콜백이 큐를 채우지 않음)
+- 연속 실패가 max_failures 를 넘으면 구독 자동 해제
+
+"""
+
+# app/subscriptions.py
+import threading
+import queue
+import time
+import uuid
+import logging
+from datetime import datetime
+
+import requests
+
+from .frame_envelope import FrameEnvelope, ENVELOPE_HEADER_KEY, FIXED_HEADER_SIZE, FLAG_KEYFRAME, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+TARGET_TYPES = ('kafka', 'http')
+
+# codec -> HTTP Content-Type
+CONTENT_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'raw': 'application/octet-stream',
+}
+
+
+class SampledFrame:
+    __slots__ = ('data', 'camera_id', 'pts', 'capture_time_ns', 'width', 'height', 'pixel_format', 'codec')
+
+    def __init__(self, data, camera_id, pts, capture_time_ns, width, height, pixel_format, codec):
+        self.data = data
+        self.camera_id = camera_id
+        self.pts = pts
+        self.capture_time_ns = capture_time_ns
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.codec = codec
+
+
+class FrameSubscription:
+    def __init__(self, interval_sec, target_type, target, rendition, max_failures=10):
+        self.subscription_id = uuid.uuid4().hex[:12]
+        self.interval_sec = interval_sec
+        self.target_type = target_type
+        self.target = target
+        self.rendition = rendition
+        self.max_failures = max_failures
+        self.created_at = datetime.utcnow().isoformat()
+        self.next_due = 0.0 # 등록 직후 첫 프레임은 바로 전달
+        self.in_flight = False
+        self.sequence = 0
+        self.frames_delivered = 0
+        self.frames_skipped = 0 # 이전 전달이 끝나지 않아 건너뛴 주기
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_delivery_time = None
+
+    def to_dict(self):
+        return {
+            'subscription_id': self.subscription_id,
+            'interval_sec': self.interval_sec,
+            'target_type': self.target_type,
+            'target': self.target,
+            'rendition': self.rendition,
+            'created_at': self.created_at,
+            'frames_delivered': self.frames_delivered,
+            'frames_skipped': self.frames_skipped,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'last_delivery_time': self.last_delivery_time,
+        }
+
+
+class SubscriptionManager:
+    def __init__(self, producer_getter, max_message_bytes=1000000, max_subscriptions=64,
+                 min_interval_sec=0.1, workers=2, http_timeout=5.0):
+        self._producer_getter = producer_getter # Kafka 대상 전달 시 KafkaStreamer 의 현재 producer 사용
+        self.max_message_bytes = max_message_bytes
+        self.max_subscriptions = max_subscriptions
+        self.min_interval_sec = min_interval_sec
+        self.worker_count = max(int(workers), 1)
+        self.http_timeout = http_timeout
+        self._lock = threading.Lock()
+        self._subscriptions = {} # subscription_id -> FrameSubscription
+        self._next_due = {} # rendition -> 가장 이른 next_due (pull 스레드의 빠른 확인용)
+        self._queue = queue.Queue(maxsize=max(self.worker_count * 8, 16))
+        self._workers = []
+        self._stop_event = threading.Event()
+        self.frames_dropped = 0 # 전달 큐가 가득 차서 버린 프레임
+
+    def add(self, interval_sec, target_type, target, rendition, max_failures=10):
+        if target_type not in TARGET_TYPES:
+            raise ValueError(f"target_type must be one of {TARGET_TYPES}")
+        if interval_sec < self.min_interval_sec:
+            raise ValueError(f"interval_sec must be >= {self.min_interval_sec}")
+        if target_type == 'http' and not target.startswith(('http://', 'https://')):
+            raise ValueError("HTTP target must be an http(s) URL")
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscriptions:
+                raise ValueError(f"Maximum number of subscriptions ({self.max_subscriptions}) reached")
+            subscription = FrameSubscription(interval_sec, target_type, target, rendition, max_failures)
+            self._subscriptions[subscription.subscription_id] = subscription
+            self._refresh_next_due()
+        logger.info(f"Subscription {subscription.subscription_id} added: every {interval_sec}s "
+                    f"of rendition '{rendition}' to {target_type} {target}")
+        return subscription
+
+    def remove(self, subscription_id):
+        with self._lock:
+            subscription = self._subscriptions.pop(subscription_id, None)
+            self._refresh_next_due()
+        if subscription:
+            logger.info(f"Subscription {subscription_id} removed.")
+        return subscription is not None
+
+    def get(self, subscription_id):
+        with self._lock:
+            return self._subscriptions.get(subscription_id)
+
+    def list(self):
+        with self._lock:
+            return [s.to_dict() for s in self._subscriptions.values()]
+
+    def _refresh_next_due(self):
+        next_due = {}
+        for subscription in self._subscriptions.values():
+            current = next_due.get(subscription.rendition)
+            if current is None or subscription.next_due < current:
+                next_due[subscription.rendition] = subscription.next_due
+        self._next_due = next_due
+
+    def has_due(self, rendition, now):
+        """ 락 없이 확인하는 빠른 경로, 구독이 없거나 아직 때가 아니면 False """
+        next_due = self._next_due.get(rendition)
+        return next_due is not None and now >= next_due
+
+    def collect_due(self, rendition, now):
+        """ 이번 프레임을 받을 구독 목록, 다음 due 시각을 interval 만큼 미룸 """
+        due = []
+        with self._lock:
+            for subscription in self._subscriptions.values():
+                if subscription.rendition != rendition or now < subscription.next_due:
+                    continue
+                # 밀린 주기를 몰아서 보내지 않도록 현재 시각 기준으로 다음 due 설정
+                subscription.next_due = max(subscription.next_due + subscription.interval_sec, now)
+                if subscription.in_flight:
+                    subscription.frames_skipped += 1
+                    continue
+                subscription.in_flight = True
+                due.append(subscription)
+            self._refresh_next_due()
+        return due
+
+    def submit(self, subscriptions, frame):
+        try:
+            self._queue.put_nowait((subscriptions, frame))
+        except queue.Full:
+            self.frames_dropped += 1
+            self.release(subscriptions)
+
+    def release(self, subscriptions):
+        """ collect_due 로 받은 구독을 전달하지 못했을 때 다음 주기에 다시 받을 수 있도록 해제 """
+        for subscription in subscriptions:
+            subscription.in_flight = False
+
+    def start(self):
+        if self._workers:
+            return
+        self._stop_event.clear()
+        for index in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f"subscription-worker-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        self._stop_event.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=self.http_timeout + 1.0)
+        self._workers = []
+        while True: # 남은 전달 작업 정리
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item:
+                self.release(item[0])
+
+    def _worker_loop(self):
+        session = requests.Session() # worker 마다 연결 재사용
+        while True:
+            item = self._queue.get()
+            if item is None or self._stop_event.is_set():
+                break
+            subscriptions, frame = item
+            for subscription in subscriptions:
+                try:
+                    self._deliver(session, subscription, frame)
+                    subscription.frames_delivered += 1
+                    subscription.consecutive_failures = 0
+                    subscription.last_delivery_time = time.time()
+                except Exception as e:
+                    subscription.consecutive_failures += 1
+                    subscription.last_error = str(e)
+                    logger.warning(f"Subscription {subscription.subscription_id} delivery failed: {e}")
+                    if subscription.consecutive_failures >= subscription.max_failures:
+                        logger.warning(f"Subscription {subscription.subscription_id} removed after "
+                                       f"{subscription.consecutive_failures} consecutive failures.")
+                        self.remove(subscription.subscription_id)
+                finally:
+                    subscription.in_flight = False
+        session.close()
+
+    def _deliver(self, session, subscription, frame):
+        sequence = subscription.sequence
+        subscription.sequence += 1
+        if subscription.target_type == 'http':
+            response = session.post(subscription.target, data=frame.data, timeout=self.http_timeout, headers={
+                'Content-Type': CONTENT_TYPES.get(frame.codec, 'application/octet-stream'),
+                'X-Subscription-Id': subscription.subscription_id,
+                'X-Camera-Id': frame.camera_id,
+                'X-Frame-Sequence': str(sequence),
+                'X-Capture-Time-Ns': str(frame.capture_time_ns),
+                'X-Frame-Width': str(frame.width),
+                'X-Frame-Height': str(frame.height),
+                'X-Frame-Pixel-Format': frame.pixel_format,
+                'X-Frame-Codec': frame.codec,
+            })
+            response.raise_for_status()
+            return
+
+        producer = self._producer_getter()
+        if producer is None:
+            raise RuntimeError("Kafka producer unavailable")
+        # 메인 토픽과 같은 봉투 형식, sequence 는 구독별로 연속
+        envelope = FrameEnvelope(frame.camera_id, sequence, frame.pts, frame.capture_time_ns,
+                                 frame.width, frame.height, frame.pixel_format, frame.codec,
+                                 len(frame.data), flags=FLAG_KEYFRAME)
+        key = frame.camera_id.encode('utf-8')
+        max_chunk = self.max_message_bytes - FIXED_HEADER_SIZE - len(key) - 512
+        data = memoryview(frame.data)
+        futures = []
+        for chunk_index, chunk_count, offset, length in iter_chunks(len(frame.data), max_chunk):
+            envelope.chunk_index = chunk_index
+            envelope.chunk_count = chunk_count
+            envelope.chunk_offset = offset
+            futures.append(producer.send(subscription.target, data[offset:offset + length], key=key,
+                                         headers=[(ENVELOPE_HEADER_KEY, envelope.pack())]))
+        for future in futures: # 전달 결과를 구독 통계에 반영하기 위해 ack 대기 (worker 스레드라 캡처에 영향 없음)
+            future.get(timeout=self.http_timeout)
+
+    def snapshot(self):
+        with self._lock:
+            count = len(self._subscriptions)
+        return {
+            'subscriptions': count,
+            'queue_depth': self._queue.qsize(),
+            'frames_dropped': self.frames_dropped,
+        }
@@ -0,0 +1,216 @@
+"""
+
+RTSP warm 모드: mount 가 켜져 있는 동안 캡처/인코딩을 계속 실행하고 최근 GOP 를 캐시
+
+- 인코딩 파이프라인은 mount 당 하나 (클라이언트 수와 상관없이 인코딩 1회)
+- 압축 프레임을 appsink 로 받아 마지막 키프레임부터의 버퍼(GOP)를 보관
+- 새 RTSP 세션은 인코딩 없는 appsrc 파이프라인으로 시작하고, 연결 즉시 캐시된 GOP(SPS/PPS + IDR 포함)를 먼저 받은 뒤 라이브 프레임을 받음
+  -> 다음 IDR 을 기다리지 않으므로 첫 프레임까지의 시간이 짧음
+- 캐시된 GOP 는 접속 시점에 한꺼번에 전달되므로 처음 잠깐은 따라잡기 재생이 됨
+
+"""
+
+# app/warm_encoder.py
+import threading
+import logging
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst, GLib
+
+from .pipeline_builder import WARM_SINK_NAME
+
+logger = logging.getLogger(__name__)
+
+
+class WarmEncoder:
+    def __init__(self, name, pipeline_str, codec, max_gop_buffers=300, pull_timeout_ms=500):
+        self.name = name
+        self.pipeline_str = pipeline_str
+        self.codec = codec
+        self.max_gop_buffers = max_gop_buffers # key-int-max 가 적용되지 않는 패스스루 소스의 상한
+        self.pull_timeout_ns = pull_timeout_ms * Gst.MSECOND
+        self.pipeline = None
+        self.caps = None
+        self.running = False
+        self.loop = None
+        self._thread = None
+        self._pull_thread = None
+        self._stop_event = threading.Event()
+        self._stopped = False # stop() 으로 끝낸 경우 (오류 종료와 구분)
+        self._lock = threading.Lock()
+        self._gop = [] # 마지막 키프레임부터의 버퍼
+        self._gop_bytes = 0
+        self._sinks = set() # 세션별 appsrc
+        self.frames = 0
+        self.keyframes = 0
+        self.joins = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run_loop, name=f"warm-encoder-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"WarmEncoder started for {self.name}")
+
+    def _run_loop(self):
+        Gst.init(None)
+        context = GLib.MainContext.new()
+        context.push_thread_default()
+        self.loop = GLib.MainLoop.new(context, False)
+        try:
+            logger.info(f"WarmEncoder pipeline for {self.name}: {self.pipeline_str}")
+            try:
+                self.pipeline = Gst.parse_launch(self.pipeline_str)
+            except Exception as e:
+                logger.error(f"Failed to create WarmEncoder pipeline for {self.name}: {e}")
+                return
+            appsink = self.pipeline.get_by_name(WARM_SINK_NAME)
+            bus = self.pipeline.get_bus()
+            bus.add_signal_watch()
+            bus.connect("message", self.on_message)
+
+            self.pipeline.set_state(Gst.State.PLAYING)
+            state = self.pipeline.get_state(timeout=5 * Gst.SECOND)[1]
+            if state != Gst.State.PLAYING:
+                logger.error(f"Failed to set WarmEncoder pipeline to PLAYING for {self.name}. Current state: {state}")
+                return
+            self.running = True
+            self._pull_thread = threading.Thread(target=self._pull_loop, args=(appsink,), daemon=True)
+            self._pull_thread.start()
+            if not self._stop_event.is_set():
+                self.loop.run()
+        except Exception as e:
+            logger.error(f"Error running WarmEncoder loop for {self.name}: {e}")
+        finally:
+            self._stop_event.set()
+            self.running = False
+            if self.pipeline:
+                self.pipeline.set_state(Gst.State.NULL) # appsink flushing -> pull 스레드 대기 해제
+                self.pipeline.get_bus().remove_signal_watch()
+            if self._pull_thread is not None:
+                self._pull_thread.join(timeout=5.0)
+                self._pull_thread = None
+            self.pipeline = None
+            with self._lock:
+                self._gop = []
+                self._gop_bytes = 0
+            context.pop_thread_default()
+            self.loop = None
+            logger.info(f"WarmEncoder loop for {self.name} finished.")
+
+    def _pull_loop(self, appsink):
+        while not self._stop_event.is_set():
+            sample = appsink.try_pull_sample(self.pull_timeout_ns)
+            if sample is None:
+                if appsink.is_eos():
+                    break
+                continue
+            self._on_sample(sample)
+
+    def _on_sample(self, sample):
+        buf = sample.get_buffer()
+        keyframe = not buf.has_flags(Gst.BufferFlags.DELTA_UNIT)
+        with self._lock:
+            self.caps = sample.get_caps()
+            self.frames += 1
+            if keyframe:
+                self.keyframes += 1
+                self._gop = [buf]
+                self._gop_bytes = buf.get_size()
+            elif self._gop and len(self._gop) < self.max_gop_buffers:
+                self._gop.append(buf)
+                self._gop_bytes += buf.get_size()
+            # 캐시 전달과 라이브 전달의 순서가 섞이지 않도록 같은 락 안에서 push
+            for appsrc in list(self._sinks):
+                if not self._push(appsrc, buf):
+                    self._sinks.discard(appsrc)
+
+    def _push(self, appsrc, buf):
+        # 버퍼 메모리는 공유하고 타임스탬프만 세션 appsrc(do-timestamp)가 새로 찍도록 메타데이터만 복사
+        copy = buf.copy()
+        copy.pts = Gst.CLOCK_TIME_NONE
+        copy.dts = Gst.CLOCK_TIME_NONE
+        return appsrc.emit('push-buffer', copy) == Gst.FlowReturn.OK
+
+    def add_sink(self, appsrc):
+        """ 새 세션의 appsrc 등록, 캐시된 GOP 를 먼저 보낸 뒤 라이브 프레임 전달 """
+        with self._lock:
+            if appsrc in self._sinks:
+                return
+            if self.caps is not None:
+                appsrc.set_property('caps', self.caps)
+            for buf in self._gop:
+                if not self._push(appsrc, buf):
+                    return
+            self._sinks.add(appsrc)
+            self.joins += 1
+            cached = len(self._gop)
+        logger.info(f"RTSP session joined {self.name} warm stream with {cached} cached buffer(s).")
+
+    def remove_sink(self, appsrc):
+        with self._lock:
+            self._sinks.discard(appsrc)
+
+    def get_element(self, name):
+        pipeline = self.pipeline
+        return pipeline.get_by_name(name) if pipeline is not None else None
+
+    def on_message(self, bus, message):
+        t = message.type
+        if t == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            logger.error(f"WarmEncoder GStreamer Error for {self.name}: {err}, Debug: {debug}")
+            self._quit_loop()
+        elif t == Gst.MessageType.EOS:
+            logger.info(f"WarmEncoder End-Of-Stream for {self.name}.")
+            self._quit_loop()
+        return True
+
+    def _quit_loop(self, *args):
+        if self.loop and self.loop.is_running():
+            self.loop.quit()
+        return GLib.SOURCE_REMOVE
+
+    def ensure_running(self):
+        """ 오류로 끝난 warm 파이프라인 재시작 (CameraManager 주기 확인용) """
+        if not self._stopped and not self.is_alive():
+            logger.warning(f"WarmEncoder for {self.name} is down. Restarting.")
+            self.start()
+
+    def stop(self):
+        self._stopped = True
+        self._stop_event.set()
+        loop = self.loop
+        if loop is not None:
+            source = GLib.Idle()
+            source.set_callback(self._quit_loop)
+            source.attach(loop.get_context())
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=10.0)
+            if thread.is_alive():
+                logger.warning(f"WarmEncoder thread for {self.name} did not join in time.")
+        self._thread = None
+        with self._lock:
+            self._sinks.clear()
+        logger.info(f"WarmEncoder stopped for {self.name}.")
+
+    def is_alive(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'codec': self.codec,
+                'sessions': len(self._sinks),
+                'gop_buffers': len(self._gop),
+                'gop_bytes': self._gop_bytes,
+                'frames': self.frames,
+                'keyframes': self.keyframes,
+                'joins': self.joins,
+            }
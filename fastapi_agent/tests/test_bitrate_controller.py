@@ -0,0 +1,88 @@
+import struct
+
+from app.bitrate_controller import BitrateController, parse_receiver_reports, RTCP_SR, RTCP_RR
+
+def report_block(source_ssrc, fraction_lost, cumulative_lost, jitter):
+    lost_word = (int(fraction_lost * 256) << 24) | (cumulative_lost & 0xFFFFFF)
+    return struct.pack('!IIIIII', source_ssrc, lost_word, 0, jitter, 0, 0)
+
+def rtcp_packet(packet_type, reporter_ssrc, blocks, sender_info=b''):
+    body = struct.pack('!I', reporter_ssrc) + sender_info + b''.join(blocks)
+    return struct.pack('!BBH', 0x80 | len(blocks), packet_type, (len(body) + 4) // 4 - 1) + body
+
+def test_parse_receiver_report():
+    packet = rtcp_packet(RTCP_RR, 0x1111, [report_block(0xAAAA, 0.25, 12, 900)])
+    assert parse_receiver_reports(packet) == [(0x1111, 0xAAAA, 0.25, 12, 900)]
+
+def test_parse_sender_report_skips_sender_info():
+    packet = rtcp_packet(RTCP_SR, 0x2222, [report_block(0xBBBB, 0.5, 3, 45)], sender_info=b'\x00' * 20)
+    assert parse_receiver_reports(packet) == [(0x2222, 0xBBBB, 0.5, 3, 45)]
+
+def test_parse_negative_cumulative_loss():
+    packet = rtcp_packet(RTCP_RR, 1, [report_block(2, 0.0, -5, 0)]) # 중복 수신으로 음수
+    assert parse_receiver_reports(packet)[0][3] == -5
+
+def test_parse_compound_packet_and_other_types():
+    sdes = struct.pack('!BBH', 0x81, 202, 1) + b'\x00' * 4
+    packet = rtcp_packet(RTCP_RR, 1, [report_block(9, 0.0, 0, 0)]) + sdes + \
+        rtcp_packet(RTCP_RR, 2, [report_block(9, 0.125, 1, 10), report_block(10, 0.0, 0, 0)])
+    assert [report[:2] for report in parse_receiver_reports(packet)] == [(1, 9), (2, 9), (2, 10)]
+
+def test_parse_truncated_packet_stops():
+    packet = rtcp_packet(RTCP_RR, 1, [report_block(9, 0.5, 0, 0)])
+    assert parse_receiver_reports(packet[:-4]) == []
+    assert parse_receiver_reports(b'\x80') == []
+
+def controller(**overrides):
+    params = dict(initial_kbps=1000, min_kbps=200, max_kbps=2000, decrease_factor=0.5, increase_kbps=100,
+                  increase_interval_sec=2.0, decrease_hold_sec=1.0, receiver_timeout_sec=10.0)
+    params.update(overrides)
+    return BitrateController(**params)
+
+def test_loss_decreases_bitrate_with_hold():
+    abr = controller()
+    assert abr.on_receiver_report(1, 0.2, 0, now=100.0) == (500, None)
+    assert abr.on_receiver_report(1, 0.2, 0, now=100.5) is None # decrease_hold_sec 안의 RR 은 무시
+    assert abr.on_receiver_report(1, 0.2, 0, now=101.0) == (250, None)
+
+def test_high_jitter_decreases_bitrate():
+    abr = controller()
+    jitter_50ms = 50 * 90
+    assert abr.on_receiver_report(1, 0.0, jitter_50ms, now=100.0) == (500, None)
+
+def test_good_reports_increase_after_interval():
+    abr = controller(initial_kbps=500)
+    assert abr.on_receiver_report(1, 0.0, 0, now=100.0) is None
+    assert abr.on_receiver_report(1, 0.0, 0, now=101.0) is None
+    assert abr.on_receiver_report(1, 0.0, 0, now=102.0) == (600, None)
+    assert abr.on_receiver_report(1, 0.0, 0, now=103.0) is None # 직전 변경 후 increase_interval_sec 대기
+    assert abr.on_receiver_report(1, 0.0, 0, now=104.0) == (700, None)
+
+def test_borderline_loss_holds_bitrate():
+    abr = controller()
+    for now in (100.0, 103.0, 106.0):
+        assert abr.on_receiver_report(1, 0.03, 0, now=now) is None
+
+def test_worst_receiver_wins():
+    abr = controller()
+    abr.on_receiver_report(1, 0.0, 0, now=100.0)
+    assert abr.on_receiver_report(2, 0.3, 0, now=100.1) == (500, None)
+
+def test_fps_halves_at_min_bitrate_and_is_restored_first():
+    abr = controller(initial_kbps=200, max_fps=30, min_fps=5, adapt_fps=True)
+    assert abr.on_receiver_report(1, 0.2, 0, now=100.0) == (200, 15)
+    assert abr.on_receiver_report(1, 0.2, 0, now=101.0) == (200, 7)
+    assert abr.on_receiver_report(1, 0.2, 0, now=102.0) == (200, 5)
+    assert abr.on_receiver_report(1, 0.2, 0, now=103.0) is None # 최소 fps
+    abr.on_receiver_report(1, 0.0, 0, now=104.0)
+    assert abr.on_receiver_report(1, 0.0, 0, now=106.0) == (200, 10)
+    assert abr.on_receiver_report(1, 0.0, 0, now=108.0) == (200, 20)
+    assert abr.on_receiver_report(1, 0.0, 0, now=110.0) == (200, 30)
+    assert abr.on_receiver_report(1, 0.0, 0, now=112.0) == (300, 30) # fps 회복 후 비트레이트
+
+def test_silent_receiver_times_out():
+    abr = controller()
+    abr.on_receiver_report(1, 0.3, 0, now=100.0) # 수신자 1 은 손실 보고 후 접속 종료
+    assert abr.on_receiver_report(2, 0.0, 0, now=111.0) is None
+    assert set(abr.snapshot(now=111.0)['receivers']) == {'2'}
+    assert abr.on_receiver_report(2, 0.0, 0, now=113.0) == (600, None)
@@ -0,0 +1,102 @@
+import pytest
+
+from app.dvr_index import SegmentIndex, parse_byte_range
+
+def segment_file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+def recorded_index(tmp_path, parts, retention_sec=60.0, start=100.0, segment_sec=4.0):
+    """ parts 의 바이트를 segment_sec 간격의 닫힌 세그먼트로 기록한 인덱스 """
+    index = SegmentIndex(retention_sec)
+    for i, data in enumerate(parts):
+        path = segment_file(tmp_path, f'segment-{i:05d}.ts', data)
+        index.open_segment(path, start + i * segment_sec)
+        index.close_segment(path, start + (i + 1) * segment_sec)
+    return index
+
+def test_parse_byte_range_without_header():
+    assert parse_byte_range(None, 100) is None
+    assert parse_byte_range('', 100) is None
+
+def test_parse_byte_range_closed_and_clamped():
+    assert parse_byte_range('bytes=10-19', 100) == (10, 19)
+    assert parse_byte_range('bytes=90-500', 100) == (90, 99)
+
+def test_parse_byte_range_open_ended():
+    assert parse_byte_range('bytes=40-', 100) == (40, 99)
+
+def test_parse_byte_range_suffix():
+    assert parse_byte_range('bytes=-10', 100) == (90, 99)
+    assert parse_byte_range('bytes=-500', 100) == (0, 99) # 전체보다 길면 처음부터
+
+@pytest.mark.parametrize('header', ['bytes=100-', 'bytes=150-200', 'bytes=20-10', 'bytes=-0'])
+def test_parse_byte_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, 100)
+
+@pytest.mark.parametrize('header', ['bytes=-', 'bytes=0-10,20-30', 'items=0-10', 'bytes=a-b'])
+def test_parse_byte_range_unsupported(header):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, 100)
+
+def test_open_segment_replaces_reused_name(tmp_path):
+    index = recorded_index(tmp_path, [b'a' * 10, b'b' * 10])
+    path = str(tmp_path / 'segment-00000.ts') # 링이 한 바퀴 돌아 같은 이름을 다시 사용
+    index.open_segment(path, 108.0)
+    segments = index.snapshot(now=109.0)['segments']
+    assert [(s['file'], s['start']) for s in segments] == [('segment-00001.ts', 104.0), ('segment-00000.ts', 108.0)]
+    assert segments[-1]['recording']
+
+def test_open_segment_closes_previous_when_closed_message_missed(tmp_path):
+    index = SegmentIndex(60.0)
+    index.open_segment(segment_file(tmp_path, 'segment-00000.ts', b'a' * 10), 100.0)
+    index.open_segment(segment_file(tmp_path, 'segment-00001.ts', b'b' * 5), 104.0)
+    first, second = index.snapshot(now=105.0)['segments']
+    assert (first['end'], first['bytes'], first['recording']) == (104.0, 10, False)
+    assert second['recording']
+
+def test_retention_prunes_old_and_missing_segments(tmp_path):
+    index = recorded_index(tmp_path, [b'a' * 10, b'b' * 10, b'c' * 10], retention_sec=10.0)
+    assert len(index.clip(0, 200, now=113.0).parts) == 3
+    assert [p for p, _ in index.clip(0, 200, now=115.0).parts] == \
+        [str(tmp_path / 'segment-00001.ts'), str(tmp_path / 'segment-00002.ts')] # 104 에 끝난 첫 세그먼트 만료
+    (tmp_path / 'segment-00002.ts').unlink()
+    assert [p for p, _ in index.clip(0, 200, now=115.0).parts] == [str(tmp_path / 'segment-00001.ts')]
+
+def test_clip_selects_overlapping_segments(tmp_path):
+    index = recorded_index(tmp_path, [b'a' * 10, b'b' * 20, b'c' * 30])
+    plan = index.clip(105.0, 109.0, now=113.0)
+    assert [size for _, size in plan.parts] == [20, 30]
+    assert (plan.start, plan.end, plan.total_bytes) == (104.0, 112.0, 50)
+    assert index.clip(104.0, 104.0, now=113.0).total_bytes == 30 # 경계 시각은 양쪽 세그먼트 모두 포함
+    assert index.clip(200.0, 210.0, now=113.0).parts == []
+
+def test_clip_includes_recording_segment_up_to_now(tmp_path):
+    index = recorded_index(tmp_path, [b'a' * 10])
+    index.open_segment(segment_file(tmp_path, 'segment-00001.ts', b'b' * 7), 104.0)
+    plan = index.clip(106.0, 200.0, now=107.0)
+    assert plan.parts == [(str(tmp_path / 'segment-00001.ts'), 7)]
+    assert plan.end == 107.0
+
+def test_iter_bytes_whole_clip(tmp_path):
+    plan = recorded_index(tmp_path, [b'a' * 10, b'b' * 20, b'c' * 30]).clip(0, 200, now=113.0)
+    assert b''.join(plan.iter_bytes(chunk_size=7)) == b'a' * 10 + b'b' * 20 + b'c' * 30
+
+def test_iter_bytes_within_one_segment(tmp_path):
+    plan = recorded_index(tmp_path, [b'0123456789', b'abcdefghij']).clip(0, 200, now=109.0)
+    assert b''.join(plan.iter_bytes(2, 5)) == b'2345'
+    assert b''.join(plan.iter_bytes(12, 14)) == b'cde'
+
+def test_iter_bytes_across_segment_boundaries(tmp_path):
+    plan = recorded_index(tmp_path, [b'0123456789', b'abcdefghij', b'ABCDEFGHIJ']).clip(0, 200, now=113.0)
+    assert b''.join(plan.iter_bytes(8, 11)) == b'89ab'
+    assert b''.join(plan.iter_bytes(5, 24)) == b'56789abcdefghijABCDE' # 가운데 세그먼트 전체 포함
+    assert b''.join(plan.iter_bytes(10, 19)) == b'abcdefghij' # 정확히 한 세그먼트
+    assert b''.join(plan.iter_bytes(25, 1000)) == b'FGHIJ' # last 는 클립 끝으로 제한
+
+def test_iter_bytes_stops_when_segment_disappears(tmp_path):
+    plan = recorded_index(tmp_path, [b'a' * 10, b'b' * 10]).clip(0, 200, now=109.0)
+    (tmp_path / 'segment-00001.ts').unlink() # 링에서 덮어쓰기/삭제
+    assert b''.join(plan.iter_bytes()) == b'a' * 10
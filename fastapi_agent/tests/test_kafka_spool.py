@@ -0,0 +1,33 @@
+from app.kafka_spool import DiskSpool
+
+def spool_at(tmp_path, capacity):
+    return DiskSpool(str(tmp_path / 'spool.bin'), capacity)
+
+def drain(spool):
+    values = []
+    while True:
+        record = spool.peek()
+        if record is None:
+            return values
+        values.append(bytes(record.value))
+        spool.pop(record.seq)
+
+def test_append_many_keeps_chunks_together(tmp_path):
+    spool = spool_at(tmp_path, 4096)
+    assert spool.append_many([('frames', b'k', None, b'a' * 100), ('frames', b'k', None, b'b' * 100)])
+    assert drain(spool) == [b'a' * 100, b'b' * 100]
+
+def test_append_many_rejects_whole_frame_when_too_large(tmp_path):
+    spool = spool_at(tmp_path, 4096)
+    assert spool.append('frames', None, None, b'old')
+    assert not spool.append_many([('frames', None, None, b'x' * 2000), ('frames', None, None, b'y' * 2000)])
+    assert drain(spool) == [b'old'] # 앞 chunk 가 남지 않고 기존 레코드도 그대로
+    assert spool.records_rejected == 2
+
+def test_append_evicts_oldest_when_full(tmp_path):
+    spool = spool_at(tmp_path, 1024)
+    for i in range(20):
+        assert spool.append('frames', None, None, bytes([i]) * 100)
+    values = drain(spool)
+    assert values[-1] == bytes([19]) * 100
+    assert len(values) < 20
@@ -0,0 +1,82 @@
+from app.status_delta import StatusDelta
+
+def camera(**fields):
+    cam = {'camera_id': 'cam0', 'status': 'active', 'frame_transmission_enabled': False,
+           'stream_details': {'rtsp_uri': 'rtsp://agent/cam0'}, 'last_update': 't0'}
+    cam.update(fields)
+    return cam
+
+def test_first_heartbeat_is_full():
+    delta = StatusDelta()
+    sent, deltas, full, revision = delta.prepare([camera()])
+    assert full
+    assert deltas == sent
+    assert revision == 1
+
+def test_in_place_change_after_ack_is_sent():
+    delta = StatusDelta()
+    cameras = [camera()]
+    sent, _, _, revision = delta.prepare(cameras)
+    delta.ack(sent, revision)
+
+    # _set_camera_state 처럼 같은 dict 를 제자리에서 변경
+    cameras[0]['status'] = 'streaming'
+    cameras[0]['frame_transmission_enabled'] = True
+    cameras[0]['stream_details']['rtsp_uri'] = 'rtsp://agent/cam0-new'
+
+    _, deltas, full, revision = delta.prepare(cameras)
+    assert not full
+    assert revision == 2
+    assert deltas == [{'camera_id': 'cam0', 'status': 'streaming', 'frame_transmission_enabled': True,
+                       'stream_details': {'rtsp_uri': 'rtsp://agent/cam0-new'}}]
+
+def test_no_change_sends_empty_delta_with_same_revision():
+    delta = StatusDelta()
+    cameras = [camera()]
+    sent, _, _, revision = delta.prepare(cameras)
+    delta.ack(sent, revision)
+
+    cameras[0]['last_update'] = 't1' # 서버가 기록하는 필드는 변경분에서 제외
+    _, deltas, full, revision = delta.prepare(cameras)
+    assert not full
+    assert deltas == []
+    assert revision == 1
+
+def test_unacked_heartbeat_keeps_previous_baseline():
+    delta = StatusDelta()
+    cameras = [camera()]
+    sent, _, _, revision = delta.prepare(cameras)
+    delta.ack(sent, revision)
+
+    cameras[0]['status'] = 'error'
+    delta.prepare(cameras) # 응답 실패 -> ack 없음
+    _, deltas, _, revision = delta.prepare(cameras)
+    assert deltas == [{'camera_id': 'cam0', 'status': 'error'}]
+    assert revision == 2
+
+def test_reset_and_camera_set_change_force_full():
+    delta = StatusDelta()
+    sent, _, _, revision = delta.prepare([camera()])
+    delta.ack(sent, revision)
+
+    assert delta.prepare([camera(), camera(camera_id='cam1')])[2]
+    delta.reset()
+    assert delta.prepare([camera()])[2]
+
+def test_volatile_telemetry_alone_is_not_a_change():
+    delta = StatusDelta()
+    sent, _, _, revision = delta.prepare([camera(motion_gate={'score': 0.1, 'frames_analyzed': 10},
+                                                 rtsp_sessions={'count': 1, 'sessions': [{'age_sec': 1.0, 'bytes_sent': 100}]})])
+    delta.ack(sent, revision)
+    _, deltas, full, next_revision = delta.prepare([camera(motion_gate={'score': 0.7, 'frames_analyzed': 25},
+                                                           rtsp_sessions={'count': 1, 'sessions': [{'age_sec': 11.0, 'bytes_sent': 9000}]})])
+    assert not full
+    assert deltas == []
+    assert next_revision == revision
+
+def test_volatile_telemetry_rides_along_with_a_real_change():
+    delta = StatusDelta()
+    sent, _, _, revision = delta.prepare([camera(motion_gate={'score': 0.1})])
+    delta.ack(sent, revision)
+    _, deltas, _, _ = delta.prepare([camera(status='streaming', motion_gate={'score': 0.7})])
+    assert deltas == [{'camera_id': 'cam0', 'status': 'streaming', 'motion_gate': {'score': 0.7}}]
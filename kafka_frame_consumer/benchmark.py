@@ -0,0 +1,156 @@
+"""
+
+FrameConsumer 디코딩 처리량 벤치마크 (코어당 frames/sec)
+
+synthetic: 브로커 없이 Agent 와 같은 포맷의 메시지를 메모리에 만들어 디코딩 + 배치 스택 속도 측정
+    python benchmark.py --width 1280 --height 720 --cameras 4 --processes 1 2 4
+live: 실제 토픽을 구독해 일정 시간 동안 받은 프레임 수와 사용한 CPU 시간 측정
+    python benchmark.py --live --bootstrap-servers 10.79.1.1:9094 --topics camera-agent-01 --seconds 30
+
+결과의 per_core_fps 는 frames / CPU 시간(process_time) 이므로 추론 서비스가 필요한 코어 수 산정에 사용
+
+"""
+
+# benchmark.py
+import argparse
+import collections
+import multiprocessing
+import time
+
+import numpy as np
+
+from camera_frames import FrameConsumer, FrameDecoder
+from camera_frames.envelope import FrameEnvelope, ENVELOPE_HEADER_KEY, FIXED_HEADER_SIZE, iter_chunks
+
+# kafka-python ConsumerRecord 에서 디코더가 사용하는 필드만
+FakeRecord = collections.namedtuple('FakeRecord', 'topic partition offset timestamp value headers')
+
+
+def build_records(cameras, width, height, frames_per_camera, envelope_mode, max_message_bytes):
+    """ Agent 의 KafkaRendition._iter_messages 와 같은 방식으로 메시지 생성 """
+    records = []
+    frame_size = width * height * 3
+    payload = np.random.randint(0, 255, frame_size, dtype=np.uint8).tobytes()
+    offset = 0
+    for sequence in range(frames_per_camera):
+        for camera_index in range(cameras):
+            camera_id = f"bench-cam-{camera_index:02d}"
+            max_chunk = max_message_bytes - FIXED_HEADER_SIZE - len(camera_id) - 512
+            envelope = FrameEnvelope(camera_id, sequence, sequence * 33000000, time.time_ns(),
+                                     width, height, 'BGR', 'raw', frame_size)
+            for chunk_index, chunk_count, chunk_offset, length in iter_chunks(frame_size, max_chunk):
+                envelope.chunk_index, envelope.chunk_count, envelope.chunk_offset = chunk_index, chunk_count, chunk_offset
+                header = envelope.pack()
+                chunk = payload[chunk_offset:chunk_offset + length]
+                if envelope_mode == 'headers':
+                    record = FakeRecord(camera_id, 0, offset, 0, chunk, [(ENVELOPE_HEADER_KEY, header)])
+                else:
+                    record = FakeRecord(camera_id, 0, offset, 0, header + chunk, [])
+                records.append(record)
+                offset += 1
+    return records
+
+
+def run_synthetic(args):
+    records = build_records(args.cameras, args.width, args.height, args.frames,
+                            args.envelope, args.max_message_bytes)
+    decoder = FrameDecoder()
+    batch = np.empty((args.cameras, args.height, args.width, 3), dtype=np.uint8)
+
+    decoded = 0
+    checksum = 0
+    latest = {}
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for record in records:
+        frame = decoder.decode_record(record)
+        if frame is None:
+            continue
+        decoded += 1
+        checksum += int(frame.image[0, 0, 0]) # 실제로 버퍼를 건드리는지 확인용
+        latest[frame.camera_id] = frame
+        if args.batch and len(latest) == args.cameras:
+            for index, camera_frame in enumerate(latest.values()):
+                batch[index] = camera_frame.image
+            latest.clear()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return decoded, wall, cpu, checksum
+
+
+def _worker(args):
+    return run_synthetic(args)
+
+
+def report(label, decoded, wall, cpu, frame_bytes):
+    fps = decoded / wall if wall else 0.0
+    per_core = decoded / cpu if cpu else 0.0
+    print(f"{label:<28} frames={decoded:<7} wall={wall:6.2f}s cpu={cpu:6.2f}s "
+          f"fps={fps:10.1f} per_core_fps={per_core:10.1f} throughput={fps * frame_bytes / 1e6:9.1f} MB/s")
+
+
+def benchmark_synthetic(args):
+    frame_bytes = args.width * args.height * 3
+    print(f"synthetic: {args.cameras} camera(s) {args.width}x{args.height} BGR, envelope={args.envelope}, "
+          f"max_message_bytes={args.max_message_bytes}, batch={'on' if args.batch else 'off'}")
+    for processes in args.processes:
+        if processes == 1:
+            decoded, wall, cpu, _ = run_synthetic(args)
+            report("1 process", decoded, wall, cpu, frame_bytes)
+            continue
+        with multiprocessing.Pool(processes) as pool:
+            wall_start = time.perf_counter()
+            results = pool.map(_worker, [args] * processes)
+            wall = time.perf_counter() - wall_start
+        decoded = sum(r[0] for r in results)
+        cpu = sum(r[2] for r in results)
+        # 프로세스별 메시지 생성 시간이 wall 에 포함되지 않도록 디코딩 구간만 사용
+        decode_wall = max(r[1] for r in results)
+        report(f"{processes} processes", decoded, decode_wall or wall, cpu, frame_bytes)
+
+
+def benchmark_live(args):
+    consumer = FrameConsumer(topics=args.topics, bootstrap_servers=args.bootstrap_servers,
+                             visibility_url=args.visibility_url, auto_offset_reset='latest')
+    decoded = 0
+    frame_bytes = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        while time.perf_counter() - wall_start < args.seconds:
+            for frame in consumer.poll(timeout_ms=500):
+                decoded += 1
+                frame_bytes = frame.image.nbytes
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        consumer.close()
+    report(f"live {','.join(consumer.topics)}", decoded, wall, cpu, frame_bytes)
+    print(consumer.get_stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Camera Agent Kafka frame consumer benchmark")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--frames', type=int, default=500, help="frames per camera")
+    parser.add_argument('--envelope', choices=('headers', 'inline'), default='headers')
+    parser.add_argument('--max-message-bytes', type=int, default=1000000)
+    parser.add_argument('--no-batch', dest='batch', action='store_false', help="skip N x H x W x 3 stacking")
+    parser.add_argument('--processes', type=int, nargs='+', default=[1])
+    parser.add_argument('--live', action='store_true')
+    parser.add_argument('--bootstrap-servers')
+    parser.add_argument('--topics', nargs='+')
+    parser.add_argument('--visibility-url')
+    parser.add_argument('--seconds', type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.live:
+        benchmark_live(args)
+    else:
+        benchmark_synthetic(args)
+
+
+if __name__ == '__main__':
+    main()
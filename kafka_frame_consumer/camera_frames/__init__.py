@@ -0,0 +1,21 @@
+"""
+
+Camera Agent Kafka 프레임 소비자 SDK
+
+"""
+
+from .consumer import FrameConsumer, FrameDecoder
+from .envelope import FrameEnvelope, ENVELOPE_VERSION
+from .frames import Frame, decode_image
+from .visibility import StreamGeometry, fetch_kafka_geometries
+
+__all__ = [
+    'FrameConsumer',
+    'FrameDecoder',
+    'FrameEnvelope',
+    'ENVELOPE_VERSION',
+    'Frame',
+    'decode_image',
+    'StreamGeometry',
+    'fetch_kafka_geometries',
+]
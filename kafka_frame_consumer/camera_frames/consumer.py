@@ -0,0 +1,217 @@
+"""
+
+Camera Agent Kafka 프레임 토픽 소비자
+
+- 하나 이상의 카메라 토픽을 구독하고 메시지를 Frame(NumPy 이미지 + 메타데이터) 으로 변환
+- 봉투(headers/inline)와 bare bytes(none) 토픽 모두 지원, chunk 프레임은 자동 재조립
+- 단일 메시지 raw 프레임은 np.frombuffer 로 메시지 버퍼를 그대로 감싸므로 복사 없음
+- get_batch() 로 여러 카메라의 최신 프레임을 N x H x W x C 배열 하나로 받음 (추론 배치 입력용)
+
+사용 예:
+    consumer = FrameConsumer(camera_ids=['cam-01', 'cam-02'], visibility_url='http://10.32.187.108:5111')
+    for frame in consumer:
+        model(frame.image)
+
+"""
+
+# camera_frames/consumer.py
+import logging
+import time
+
+import numpy as np
+from kafka import KafkaConsumer
+
+from .envelope import FrameEnvelope, ENVELOPE_HEADER_KEY, ENVELOPE_MAGIC
+from .frames import Frame, decode_image
+from .reassembly import ChunkAssembler
+from .visibility import fetch_kafka_geometries
+
+logger = logging.getLogger(__name__)
+
+
+class FrameDecoder:
+    """ Kafka 레코드 -> Frame 변환 (Kafka 연결 없이 사용 가능, 벤치마크/테스트용으로 분리) """
+
+    def __init__(self, geometries=None, chunk_timeout=2.0):
+        self.geometries = geometries if geometries is not None else {} # topic -> StreamGeometry
+        self._assembler = ChunkAssembler(timeout=chunk_timeout)
+        self._last_sequence = {} # (topic, camera_id) -> sequence
+        self.frames_lost = 0 # sequence 건너뜀으로 감지한 유실 프레임
+
+    def decode_record(self, record):
+        """ ConsumerRecord 하나를 Frame 으로 변환, chunk 가 아직 다 모이지 않았으면 None """
+        value = record.value
+        envelope = None
+        offset = 0
+        for key, header in record.headers or ():
+            if key == ENVELOPE_HEADER_KEY:
+                envelope = FrameEnvelope.unpack(header)
+                break
+        if envelope is None and value[:4] == ENVELOPE_MAGIC: # inline 봉투
+            envelope = FrameEnvelope.unpack(value)
+            offset = envelope.header_size
+
+        if envelope is None:
+            # 봉투 없는 bare bytes: Visibility Server 의 stream_details 로 디코딩
+            geometry = self.geometries.get(record.topic)
+            if geometry is None:
+                raise ValueError(f"No envelope and no stream_details geometry for topic '{record.topic}'")
+            image = decode_image(value, geometry.width, geometry.height, geometry.pixel_format, geometry.codec)
+            return Frame(geometry.camera_id, record.topic, record.partition, record.offset, None, None,
+                         record.timestamp * 1000000 if record.timestamp else None,
+                         geometry.width, geometry.height, geometry.pixel_format, geometry.codec, True, image)
+
+        if envelope.is_chunked:
+            completed = self._assembler.add(record.topic, envelope, memoryview(value)[offset:])
+            if completed is None:
+                return None
+            envelope, value = completed
+            offset = 0
+
+        self._track_sequence(record.topic, envelope)
+        image = decode_image(value, envelope.width, envelope.height, envelope.pixel_format, envelope.codec, offset)
+        return Frame(envelope.camera_id, record.topic, record.partition, record.offset, envelope.sequence,
+                     envelope.pts_ns if envelope.pts_ns >= 0 else None, envelope.capture_time_ns,
+                     envelope.width, envelope.height, envelope.pixel_format, envelope.codec,
+                     envelope.is_keyframe, image)
+
+    def _track_sequence(self, topic, envelope):
+        key = (topic, envelope.camera_id)
+        last = self._last_sequence.get(key)
+        if last is not None and envelope.sequence > last + 1:
+            self.frames_lost += envelope.sequence - last - 1
+        if last is None or envelope.sequence > last:
+            self._last_sequence[key] = envelope.sequence
+
+    def get_stats(self):
+        return {
+            'frames_lost': self.frames_lost,
+            'chunked_frames_completed': self._assembler.frames_completed,
+            'chunked_frames_expired': self._assembler.frames_expired,
+        }
+
+
+class FrameConsumer:
+    def __init__(self, topics=None, camera_ids=None, bootstrap_servers=None, visibility_url=None,
+                 rendition=None, group_id=None, auto_offset_reset='latest', max_message_bytes=8 * 1024 * 1024,
+                 chunk_timeout=2.0, **consumer_config):
+        """
+        topics        : 구독할 토픽 목록 (직접 지정)
+        camera_ids    : 구독할 카메라 ID 목록 (visibility_url 로 토픽 조회)
+        rendition     : 카메라가 여러 rendition 을 보낼 때 선택할 이름 (예: 'ai'), 없으면 전부
+        visibility_url: Visibility Server 주소, bare bytes 토픽의 해상도/포맷 조회에도 사용
+        나머지 키워드 인자는 KafkaConsumer 에 그대로 전달
+        """
+        self.geometries = {} # topic -> StreamGeometry
+        if visibility_url:
+            for geometry in fetch_kafka_geometries(visibility_url):
+                if camera_ids and geometry.camera_id not in camera_ids:
+                    continue
+                if rendition and geometry.rendition not in (None, rendition):
+                    continue
+                self.geometries[geometry.topic] = geometry
+        elif camera_ids:
+            raise ValueError("camera_ids requires visibility_url to resolve topics")
+
+        self.topics = list(topics or self.geometries.keys())
+        if not self.topics:
+            raise ValueError("No Kafka frame topics to subscribe to")
+        self.camera_ids = list(camera_ids) if camera_ids else None
+
+        if bootstrap_servers is None:
+            servers = {g.bootstrap_servers for g in self.geometries.values() if g.bootstrap_servers}
+            if not servers:
+                raise ValueError("bootstrap_servers is required (not found in stream_details)")
+            bootstrap_servers = sorted(servers)[0]
+        if isinstance(bootstrap_servers, str):
+            bootstrap_servers = [s.strip() for s in bootstrap_servers.split(',')]
+
+        self._consumer = KafkaConsumer(
+            *self.topics,
+            bootstrap_servers=bootstrap_servers,
+            group_id=group_id,
+            auto_offset_reset=auto_offset_reset, # 라이브 영상은 기본적으로 최신부터
+            fetch_max_bytes=max(max_message_bytes * 4, 50 * 1024 * 1024),
+            max_partition_fetch_bytes=max_message_bytes,
+            **consumer_config
+        )
+        self.decoder = FrameDecoder(self.geometries, chunk_timeout=chunk_timeout)
+        self.frames_decoded = 0
+        self.decode_errors = 0
+        logger.info(f"FrameConsumer subscribed to {self.topics}")
+
+    def poll(self, timeout_ms=100, max_records=None):
+        """ 도착한 메시지를 Frame 목록으로 반환 (토픽/파티션 내 순서 유지) """
+        frames = []
+        batches = self._consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+        for records in batches.values():
+            for record in records:
+                try:
+                    frame = self.decoder.decode_record(record)
+                except Exception as e:
+                    self.decode_errors += 1
+                    logger.warning(f"Failed to decode frame from {record.topic}@{record.offset}: {e}")
+                    continue
+                if frame is not None:
+                    self.frames_decoded += 1
+                    frames.append(frame)
+        return frames
+
+    def __iter__(self):
+        while True:
+            for frame in self.poll(timeout_ms=1000):
+                yield frame
+
+    def get_batch(self, camera_ids=None, timeout=1.0, out=None):
+        """
+        카메라별 최신 프레임 하나씩을 모아 (N x H x W x C 배열, Frame 목록) 반환
+        timeout 안에 프레임이 오지 않은 카메라는 0 으로 채우고 Frame 자리는 None
+        out 에 미리 할당한 배열을 넘기면 매 배치마다 메모리를 새로 할당하지 않음
+        """
+        camera_ids = list(camera_ids or self.camera_ids or [])
+        if not camera_ids:
+            raise ValueError("camera_ids is required for get_batch")
+        wanted = set(camera_ids)
+        latest = {}
+        deadline = time.monotonic() + timeout
+        while len(latest) < len(wanted):
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            for frame in self.poll(timeout_ms=remaining_ms):
+                if frame.camera_id in wanted:
+                    latest[frame.camera_id] = frame
+        # 이미 받아둔 더 최신 프레임이 있으면 반영 (대기 없이)
+        for frame in self.poll(timeout_ms=0):
+            if frame.camera_id in wanted:
+                latest[frame.camera_id] = frame
+
+        frames = [latest.get(camera_id) for camera_id in camera_ids]
+        shapes = {f.image.shape for f in frames if f is not None}
+        if len(shapes) > 1:
+            raise ValueError(f"Cannot stack frames with different shapes: {shapes} (use a common rendition)")
+        if out is None:
+            if not shapes:
+                return None, frames
+            out = np.empty((len(camera_ids),) + shapes.pop(), dtype=np.uint8)
+        for index, frame in enumerate(frames):
+            if frame is None:
+                out[index] = 0
+            else:
+                out[index] = frame.image
+        return out, frames
+
+    def get_stats(self):
+        return dict(self.decoder.get_stats(),
+                    topics=self.topics,
+                    frames_decoded=self.frames_decoded,
+                    decode_errors=self.decode_errors)
+
+    def close(self):
+        self._consumer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,101 @@
+"""
+
+Camera Agent 의 Kafka 프레임 봉투(envelope) 디코더
+
+fastapi_agent/app/frame_envelope.py 와 같은 포맷, SDK 가 Agent 의존성(GStreamer 등) 없이 설치되도록 복사해 둠
+포맷을 바꿀 때는 두 파일을 함께 수정하고 ENVELOPE_VERSION 을 올릴 것
+tests/test_decoding.py 가 두 모듈의 포맷 정의를 비교하고 Agent 로 만든 메시지를 SDK 로 디코딩해 확인
+
+"""
+
+# camera_frames/envelope.py
+import struct
+
+ENVELOPE_MAGIC = b'CAFR'
+ENVELOPE_VERSION = 1
+ENVELOPE_HEADER_KEY = 'frame-envelope'
+
+FLAG_KEYFRAME = 0x01
+FLAG_CHUNKED = 0x02
+
+_FIXED = struct.Struct('>4sBBHQqqHH4s4sHHIIB')
+FIXED_HEADER_SIZE = _FIXED.size
+
+ENVELOPE_MODES = ('headers', 'inline', 'none')
+
+
+def _fourcc(value):
+    return value.encode('ascii')[:4].ljust(4, b' ')
+
+
+class FrameEnvelope:
+    __slots__ = ('camera_id', 'sequence', 'pts_ns', 'capture_time_ns', 'width', 'height',
+                 'pixel_format', 'codec', 'flags', 'chunk_index', 'chunk_count', 'chunk_offset',
+                 'frame_size', 'header_size')
+
+    def __init__(self, camera_id, sequence, pts_ns, capture_time_ns, width, height,
+                 pixel_format, codec, frame_size, flags=0,
+                 chunk_index=0, chunk_count=1, chunk_offset=0, header_size=None):
+        self.camera_id = camera_id
+        self.sequence = sequence
+        self.pts_ns = pts_ns if pts_ns is not None else -1
+        self.capture_time_ns = capture_time_ns
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.codec = codec
+        self.flags = flags
+        self.chunk_index = chunk_index
+        self.chunk_count = chunk_count
+        self.chunk_offset = chunk_offset
+        self.frame_size = frame_size
+        self.header_size = header_size
+
+    @property
+    def is_keyframe(self):
+        return bool(self.flags & FLAG_KEYFRAME)
+
+    @property
+    def is_chunked(self):
+        return self.chunk_count > 1
+
+    def pack(self):
+        camera_id_bytes = self.camera_id.encode('utf-8')[:255]
+        flags = self.flags | (FLAG_CHUNKED if self.chunk_count > 1 else 0)
+        header_size = FIXED_HEADER_SIZE + len(camera_id_bytes)
+        return _FIXED.pack(
+            ENVELOPE_MAGIC, ENVELOPE_VERSION, flags, header_size,
+            self.sequence, self.pts_ns, self.capture_time_ns,
+            self.width, self.height, _fourcc(self.pixel_format), _fourcc(self.codec),
+            self.chunk_index, self.chunk_count, self.chunk_offset, self.frame_size,
+            len(camera_id_bytes),
+        ) + camera_id_bytes
+
+    @classmethod
+    def unpack(cls, data):
+        """ bytes/memoryview 앞부분에서 봉투를 읽음, payload 는 data[envelope.header_size:] """
+        if len(data) < FIXED_HEADER_SIZE:
+            raise ValueError("Buffer too small for frame envelope")
+        (magic, version, flags, header_size, sequence, pts_ns, capture_time_ns,
+         width, height, pixel_format, codec, chunk_index, chunk_count, chunk_offset,
+         frame_size, camera_id_len) = _FIXED.unpack_from(data, 0)
+        if magic != ENVELOPE_MAGIC:
+            raise ValueError("Not a frame envelope (bad magic)")
+        if version != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported frame envelope version {version}")
+        camera_id = bytes(data[FIXED_HEADER_SIZE:FIXED_HEADER_SIZE + camera_id_len]).decode('utf-8')
+        return cls(camera_id, sequence, pts_ns, capture_time_ns, width, height,
+                   pixel_format.decode('ascii').strip(), codec.decode('ascii').strip(), frame_size,
+                   flags=flags, chunk_index=chunk_index, chunk_count=chunk_count,
+                   chunk_offset=chunk_offset, header_size=header_size)
+
+
+def iter_chunks(frame_size, max_chunk_size):
+    """ (chunk_index, chunk_count, offset, length) 를 순서대로 반환 """
+    if max_chunk_size <= 0 or frame_size <= max_chunk_size:
+        yield 0, 1, 0, frame_size
+        return
+    chunk_count = (frame_size + max_chunk_size - 1) // max_chunk_size
+    for index in range(chunk_count):
+        offset = index * max_chunk_size
+        yield index, chunk_count, offset, min(max_chunk_size, frame_size - offset)
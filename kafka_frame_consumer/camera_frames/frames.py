@@ -0,0 +1,84 @@
+"""
+
+Kafka 메시지 payload -> NumPy 이미지 변환
+
+raw 프레임(BGR/RGB)은 np.frombuffer 로 메시지 버퍼를 그대로 감싸므로 복사가 없음 (결과 배열은 읽기 전용)
+jpeg/png 는 디코딩이 필요하므로 OpenCV(cv2) 가 설치된 경우에만 지원 (선택 의존성)
+
+"""
+
+# camera_frames/frames.py
+import time
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError: # jpeg/png 토픽을 쓰지 않으면 필요 없음
+    cv2 = None
+
+# pixel_format -> 채널 수
+PIXEL_CHANNELS = {
+    'BGR': 3,
+    'RGB': 3,
+    'GRAY8': 1,
+    'GRAY': 1,
+}
+
+
+class Frame:
+    __slots__ = ('camera_id', 'topic', 'partition', 'offset', 'sequence', 'pts_ns', 'capture_time_ns',
+                 'width', 'height', 'pixel_format', 'codec', 'is_keyframe', 'image')
+
+    def __init__(self, camera_id, topic, partition, offset, sequence, pts_ns, capture_time_ns,
+                 width, height, pixel_format, codec, is_keyframe, image):
+        self.camera_id = camera_id
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+        self.sequence = sequence
+        self.pts_ns = pts_ns
+        self.capture_time_ns = capture_time_ns
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.codec = codec
+        self.is_keyframe = is_keyframe
+        self.image = image # H x W x C uint8 (BGR 순서, raw RGB 토픽은 RGB 그대로)
+
+    @property
+    def latency_ms(self):
+        """ 캡처 시각부터 지금까지의 지연 (Agent 와 소비자 시계가 PTP/NTP 로 맞춰져 있다고 가정) """
+        if not self.capture_time_ns:
+            return None
+        return (time.time_ns() - self.capture_time_ns) / 1e6
+
+    def __repr__(self):
+        return (f"Frame(camera_id={self.camera_id!r}, sequence={self.sequence}, "
+                f"shape={None if self.image is None else self.image.shape}, codec={self.codec!r})")
+
+
+def decode_image(payload, width, height, pixel_format='BGR', codec='raw', offset=0):
+    """
+    payload(bytes/bytearray/memoryview) 의 offset 이후를 이미지 배열로 변환
+    raw 는 복사 없는 view, jpeg/png 는 cv2.imdecode 결과(BGR)
+    """
+    if codec == 'raw':
+        channels = PIXEL_CHANNELS.get(pixel_format.upper(), 3)
+        expected = width * height * channels
+        if len(payload) - offset < expected:
+            raise ValueError(f"Payload too small for {width}x{height} {pixel_format}: "
+                             f"{len(payload) - offset} < {expected} bytes")
+        image = np.frombuffer(payload, dtype=np.uint8, count=expected, offset=offset)
+        return image.reshape(height, width, channels)
+
+    if codec in ('jpeg', 'png'):
+        if cv2 is None:
+            raise ImportError(f"Decoding '{codec}' frames requires opencv-python (pip install opencv-python-headless)")
+        encoded = np.frombuffer(payload, dtype=np.uint8, offset=offset)
+        image = cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"Failed to decode {codec} frame")
+        return image
+
+    raise ValueError(f"Unsupported frame codec '{codec}'")
@@ -0,0 +1,63 @@
+"""
+
+KAFKA_MAX_MESSAGE_BYTES 를 넘어 chunk 로 나뉜 프레임 재조립
+
+같은 (topic, camera_id, sequence) chunk 를 frame_size 크기 버퍼의 chunk_offset 위치에 채우고
+frame_size 만큼 모이면 완성된 버퍼를 반환. chunk 하나가 유실되면 timeout 후 버림
+chunk 프레임은 조립 버퍼로의 복사가 한 번 필요함 (단일 메시지 프레임은 복사 없음)
+
+"""
+
+# camera_frames/reassembly.py
+import time
+
+
+class _PendingFrame:
+    __slots__ = ('envelope', 'buffer', 'received', 'chunks', 'started')
+
+    def __init__(self, envelope, buffer):
+        self.envelope = envelope
+        self.buffer = buffer
+        self.received = 0
+        self.chunks = set()
+        self.started = time.monotonic()
+
+
+class ChunkAssembler:
+    def __init__(self, timeout=2.0):
+        self.timeout = timeout
+        self._pending = {} # (topic, camera_id, sequence) -> _PendingFrame
+        self.frames_completed = 0
+        self.frames_expired = 0
+
+    def add(self, topic, envelope, chunk):
+        """ chunk 추가, 프레임이 완성되면 (envelope, bytearray) 반환, 아니면 None """
+        key = (topic, envelope.camera_id, envelope.sequence)
+        pending = self._pending.get(key)
+        if pending is None:
+            self._expire()
+            # 토픽/카메라당 조립 중인 프레임은 최신 하나만 유지 (이전 sequence 는 유실로 간주)
+            for stale in [k for k in self._pending if k[:2] == key[:2]]:
+                del self._pending[stale]
+                self.frames_expired += 1
+            pending = _PendingFrame(envelope, bytearray(envelope.frame_size))
+            self._pending[key] = pending
+
+        if envelope.chunk_index in pending.chunks: # 재전송 등으로 인한 중복
+            return None
+        end = envelope.chunk_offset + len(chunk)
+        pending.buffer[envelope.chunk_offset:end] = chunk
+        pending.chunks.add(envelope.chunk_index)
+        pending.received += len(chunk)
+
+        if len(pending.chunks) < envelope.chunk_count or pending.received < envelope.frame_size:
+            return None
+        del self._pending[key]
+        self.frames_completed += 1
+        return pending.envelope, pending.buffer
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [k for k, p in self._pending.items() if now - p.started > self.timeout]:
+            del self._pending[key]
+            self.frames_expired += 1
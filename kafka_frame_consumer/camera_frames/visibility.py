@@ -0,0 +1,99 @@
+"""
+
+Visibility Server 에서 KAFKA 카메라의 토픽/프레임 형상(stream_details) 조회
+
+봉투(envelope) 가 있는 토픽은 메시지 자체에 해상도/포맷이 들어있지만
+KAFKA_FRAME_ENVELOPE=none 인 Agent 의 bare bytes 토픽은 여기서 조회한 값으로 디코딩함
+
+"""
+
+# camera_frames/visibility.py
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class StreamGeometry:
+    __slots__ = ('camera_id', 'agent_id', 'topic', 'rendition', 'width', 'height', 'pixel_format', 'codec',
+                 'fps', 'envelope', 'bootstrap_servers')
+
+    def __init__(self, camera_id, agent_id, topic, rendition, width, height, pixel_format, codec,
+                 fps=None, envelope=None, bootstrap_servers=None):
+        self.camera_id = camera_id
+        self.agent_id = agent_id
+        self.topic = topic
+        self.rendition = rendition
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.codec = codec
+        self.fps = fps
+        self.envelope = envelope
+        self.bootstrap_servers = bootstrap_servers
+
+    def __repr__(self):
+        return (f"StreamGeometry(camera_id={self.camera_id!r}, topic={self.topic!r}, "
+                f"{self.width}x{self.height} {self.pixel_format}/{self.codec})")
+
+
+def _parse_resolution(value, default=(640, 480)):
+    try:
+        width, height = map(int, str(value).lower().split('x'))
+        return width, height
+    except (ValueError, AttributeError):
+        return default
+
+
+def _geometries_for_camera(agent_id, camera):
+    """ 카메라 문서 하나에서 rendition 별 StreamGeometry 목록 생성 """
+    details = camera.get('stream_details') or {}
+    camera_id = camera.get('camera_id')
+    default_width, default_height = _parse_resolution(camera.get('resolution'))
+    width = details.get('frame_width') or default_width
+    height = details.get('frame_height') or default_height
+    common = {
+        'camera_id': camera_id,
+        'agent_id': agent_id,
+        'envelope': details.get('frame_envelope', 'none'), # 봉투 도입 이전 Agent 는 bare bytes
+        'bootstrap_servers': details.get('kafka_bootstrap_servers'),
+    }
+
+    renditions = details.get('renditions')
+    if renditions:
+        geometries = []
+        for rendition in renditions:
+            r_width, r_height = _parse_resolution(rendition.get('resolution'), (width, height))
+            geometries.append(StreamGeometry(
+                topic=rendition.get('kafka_topic'), rendition=rendition.get('name'),
+                width=r_width, height=r_height,
+                pixel_format=rendition.get('frame_pixel_format', 'BGR'),
+                codec=rendition.get('frame_codec', 'raw'), fps=rendition.get('fps'), **common))
+        return geometries
+
+    return [StreamGeometry(
+        topic=details.get('kafka_topic'), rendition=None, width=width, height=height,
+        pixel_format=details.get('frame_pixel_format', 'BGR'), codec=details.get('frame_codec', 'raw'),
+        fps=details.get('frame_rate') or camera.get('fps'), **common)]
+
+
+def fetch_kafka_geometries(visibility_url, timeout=10):
+    """ Visibility Server 에 등록된 모든 KAFKA 카메라의 StreamGeometry 목록 """
+    geometries = []
+    response = requests.get(f"{visibility_url}/webui/get_agent_list", timeout=timeout)
+    response.raise_for_status()
+    for agent_summary in response.json():
+        agent_id = agent_summary.get('agent_id')
+        if not agent_id:
+            continue
+        details_response = requests.get(f"{visibility_url}/webui/agents/{agent_id}", timeout=timeout)
+        if details_response.status_code != 200:
+            logger.warning(f"Failed to get details for agent {agent_id}. Status: {details_response.status_code}")
+            continue
+        for camera in details_response.json().get('cameras', []):
+            if 'KAFKA' not in (camera.get('stream_protocol') or '').split('+'): # 'RTSP+KAFKA' 동시 사용 포함
+                continue
+            geometries.extend(g for g in _geometries_for_camera(agent_id, camera) if g.topic)
+    logger.info(f"Found {len(geometries)} Kafka frame topic(s) on Visibility Server.")
+    return geometries
@@ -0,0 +1,157 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from camera_frames import FrameDecoder, StreamGeometry, decode_image
+from camera_frames import envelope as sdk_envelope
+from camera_frames.envelope import ENVELOPE_HEADER_KEY
+from camera_frames.reassembly import ChunkAssembler
+
+# Agent 의 봉투 모듈 (GStreamer 의존성 없음) 로 만든 메시지를 SDK 로 디코딩
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'fastapi_agent'))
+from app import frame_envelope as agent_envelope  # noqa: E402
+
+
+class Record:
+    def __init__(self, value, headers=None, topic='frames', offset=0, timestamp=1700000000000):
+        self.topic = topic
+        self.partition = 0
+        self.offset = offset
+        self.timestamp = timestamp
+        self.headers = headers
+        self.value = value
+
+
+def image(width=4, height=2, channels=3):
+    return np.arange(width * height * channels, dtype=np.uint8).reshape(height, width, channels)
+
+def agent_envelope_for(frame, sequence=7, camera_id='cam-01'):
+    height, width = frame.shape[:2]
+    return agent_envelope.FrameEnvelope(camera_id, sequence, 1000, 2000, width, height, 'BGR', 'raw',
+                                        frame.nbytes, flags=agent_envelope.FLAG_KEYFRAME)
+
+def chunk_records(frame, max_chunk, sequence=7):
+    envelope = agent_envelope_for(frame, sequence)
+    payload = frame.tobytes()
+    records = []
+    for chunk_index, chunk_count, offset, length in agent_envelope.iter_chunks(len(payload), max_chunk):
+        envelope.chunk_index, envelope.chunk_count, envelope.chunk_offset = chunk_index, chunk_count, offset
+        records.append(Record(payload[offset:offset + length], [(ENVELOPE_HEADER_KEY, envelope.pack())]))
+    return records
+
+
+def test_envelope_format_matches_agent():
+    # SDK 는 Agent 모듈을 복사해 두었으므로 포맷 정의가 같은지 확인
+    for name in ('ENVELOPE_MAGIC', 'ENVELOPE_VERSION', 'ENVELOPE_HEADER_KEY', 'FLAG_KEYFRAME', 'FLAG_CHUNKED',
+                 'FIXED_HEADER_SIZE'):
+        assert getattr(sdk_envelope, name) == getattr(agent_envelope, name), name
+    assert sdk_envelope._FIXED.format == agent_envelope._FIXED.format
+
+def test_decode_headers_envelope():
+    frame = image()
+    record = Record(frame.tobytes(), [(ENVELOPE_HEADER_KEY, agent_envelope_for(frame).pack())])
+    decoded = FrameDecoder().decode_record(record)
+    assert decoded.camera_id == 'cam-01'
+    assert decoded.sequence == 7
+    assert decoded.pts_ns == 1000
+    assert decoded.capture_time_ns == 2000
+    assert decoded.is_keyframe
+    np.testing.assert_array_equal(decoded.image, frame)
+
+def test_decode_inline_envelope():
+    frame = image()
+    record = Record(agent_envelope_for(frame).pack() + frame.tobytes())
+    decoded = FrameDecoder().decode_record(record)
+    assert decoded.camera_id == 'cam-01'
+    np.testing.assert_array_equal(decoded.image, frame)
+
+def test_decode_bare_bytes_uses_geometry():
+    frame = image()
+    geometry = StreamGeometry('cam-02', 'agent-01', 'frames', None, 4, 2, 'BGR', 'raw')
+    decoded = FrameDecoder({'frames': geometry}).decode_record(Record(frame.tobytes()))
+    assert decoded.camera_id == 'cam-02'
+    assert decoded.sequence is None
+    np.testing.assert_array_equal(decoded.image, frame)
+
+def test_decode_bare_bytes_without_geometry_fails():
+    with pytest.raises(ValueError):
+        FrameDecoder().decode_record(Record(image().tobytes()))
+
+def test_chunked_frame_round_trip():
+    frame = image(width=8, height=4)
+    records = chunk_records(frame, max_chunk=20)
+    assert len(records) > 2
+    decoder = FrameDecoder()
+    results = [decoder.decode_record(record) for record in records]
+    assert all(result is None for result in results[:-1])
+    np.testing.assert_array_equal(results[-1].image, frame)
+    assert decoder.get_stats()['chunked_frames_completed'] == 1
+
+def test_chunks_out_of_order_and_duplicated():
+    frame = image(width=8, height=4)
+    records = chunk_records(frame, max_chunk=20)
+    order = list(reversed(records)) + [records[0]]
+    decoder = FrameDecoder()
+    results = [decoder.decode_record(record) for record in order[:-1]]
+    assert all(result is None for result in results[:-1])
+    np.testing.assert_array_equal(results[-1].image, frame)
+    assert decoder.decode_record(order[-1]) is None # 완성 후 늦게 온 중복 chunk 는 새 프레임을 만들지 않음
+
+def test_duplicate_chunk_is_not_counted_twice():
+    frame = image(width=8, height=4)
+    first, *rest = chunk_records(frame, max_chunk=20)
+    decoder = FrameDecoder()
+    assert decoder.decode_record(first) is None
+    assert decoder.decode_record(first) is None
+    results = [decoder.decode_record(record) for record in rest]
+    np.testing.assert_array_equal(results[-1].image, frame)
+
+def test_newer_sequence_supersedes_incomplete_frame():
+    frame = image(width=8, height=4)
+    old = chunk_records(frame, max_chunk=20, sequence=1)
+    new = chunk_records(frame, max_chunk=20, sequence=2)
+    decoder = FrameDecoder()
+    decoder.decode_record(old[0])
+    results = [decoder.decode_record(record) for record in new]
+    assert results[-1].sequence == 2
+    assert decoder.decode_record(old[1]) is None # 버려진 sequence 의 나머지 chunk 는 완성되지 않음
+    assert decoder.get_stats()['chunked_frames_expired'] >= 1
+
+def test_assembler_expires_stale_frames():
+    frame = image(width=8, height=4)
+    records = chunk_records(frame, max_chunk=20)
+    assembler = ChunkAssembler(timeout=1.0)
+    envelope = sdk_envelope.FrameEnvelope.unpack(records[0].headers[0][1])
+    assert assembler.add('frames', envelope, records[0].value) is None
+    for pending in assembler._pending.values():
+        pending.started -= 5.0 # timeout 경과
+    other = sdk_envelope.FrameEnvelope.unpack(chunk_records(frame, 20)[0].headers[0][1])
+    other.camera_id = 'cam-other'
+    assembler.add('frames', other, records[0].value)
+    assert assembler.frames_expired == 1
+
+def test_decode_image_raw_is_zero_copy_view():
+    frame = image()
+    payload = b'xx' + frame.tobytes()
+    decoded = decode_image(payload, 4, 2, 'BGR', 'raw', offset=2)
+    np.testing.assert_array_equal(decoded, frame)
+    assert not decoded.flags.writeable
+
+def test_decode_image_gray():
+    frame = image(channels=1)
+    assert decode_image(frame.tobytes(), 4, 2, 'GRAY8').shape == (2, 4, 1)
+
+def test_decode_image_rejects_short_payload_and_unknown_codec():
+    with pytest.raises(ValueError):
+        decode_image(b'\x00' * 10, 4, 2, 'BGR', 'raw')
+    with pytest.raises(ValueError):
+        decode_image(b'\x00' * 24, 4, 2, 'BGR', 'h265')
+
+def test_decode_image_jpeg_requires_opencv():
+    from camera_frames import frames
+    if frames.cv2 is not None:
+        pytest.skip("opencv installed")
+    with pytest.raises(ImportError):
+        decode_image(b'\xff\xd8', 4, 2, 'BGR', 'jpeg')
@@ -34,7 +34,7 @@ from models.agent import AgentModel
 # models.database는 db_instance를 정의
 from database import db_instance # 주기적 작업에서 직접 사용
 
-from resources.agent_resources import AgentUpdateStatus, AgentGetConfig, AgentRegister
+from resources.agent_resources import AgentUpdateStatus, AgentGetConfig, AgentRegister, AgentWatchConfig, AgentHeartbeat
 from resources.user_resources import GetCameraStatus, SetFrameTransmission
 from resources.webui_resources import GetAgentList, GetAgentDetails, CameraFrameTransmissionControl
 
@@ -232,6 +232,8 @@ def run_periodic_tasks():
 api.add_resource(AgentRegister, '/agent_register')
 api.add_resource(AgentUpdateStatus, '/agent_update_status')
 api.add_resource(AgentGetConfig, '/agent_get_config')
+api.add_resource(AgentWatchConfig, '/agent_watch_config') # long-poll, 설정이 바뀔 때만 응답
+api.add_resource(AgentHeartbeat, '/agent_heartbeat') # 상태 변경분 보고 + 설정 동기화
 
 api.add_resource(GetCameraStatus, '/api/get_camera_status') # 이전 모델 기반일 수 있음, 검토 필요
 api.add_resource(SetFrameTransmission, '/api/set_frame_transmission') # 이전 모델 기반, CameraFrameTransmissionControl로 대체 고려
@@ -3,7 +3,10 @@ from tinydb import TinyDB, Query
 from tinydb.storages import JSONStorage
 # from tinydb.middlewares import CachingMiddleware # 테스트를 위해 제거된 상태 유지
 import os
+import fcntl
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 # --- DATABASE_FILE 설정 로직 (이전과 동일) ---
@@ -30,6 +33,8 @@ class Database:
             instance = super(Database, cls).__new__(cls)
             instance._db = None
             instance._agent_table = None
+            instance._lock = threading.RLock()
+            instance._lock_depth = 0
             try:
                 instance._initialize()
             except Exception as e:
@@ -71,6 +76,30 @@ class Database:
             self._db = None
             self._agent_table = None
 
+    @contextmanager
+    def locked(self):
+        """
+        읽고-수정하고-쓰는 작업을 스레드와 gunicorn 워커 프로세스 사이에서 직렬화
+        (gthread 워커: heartbeat 병합과 웹 UI 의 config_revision 증가가 서로 덮어쓰지 않도록)
+        같은 스레드에서 중첩 호출 가능, 파일 잠금은 가장 바깥 호출에서만 잡음
+        """
+        with self._lock:
+            if self._lock_depth > 0 or not DATABASE_FILE:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(f"{DATABASE_FILE}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     @property
     def db(self):
         if self._db is None:
@@ -10,7 +10,12 @@ bind = "0.0.0.0:5111"
 timeout = int(os.environ.get("LOAD_DURATION_SECONDS", 2400)) + 60
 
 # 워커 클래스 설정
-worker_class = "sync"
+# /agent_watch_config long-poll 이 요청 하나당 스레드 하나를 오래 점유하므로 gthread 사용
+# 워커당 동시에 대기하는 에이전트 수는 AGENT_WATCH_MAX_WAITERS (기본 threads - 16) 로 제한되고,
+# 넘는 에이전트는 바로 204 + Retry-After 를 받아 heartbeat 로 동기화 (남은 스레드는 일반 요청용)
+# 에이전트가 많으면 WORKER_THREADS 를 (에이전트 수 + 16) 이상으로 설정
+worker_class = "gthread"
+threads = int(os.environ.get("WORKER_THREADS", 64))
 
 # 로깅 설정
 accesslog = "-"
@@ -100,6 +100,11 @@ class AgentModel:
         return agent_document_to_upsert['agent_id']
 
 
+    @staticmethod
+    def locked():
+        """ 조회 -> 수정 -> update_agent 를 하나의 작업으로 묶을 때 사용 (with AgentModel.locked(): ...) """
+        return db_instance.locked()
+
     @staticmethod
     def get_agent(agent_id: str):
         """agent_id로 특정 에이전트의 정보를 조회합니다."""
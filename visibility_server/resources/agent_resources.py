@@ -13,7 +13,9 @@ from flasgger import swag_from
 from datetime import datetime
 
 from models.agent import AgentModel
+from utils.config_watch import config_watch
 import logging
+import os
 
 """ 처음 Agent 가 Visibility 서버에 접속할때 알림
 현재는 내부 DB에 처음 agent가 등록할때 관련 정보 저장
@@ -165,4 +167,117 @@ class AgentGetConfig(Resource):
         # AgentModel.get_agent가 반환하는 문서는 DB의 내용 그대로이므로,
         # API 응답으로 바로 사용 가능. (TinyDB는 기본적으로 _id 필드를 문서에 추가하지 않음)
         logger.info(f"AgentGetConfig: Configuration retrieved successfully for agent_id: {agent_id}")
-        return jsonify(agent_document) # 명시적으로 jsonify 사용, HTTP Status 200은 기본값
\ No newline at end of file
+        return jsonify(agent_document) # 명시적으로 jsonify 사용, HTTP Status 200은 기본값
+
+""" 서버가 원하는 설정이 바뀔 때까지 기다렸다가 반환하는 long-poll (에이전트가 연결 하나를 계속 유지)
+since 가 현재 config_revision 과 다르면 바로 반환, 같으면 바뀔 때까지 대기하고 timeout 이 지나면 204
+대기 요청이 AGENT_WATCH_MAX_WAITERS 개를 넘으면 기다리지 않고 Retry-After 를 붙인 204 (에이전트는 그동안 heartbeat 로 동기화)
+"""
+AGENT_WATCH_MAX_TIMEOUT_SECONDS = float(os.environ.get('AGENT_WATCH_MAX_TIMEOUT_SECONDS', 30))
+
+class AgentWatchConfig(Resource):
+    @swag_from('../docs/agent_watch_config.yml')
+    def get(self):
+        agent_id = request.args.get('agent_id')
+        if not agent_id:
+            logger.warning("AgentWatchConfig: 'agent_id' is missing in request arguments.")
+            return {'message': 'agent_id is required in query parameters'}, 400
+        try:
+            since = int(request.args['since']) if 'since' in request.args else None
+            timeout = float(request.args.get('timeout', AGENT_WATCH_MAX_TIMEOUT_SECONDS))
+        except ValueError:
+            return {'message': 'since must be an integer and timeout a number'}, 400
+        timeout = min(max(timeout, 0.0), AGENT_WATCH_MAX_TIMEOUT_SECONDS)
+
+        agent_document = AgentModel.get_agent(agent_id)
+        if not agent_document:
+            logger.warning(f"AgentWatchConfig: Agent not found with agent_id: {agent_id}")
+            return {'message': 'Agent not found'}, 404
+
+        revision = agent_document.get('config_revision', 0)
+        if since is not None and revision == since:
+            changed = config_watch.wait(agent_id, since, timeout)
+            if changed is None:
+                logger.warning(f"AgentWatchConfig: Too many watchers, asking agent_id: {agent_id} to retry later")
+                return '', 204, {'Retry-After': str(int(AGENT_WATCH_MAX_TIMEOUT_SECONDS))}
+            if not changed:
+                return '', 204 # 변경 없음, 에이전트는 같은 since 로 다시 연결
+            agent_document = AgentModel.get_agent(agent_id)
+            if not agent_document:
+                return {'message': 'Agent not found'}, 404
+            revision = agent_document.get('config_revision', 0)
+
+        logger.info(f"AgentWatchConfig: Delivering config revision {revision} to agent_id: {agent_id}")
+        return jsonify(dict(agent_document, config_revision=revision))
+
+
+""" 상태 보고 + 설정 동기화를 한 번에 처리하는 heartbeat
+에이전트는 마지막으로 확인받은 상태(base_revision) 이후 바뀐 카메라 필드만 보내고,
+서버는 에이전트가 아직 적용하지 않은 설정(config_revision)이 있을 때만 원하는 상태를 응답 (없으면 204)
+"""
+class AgentHeartbeat(Resource):
+    @swag_from('../docs/agent_heartbeat.yml')
+    def post(self):
+        data = request.get_json(silent=True)
+        if not data:
+            logger.warning("AgentHeartbeat: Empty JSON payload received.")
+            return {'message': 'Request body must be JSON'}, 400
+
+        agent_id = data.get('agent_id')
+        if not agent_id:
+            logger.warning("AgentHeartbeat: 'agent_id' is missing in payload.")
+            return {'message': 'agent_id is required'}, 400
+        camera_deltas = data.get('cameras', [])
+        if not isinstance(camera_deltas, list) or not all(isinstance(cam, dict) and cam.get('camera_id') for cam in camera_deltas):
+            return {'message': "'cameras' must be a list of objects with camera_id"}, 400
+
+        # 조회 -> 병합 -> 기록 사이에 웹 UI 의 설정 변경(config_revision 증가)이 끼어들지 않도록 잠금
+        with AgentModel.locked():
+            agent = AgentModel.get_agent(agent_id)
+            if not agent:
+                logger.warning(f"AgentHeartbeat: Agent not found with agent_id: {agent_id}")
+                return {'message': 'Agent not found'}, 404
+
+            status_revision = agent.get('status_revision', 0)
+            full = bool(data.get('full'))
+            if not full and data.get('base_revision', 0) != status_revision:
+                # 이전 heartbeat 응답이 유실된 경우 등, 변경분을 적용할 기준이 다름
+                logger.info(f"AgentHeartbeat: Revision mismatch for agent {agent_id} (server {status_revision}, agent base {data.get('base_revision')}).")
+                return {'message': 'Status revision mismatch, send full status', 'status_revision': status_revision}, 409
+
+            config_revision = agent.get('config_revision', 0)
+            config_pending = data.get('config_revision') != config_revision
+
+            update_payload = {'status_revision': data.get('status_revision', status_revision)}
+            if camera_deltas or full:
+                cameras_by_id = {cam.get('camera_id'): cam for cam in agent.get('cameras', [])}
+                merged = []
+                for delta in camera_deltas:
+                    if config_pending:
+                        # 아직 적용되지 않은 설정을 에이전트의 현재 상태로 덮어쓰지 않음
+                        delta = {key: value for key, value in delta.items() if key != 'frame_transmission_enabled'}
+                    camera = cameras_by_id.get(delta['camera_id'])
+                    if camera is None:
+                        camera = {'frame_transmission_enabled': False}
+                        cameras_by_id[delta['camera_id']] = camera
+                    camera.update(delta)
+                    merged.append(camera)
+                # 전체 보고면 보고된 카메라만 유지, 변경분이면 기존 카메라에 병합
+                update_payload['cameras'] = merged if full else list(cameras_by_id.values())
+            if 'status' in data:
+                update_payload['status'] = data['status']
+
+            # 변경분이 없어도 last_update 가 갱신되어 활성 상태 점검에 반영됨
+            if not AgentModel.update_agent(agent_id, update_payload):
+                logger.error(f"AgentHeartbeat: Failed to update agent {agent_id}.")
+                return {'message': 'Internal server error during heartbeat'}, 500
+
+        if not config_pending:
+            return '', 204
+        logger.info(f"AgentHeartbeat: Delivering config revision {config_revision} to agent_id: {agent_id}")
+        cameras = update_payload.get('cameras', agent.get('cameras', []))
+        return {
+            'config_revision': config_revision,
+            'cameras': [{'camera_id': cam.get('camera_id'),
+                         'frame_transmission_enabled': cam.get('frame_transmission_enabled', False)} for cam in cameras],
+        }, 200
@@ -8,6 +8,7 @@ from flask_restful import Resource
 from flasgger import swag_from
 
 from models.agent import AgentModel
+from utils.config_watch import config_watch
 import requests
 
 class GetCameraStatus(Resource):
@@ -49,8 +50,13 @@ class SetFrameTransmission(Resource):
 
             if response.status_code == 200:
                 # 데이터베이스 업데이트
-                agent['frame_transmission_enabled'] = enabled
-                AgentModel.update_agent(agent_id, agent)
+                with AgentModel.locked(): # 에이전트 호출 동안 바뀌었을 수 있으므로 최신 문서 기준으로 변경
+                    agent = AgentModel.get_agent(agent_id) or agent
+                    agent['frame_transmission_enabled'] = enabled
+                    agent['config_revision'] = agent.get('config_revision', 0) + 1
+                    updated = AgentModel.update_agent(agent_id, agent)
+                if updated:
+                    config_watch.publish(agent_id, agent['config_revision'])
                 return {'message': 'Frame transmission setting updated and agent notified'}, 200
             else:
                 return {'message': f'Failed to update agent stream status: {response.text}'}, 500
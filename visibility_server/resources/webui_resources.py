@@ -2,6 +2,7 @@ from flask_restful import Resource
 from flask import jsonify
 from flask import request
 from models.agent import AgentModel
+from utils.config_watch import config_watch
 from flasgger import swag_from
 import logging
 import json
@@ -79,33 +80,38 @@ class CameraFrameTransmissionControl(Resource):
             if enable is None or not isinstance(enable, bool):
                 return {'message': "'frame_transmission_enabled' (boolean) is required"}, 400
 
-            agent = AgentModel.get_agent(agent_id)
-            if not agent:
-                return {'message': 'Agent not found'}, 404
+            # 조회 -> 변경 -> 기록 사이에 heartbeat 병합이 끼어들어 설정을 덮어쓰지 않도록 잠금
+            with AgentModel.locked():
+                agent = AgentModel.get_agent(agent_id)
+                if not agent:
+                    return {'message': 'Agent not found'}, 404
 
-            camera_updated_in_db = False
-            target_camera_index = -1
-            if 'cameras' in agent and isinstance(agent['cameras'], list):
-                for i, cam in enumerate(agent['cameras']):
-                    if cam.get('camera_id') == camera_id:
-                        agent['cameras'][i]['frame_transmission_enabled'] = enable
-                        agent['cameras'][i]['status'] = 'streaming' if enable else 'active' # 상태도 함께 변경
-                        agent['cameras'][i]['last_update'] = datetime.utcnow().isoformat()
-                        target_camera_index = i
-                        camera_updated_in_db = True
-                        break
+                camera_updated_in_db = False
+                target_camera_index = -1
+                if 'cameras' in agent and isinstance(agent['cameras'], list):
+                    for i, cam in enumerate(agent['cameras']):
+                        if cam.get('camera_id') == camera_id:
+                            agent['cameras'][i]['frame_transmission_enabled'] = enable
+                            agent['cameras'][i]['status'] = 'streaming' if enable else 'active' # 상태도 함께 변경
+                            agent['cameras'][i]['last_update'] = datetime.utcnow().isoformat()
+                            target_camera_index = i
+                            camera_updated_in_db = True
+                            break
             
-            if not camera_updated_in_db:
-                return {'message': 'Camera not found for this agent'}, 404
+                if not camera_updated_in_db:
+                    return {'message': 'Camera not found for this agent'}, 404
 
-            update_payload = {
-                'cameras': agent['cameras'],
-                'last_update': datetime.utcnow().isoformat()
-            }
-            db_update_success = AgentModel.update_agent(agent_id, update_payload)
+                config_revision = agent.get('config_revision', 0) + 1 # /agent_watch_config 대기 중인 에이전트에 알림
+                update_payload = {
+                    'cameras': agent['cameras'],
+                    'config_revision': config_revision,
+                    'last_update': datetime.utcnow().isoformat()
+                }
+                db_update_success = AgentModel.update_agent(agent_id, update_payload)
 
             if db_update_success:
                 logger.info(f"DB: Camera {camera_id} on agent {agent_id} FTE set to {enable}.")
+                config_watch.publish(agent_id, config_revision)
                 
                 # --- Agent 직접 호출 (옵션 2) ---
                 agent_ip = agent.get('ip')
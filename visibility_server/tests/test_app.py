@@ -51,3 +51,154 @@ def test_set_frame_transmission(client):
     response = client.get('/agent/get_config', query_string={'agent_id': 'test_agent'})
     assert response.status_code == 200
     assert response.get_json()['frame_transmission_enabled'] == True
+
+def register_agent(client):
+    response = client.post('/agent_register', json={
+        'agent_name': 'watch_agent',
+        'agent_port': 1, # 직접 호출은 실패하고 long-poll 로만 전달되도록
+        'cameras': [{'camera_id': 'cam0', 'frame_transmission_enabled': False}]
+    })
+    assert response.status_code == 201
+    return response.get_json()['agent_id']
+
+def test_agent_watch_config_returns_immediately_without_since(client):
+    agent_id = register_agent(client)
+
+    response = client.get('/agent_watch_config', query_string={'agent_id': agent_id})
+    assert response.status_code == 200
+    assert response.get_json()['config_revision'] == 0
+
+def test_agent_watch_config_times_out_without_change(client):
+    agent_id = register_agent(client)
+
+    response = client.get('/agent_watch_config', query_string={'agent_id': agent_id, 'since': 0, 'timeout': 0.2})
+    assert response.status_code == 204
+
+def test_agent_watch_config_wakes_on_change(client):
+    import threading
+    import time
+    agent_id = register_agent(client)
+
+    def toggle():
+        time.sleep(0.2)
+        with app.test_client() as other:
+            other.post(f'/webui/agents/{agent_id}/cameras/cam0/control', json={'frame_transmission_enabled': True})
+
+    threading.Thread(target=toggle).start()
+    started = time.monotonic()
+    response = client.get('/agent_watch_config', query_string={'agent_id': agent_id, 'since': 0, 'timeout': 10})
+    assert response.status_code == 200
+    assert time.monotonic() - started < 5
+    config = response.get_json()
+    assert config['config_revision'] == 1
+    assert config['cameras'][0]['frame_transmission_enabled'] == True
+
+def test_config_watch_rejects_waiters_over_limit():
+    import threading
+    from utils.config_watch import ConfigWatch
+    watch = ConfigWatch(dict, lambda: None, 10.0, max_waiters=1)
+
+    waiter = threading.Thread(target=watch.wait, args=('a1', 0, 5))
+    waiter.start()
+    while watch._waiters == 0:
+        pass
+    assert watch.wait('a2', 0, 5) is None # 대기 자리가 없으면 기다리지 않음
+    assert watch.rejected == 1
+    watch.publish('a1', 1)
+    waiter.join()
+    assert watch.wait('a2', 0, 0.05) is False # 자리가 나면 다시 대기
+
+def test_agent_watch_config_over_limit_returns_retry_after(client, monkeypatch):
+    from resources import agent_resources
+    agent_id = register_agent(client)
+    monkeypatch.setattr(agent_resources.config_watch, 'max_waiters', 1)
+    monkeypatch.setattr(agent_resources.config_watch, '_waiters', 1)
+
+    response = client.get('/agent_watch_config', query_string={'agent_id': agent_id, 'since': 0, 'timeout': 10})
+    assert response.status_code == 204
+    assert 'Retry-After' in response.headers
+
+def test_agent_watch_config_unknown_agent(client):
+    response = client.get('/agent_watch_config', query_string={'agent_id': 'missing', 'since': 0, 'timeout': 0})
+    assert response.status_code == 404
+
+def test_agent_heartbeat_delivers_pending_config_then_204(client):
+    agent_id = register_agent(client)
+
+    # 처음에는 에이전트가 config_revision 을 모르므로 원하는 상태를 받음
+    response = client.post('/agent_heartbeat', json={
+        'agent_id': agent_id, 'full': True, 'base_revision': 0, 'status_revision': 1, 'config_revision': None,
+        'cameras': [{'camera_id': 'cam0', 'status': 'active', 'frame_transmission_enabled': False}]
+    })
+    assert response.status_code == 200
+    assert response.get_json() == {'config_revision': 0,
+                                   'cameras': [{'camera_id': 'cam0', 'frame_transmission_enabled': False}]}
+
+    # 변경분 없음 -> 204
+    response = client.post('/agent_heartbeat', json={
+        'agent_id': agent_id, 'base_revision': 1, 'status_revision': 1, 'config_revision': 0, 'cameras': []
+    })
+    assert response.status_code == 204
+    assert response.data == b''
+
+def test_agent_heartbeat_merges_delta(client):
+    agent_id = register_agent(client)
+
+    response = client.post('/agent_heartbeat', json={
+        'agent_id': agent_id, 'base_revision': 0, 'status_revision': 1, 'config_revision': 0,
+        'cameras': [{'camera_id': 'cam0', 'status': 'error'}]
+    })
+    assert response.status_code == 204
+    camera = client.get('/agent_get_config', query_string={'agent_id': agent_id}).get_json()['cameras'][0]
+    assert camera['status'] == 'error'
+    assert camera['camera_name'] # 보내지 않은 필드는 그대로 유지
+
+def test_agent_heartbeat_revision_mismatch(client):
+    agent_id = register_agent(client)
+
+    response = client.post('/agent_heartbeat', json={
+        'agent_id': agent_id, 'base_revision': 5, 'status_revision': 6, 'config_revision': 0, 'cameras': []
+    })
+    assert response.status_code == 409
+    assert response.get_json()['status_revision'] == 0
+
+def test_agent_heartbeat_keeps_pending_desired_state(client):
+    agent_id = register_agent(client)
+    client.post(f'/webui/agents/{agent_id}/cameras/cam0/control', json={'frame_transmission_enabled': True})
+
+    # 설정을 아직 받지 못한 에이전트의 현재 상태(False)가 원하는 상태(True)를 덮어쓰지 않음
+    response = client.post('/agent_heartbeat', json={
+        'agent_id': agent_id, 'base_revision': 0, 'status_revision': 1, 'config_revision': 0,
+        'cameras': [{'camera_id': 'cam0', 'frame_transmission_enabled': False}]
+    })
+    assert response.status_code == 200
+    assert response.get_json()['config_revision'] == 1
+    assert response.get_json()['cameras'][0]['frame_transmission_enabled'] == True
+
+def test_agent_heartbeat_does_not_overwrite_concurrent_toggle(client):
+    import threading
+    import time
+    from models.agent import AgentModel
+    agent_id = register_agent(client)
+    results = {}
+
+    def heartbeat():
+        with app.test_client() as other:
+            results['response'] = other.post('/agent_heartbeat', json={
+                'agent_id': agent_id, 'base_revision': 0, 'status_revision': 1, 'config_revision': 0,
+                'cameras': [{'camera_id': 'cam0', 'frame_transmission_enabled': False}]
+            })
+
+    # heartbeat 가 조회 전에 잠금을 기다리는 동안 웹 UI 가 전송을 켬
+    with AgentModel.locked():
+        worker = threading.Thread(target=heartbeat)
+        worker.start()
+        time.sleep(0.2)
+        assert worker.is_alive()
+        client.post(f'/webui/agents/{agent_id}/cameras/cam0/control', json={'frame_transmission_enabled': True})
+    worker.join(timeout=10)
+
+    assert results['response'].status_code == 200
+    assert results['response'].get_json()['config_revision'] == 1
+    camera = client.get('/agent_get_config', query_string={'agent_id': agent_id}).get_json()['cameras'][0]
+    assert camera['frame_transmission_enabled'] == True
@@ -0,0 +1,101 @@
+"""
+Agent 설정 변경 알림 (long-poll /agent_watch_config 용)
+
+- 에이전트 문서의 config_revision 은 서버가 원하는 상태(frame_transmission_enabled 등)가 바뀔 때마다 1 씩 증가
+- 같은 워커 프로세스에서 바뀐 설정은 publish() 로 대기 중인 요청을 바로 깨움
+- gunicorn 워커가 여러 개면 다른 워커의 변경은 알 수 없으므로, 대기 요청이 있을 때만
+  AGENT_WATCH_RECHECK_SECONDS 마다 DB 파일 수정 시각을 확인하고 바뀌었을 때만 전체 revision 을 한 번 읽음
+  (대기 중인 에이전트 수와 관계없이 워커당 최대 1 회)
+- 대기 요청은 gthread 스레드를 하나씩 점유하므로 워커당 AGENT_WATCH_MAX_WAITERS 개까지만 대기
+  (기본 WORKER_THREADS - 16, 나머지 스레드는 일반 요청용), 넘으면 wait() 가 바로 None 을 반환
+
+"""
+
+import os
+import threading
+import time
+import logging
+
+from models.agent import AgentModel
+from database import DATABASE_FILE
+
+logger = logging.getLogger(__name__)
+
+AGENT_WATCH_RECHECK_SECONDS = float(os.environ.get('AGENT_WATCH_RECHECK_SECONDS', 1.0))
+AGENT_WATCH_MAX_WAITERS = int(os.environ.get('AGENT_WATCH_MAX_WAITERS',
+                                             max(int(os.environ.get('WORKER_THREADS', 64)) - 16, 1)))
+
+
+def _db_stamp():
+    try:
+        return os.stat(DATABASE_FILE).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def _load_revisions():
+    agents = AgentModel.get_all_agents(include_summary=False) or []
+    return {agent.get('agent_id'): agent.get('config_revision', 0) for agent in agents if agent.get('agent_id')}
+
+
+class ConfigWatch:
+    def __init__(self, load_revisions, stamp, recheck_sec, max_waiters=0):
+        self.load_revisions = load_revisions # () -> {agent_id: config_revision}
+        self.stamp = stamp # () -> DB 변경 표시 (바뀌지 않았으면 다시 읽지 않음)
+        self.recheck_sec = max(recheck_sec, 0.05)
+        self.max_waiters = max_waiters # 동시에 대기할 수 있는 요청 수, 0 이면 제한 없음
+        self.rejected = 0 # 대기 자리가 없어 바로 돌려보낸 요청 수
+        self._cond = threading.Condition()
+        self._revisions = {} # agent_id -> 이 워커가 알고 있는 최신 config_revision
+        self._waiters = 0
+        self._poller = None
+        self._last_stamp = None
+
+    def publish(self, agent_id, revision):
+        """ 설정을 바꾼 요청이 호출, 해당 에이전트를 기다리는 요청을 깨움 (revision 은 증가만 함) """
+        with self._cond:
+            if revision > self._revisions.get(agent_id, -1):
+                self._revisions[agent_id] = revision
+                self._cond.notify_all()
+
+    def wait(self, agent_id, since, timeout):
+        """
+        config_revision 이 since 와 달라질 때까지 최대 timeout 초 대기, 바뀌었으면 True
+        대기 중인 요청이 이미 max_waiters 개면 기다리지 않고 None
+        """
+        with self._cond:
+            if self._revisions.get(agent_id, -1) < since: # 이 워커가 아직 모르는 revision (다른 워커가 변경)
+                self._revisions[agent_id] = since
+            if self.max_waiters and self._waiters >= self.max_waiters:
+                self.rejected += 1
+                return None
+            self._waiters += 1
+            self._ensure_poller()
+            try:
+                return self._cond.wait_for(lambda: self._revisions.get(agent_id) != since, timeout=timeout)
+            finally:
+                self._waiters -= 1
+
+    def _ensure_poller(self):
+        if self._poller is None or not self._poller.is_alive():
+            self._poller = threading.Thread(target=self._poll_loop, name="ConfigWatchPoller", daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.recheck_sec)
+            with self._cond:
+                if self._waiters == 0:
+                    continue
+            try:
+                stamp = self.stamp()
+                if stamp is not None and stamp == self._last_stamp:
+                    continue
+                self._last_stamp = stamp
+                for agent_id, revision in self.load_revisions().items():
+                    self.publish(agent_id, revision)
+            except Exception as e:
+                logger.error(f"ConfigWatch: failed to reload config revisions: {e}", exc_info=True)
+
+
+config_watch = ConfigWatch(_load_revisions, _db_stamp, AGENT_WATCH_RECHECK_SECONDS, AGENT_WATCH_MAX_WAITERS)